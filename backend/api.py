@@ -1,9 +1,11 @@
 import os
 import logging
 import asyncio
+import time
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, WebSocket, BackgroundTasks
+from fastapi import FastAPI, HTTPException, WebSocket, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import httpx # NEW: For Public API Polling
 from dotenv import load_dotenv
@@ -17,6 +19,7 @@ FEATURE_MOOD_SYNC = os.getenv("FEATURE_MOOD_SYNC", "false").lower() == "true"
 FEATURE_MOOD_AUTODJ = os.getenv("FEATURE_MOOD_AUTODJ", "false").lower() == "true"
 MOOD_CYCLE_SECONDS = int(os.getenv("MOOD_CYCLE_SECONDS", "300"))
 MOOD_VOTE_COOLDOWN_MINUTES = int(os.getenv("MOOD_VOTE_COOLDOWN_MINUTES", "5"))
+MOOD_RECONCILE_SECONDS = int(os.getenv("MOOD_RECONCILE_SECONDS", "3600"))
 
 from music_scanner import MusicScanner
 from tag_improver import TagImprover
@@ -27,6 +30,14 @@ from track_matcher import TrackMatcher
 from track_matcher import TrackMatcher
 from library_service import get_library_service
 from tag_writer import write_metadata_to_file # NEW: Direct ID3 Writing
+from rate_limiter import SlidingWindowLimiter
+from http_pool import SharedHTTPClient
+from webhook_ingest import AzuraCastWebhookReceiver, WebhookError
+from song_enrichment import EnrichmentCache
+from serialization import negotiated_response
+from ws_manager import ConnectionManager
+from event_bus import create_event_bus
+from conditional import ResourceVersions, check_conditional, make_etag
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -84,9 +95,48 @@ class AppState:
         }
         self.steering_status = {"mode": "auto", "target": "neutral"}
         self.stream_url = "https://radio.yourparty.tech/radio.mp3" # Default mount
+        # Relays steering, now-playing pushes and vote invalidations between workers
+        self.event_bus = None
 
 state = AppState()
 
+# Pooled client for AzuraCast polling (one connection pool per process)
+http_client = SharedHTTPClient.from_env("azuracast")
+
+# Content tokens behind the ETags of /status and /control/steer, set when the state changes
+resource_versions = ResourceVersions()
+
+
+def status_content() -> Dict[str, Any]:
+    return {
+        "now_playing": {
+            "song": state.now_playing
+        },
+        "listeners": {"total": 0}, 
+        "playing_next": {"song": {"title": "Coming Soon", "artist": "YourParty"}},
+        "steering": state.steering_status # Add steering info for dashboard/frontend
+    }
+
+
+def status_changed():
+    resource_versions.set("status", status_content())
+
+
+def steering_changed():
+    resource_versions.set("steer", state.steering_status)
+    status_changed()
+
+
+steering_changed()
+
+# /mood-stats body and ETag, rebuilt when a vote arrives or a minute rolls over
+mood_stats_memo: Dict[str, Any] = {"key": None, "etag": None, "content": None}
+
+# With webhooks configured AzuraCast pushes now-playing; polling becomes a slow safety net
+webhook_receiver = AzuraCastWebhookReceiver.from_env()
+STATUS_POLL_SECONDS = float(os.getenv("STATUS_POLL_SECONDS", "30" if webhook_receiver.enabled else "2"))
+SONG_ENRICHMENT_CACHE_SIZE = 256
+
 # Models
 class ScanRequest(BaseModel):
     path: str
@@ -291,13 +341,13 @@ async def get_rating(song_id: str):
     return rating
 
 @app.get("/mongo/tracks/rated")
-async def get_rated_tracks(min_rating: float = 0.0):
-    """Get all tracks with ratings."""
+async def get_rated_tracks(http_request: Request, min_rating: float = 0.0, limit: Optional[int] = None, skip: int = 0):
+    """Get all tracks with ratings (optionally paginated with limit/skip)."""
     if not state.mongo_client:
         raise HTTPException(status_code=400, detail="MongoDB not connected")
     
-    tracks = state.mongo_client.get_all_rated_tracks(min_rating)
-    return {"tracks": tracks, "count": len(tracks)}
+    tracks = state.mongo_client.get_all_rated_tracks(min_rating, limit=limit, skip=skip)
+    return negotiated_response(http_request, {"tracks": tracks, "count": len(tracks)})
 
 @app.post("/mongo/sync/metadata")
 async def sync_metadata_to_mongo():
@@ -323,7 +373,7 @@ async def sync_metadata_to_mongo():
 # ⭐ NEW: Library Service Endpoints (Best Practice)
 
 @app.get("/library/all")
-async def get_all_library_tracks():
+async def get_all_library_tracks(http_request: Request):
     """
     Get ALL tracks from database immediately (Single Source of Truth).
     This is what the UI should call on startup!
@@ -335,7 +385,7 @@ async def get_all_library_tracks():
         raise HTTPException(status_code=400, detail="Library Service not initialized. Connect to MongoDB first.")
     
     tracks = await state.library_service.get_all_tracks()
-    return {"tracks": tracks, "count": len(tracks)}
+    return negotiated_response(http_request, {"tracks": tracks, "count": len(tracks)})
 
 @app.post("/library/sync")
 async def sync_library_directory(directory: str, background: bool = False):
@@ -378,26 +428,8 @@ async def cleanup_missing_tracks():
 # --- REALTIME WEBSOCKET ---
 from fastapi import WebSocket, WebSocketDisconnect
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: Dict[str, Any]):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting: {e}")
-                # clean up happens on disconnect
-
-manager = ConnectionManager()
+# Message types clients can subscribe to ("song" includes the song_update deltas)
+manager = ConnectionManager.from_env("api", topics=("song", "vibe", "steering"))
 
 @app.websocket("/ws/logrmp")
 async def websocket_endpoint(websocket: WebSocket):
@@ -413,7 +445,12 @@ async def websocket_endpoint(websocket: WebSocket):
             "rating": {"average": 5.0}
         }
         
-        if state.library:
+        snapshot_key = None
+        if state.now_playing.get('id') != 'init':
+            # Pushes are change-driven, so new listeners need the current song up front
+            current_track = state.now_playing
+            snapshot_key = ("song", resource_versions.version("status"))
+        elif state.library:
             import random
             random_track = random.choice(state.library)
             current_track = {
@@ -423,23 +460,24 @@ async def websocket_endpoint(websocket: WebSocket):
                 "rating": {"average": 0.0} # Todo: Fetch real rating
             }
             
-        await websocket.send_json({
+        await manager.send(websocket, {
             "type": "song",
             "data": current_track
-        })
+        }, key=snapshot_key)
 
         # 2. Keep alive
         while True:
             # Wait for any message (ping/pong)
             data = await websocket.receive_text()
+            await manager.handle_message(websocket, data)
             # We could handle incoming 'vibe' votes here too
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         logger.info("WebSocket disconnected")
     except Exception as e:
         logger.error(f"WebSocket Error: {e}")
-        # manager.disconnect(websocket) # Likely already closed
+    finally:
+        manager.disconnect(websocket)
 
 
 @app.on_event("startup")
@@ -475,7 +513,24 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to connect to Mongo (Non-critical for Playback): {e}")
 
-    # 3. Start Mood Auto-DJ Scheduler (if enabled)
+    # 2b. Event bus to the other workers (EVENT_BUS); without it this worker runs standalone
+    try:
+        state.event_bus = create_event_bus(state.mongo_client.db if state.mongo_client else None)
+        register_event_handlers(state.event_bus)
+        await state.event_bus.start()
+        if state.mongo_client:
+            state.mongo_client.on_change = lambda kind, data: relay_event("mongo_change", {"kind": kind, "data": data})
+    except Exception as e:
+        state.event_bus = None
+        logger.error(f"Event bus unavailable, running as a single worker: {e}")
+
+    # 3. Keep the incremental mood counters honest against the raw vote log
+    if state.mongo_client:
+        asyncio.create_task(mood_reconcile_loop())
+        # Ratings are read from rating_summaries only; fill it once after deploy
+        asyncio.create_task(backfill_rating_summaries())
+
+    # 4. Start Mood Auto-DJ Scheduler (if enabled)
     if FEATURE_MOOD_AUTODJ and state.mongo_client:
         try:
             from mood_scheduler import schedule_mood_queue_worker
@@ -491,6 +546,65 @@ async def startup_event():
         except Exception as e:
             logger.error(f"Failed to start Mood Auto-DJ: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if state.event_bus:
+        await state.event_bus.close()
+    await manager.close()
+    await http_client.close()
+
+def relay_event(kind: str, data: Dict[str, Any]):
+    """Publish a change this worker already applied to the other workers."""
+    if state.event_bus:
+        state.event_bus.publish(kind, data)
+
+def register_event_handlers(bus):
+    """Apply changes published by the other workers."""
+    async def on_nowplaying(data: Dict[str, Any]):
+        try:
+            # Keeps this worker's webhook de-duplication in step with the receiving worker
+            event = webhook_receiver.ingest(data["payload"])
+        except WebhookError:
+            return
+        if event is not None:
+            await apply_nowplaying(data["payload"])
+
+    async def on_steering(data: Dict[str, Any]):
+        state.steering_status = data["status"]
+        steering_changed()
+        if data.get("vote"):
+            await announce_vibe(data["vote"])
+
+    def on_mongo_change(data: Dict[str, Any]):
+        if state.mongo_client:
+            state.mongo_client.apply_remote_change(data["kind"], data["data"])
+
+    def on_rate_hit(data: Dict[str, Any]):
+        limiter = RATE_LIMITERS.get(data.get("limiter"))
+        if limiter:
+            limiter.record(data["key"])
+
+    bus.on("nowplaying", on_nowplaying)
+    bus.on("steering", on_steering)
+    bus.on("mongo_change", on_mongo_change)
+    bus.on("rate_hit", on_rate_hit)
+
+async def backfill_rating_summaries():
+    try:
+        await asyncio.to_thread(state.mongo_client.backfill_rating_summaries)
+    except Exception as e:
+        logger.error(f"Rating summary backfill failed: {e}")
+
+async def mood_reconcile_loop():
+    """Periodically detect (and repair) drift between mood counters and raw mood votes."""
+    logger.info(f"Mood counter reconciliation every {MOOD_RECONCILE_SECONDS}s")
+    while True:
+        try:
+            await asyncio.to_thread(state.mongo_client.reconcile_mood_counters)
+        except Exception as e:
+            logger.error(f"Mood reconciliation error: {e}")
+        await asyncio.sleep(MOOD_RECONCILE_SECONDS)
+
 @app.get("/debug/status")
 async def debug_status():
     """Debug endpoint to check internal state."""
@@ -501,16 +615,18 @@ async def debug_status():
     }
 
 @app.get("/status")
-async def public_status():
+async def public_status(request: Request):
     """Public status endpoint compatible with frontend polling."""
-    return {
-        "now_playing": {
-            "song": state.now_playing
-        },
-        "listeners": {"total": 0}, 
-        "playing_next": {"song": {"title": "Coming Soon", "artist": "YourParty"}},
-        "steering": state.steering_status # Add steering info for dashboard/frontend
-    }
+    # Now-playing and steering are the only moving parts; both re-version "status"
+    not_modified, headers = check_conditional(
+        request,
+        make_etag("status", resource_versions.version("status")),
+        resource_versions.last_modified("status"),
+        max_age=2,
+    )
+    if not_modified:
+        return not_modified
+    return JSONResponse(content=status_content(), headers=headers)
 
 @app.get("/queue")
 async def get_queue():
@@ -532,88 +648,158 @@ async def get_queue():
             logger.error(f"Queue fetch error: {e}")
             return []
 
+def song_fields(song_id: str) -> Dict[str, Any]:
+    """Rating/mood fields for a song from Mongo (blocking)."""
+    rating_data = state.mongo_client.get_track_rating(song_id=song_id)
+    mood_data = state.mongo_client.get_song_moods(song_id)
+    return {
+        "rating": rating_data or {"average": 0.0, "total": 0},
+        "top_mood": mood_data.get("top_mood")
+    }
+
+# Enrichment per song, tagged with the song's rating/mood version at load time
+song_enrichment_cache = EnrichmentCache(
+    lambda song_id: state.mongo_client.get_song_version(song_id),
+    song_fields,
+    size=SONG_ENRICHMENT_CACHE_SIZE,
+)
+
+async def fetch_public_nowplaying() -> Optional[Dict[str, Any]]:
+    # Public Endpoint: No Key Needed
+    url = "http://192.168.178.210/api/nowplaying/1"
+    try:
+        resp = await http_client.get(url, timeout=5.0)
+    except httpx.ConnectError:
+        # Fallback to HTTPS
+        url = "https://192.168.178.210/api/nowplaying/1"
+        resp = await http_client.get(url, timeout=5.0)
+    return resp.json() if resp.status_code == 200 else None
+
+async def apply_nowplaying(data: Dict[str, Any]):
+    """
+    Update now-playing from an AzuraCast payload (polled or pushed by webhook).
+
+    Listeners only hear about changes: a full "song" message when the track
+    changes, a "song_update" delta when its metadata or rating/mood version
+    moves, and nothing at all in between.
+    """
+    np = data.get('now_playing', {}).get('song', {})
+    
+    for mount in data.get('station', {}).get('mounts', []):
+         if mount.get('is_default'):
+             state.stream_url = mount.get('url')
+
+    current_track = {
+        "title": np.get('title', ''),
+        "artist": np.get('artist', ''),
+        "album": np.get('album', ''),
+        "art": np.get('art', '').replace('http://192.168.178.210', 'https://radio.yourparty.tech').replace('https://192.168.178.210', 'https://radio.yourparty.tech'), 
+        "id": str(np.get('id', '0')), 
+        "duration": np.get('duration', 0)
+    }
+
+    # Fallback logic if AzuraCast returns empty fields but has 'text'
+    if not current_track['title'] or not current_track['artist']:
+        full_text = np.get('text', '')
+        if ' - ' in full_text:
+            parts = full_text.split(' - ', 1)
+            if not current_track['artist']:
+                current_track['artist'] = parts[0]
+            if not current_track['title']:
+                current_track['title'] = parts[1]
+        elif full_text and not current_track['title']:
+             current_track['title'] = full_text
+    
+    # Final fallback
+    if not current_track['title']: current_track['title'] = 'Unknown Track'
+    if not current_track['artist']: current_track['artist'] = 'Unknown Artist'
+    
+    # Inject Mongo Data if connected (only queried when the song or its votes changed)
+    if state.mongo_client:
+         song_id = current_track['id']
+         extras = song_enrichment_cache.get(song_id)
+         if extras is None:
+              extras = await asyncio.to_thread(song_enrichment_cache.load, song_id)
+         current_track.update(extras)
+
+    previous = state.now_playing
+    if previous.get('id') != current_track['id']:
+        state.now_playing = current_track
+        status_changed()
+        logger.info(f"Now Playing: {current_track['title']}")
+        await manager.broadcast({
+            "type": "song",
+            "song": current_track
+        })
+    else:
+        changes = {key: value for key, value in current_track.items() if previous.get(key) != value}
+        if changes:
+            state.now_playing = current_track
+            status_changed()
+            await manager.broadcast({
+                "type": "song_update",
+                "id": current_track['id'],
+                "changes": changes
+            }, topic="song")
+
 async def public_status_loop():
-    """Poll AzuraCast public API for Metadata."""
-    logger.info("Public Status Loop Started.")
+    """Poll AzuraCast public API for Metadata (safety net when webhooks are enabled)."""
+    logger.info(f"Public Status Loop Started (every {STATUS_POLL_SECONDS}s).")
     while True:
         try:
-            # Public Endpoint: No Key Needed
-            url = "http://192.168.178.210/api/nowplaying/1" 
-            
-            async with httpx.AsyncClient(verify=False, follow_redirects=True) as client:
-                # Try HTTP first
-                try:
-                    resp = await client.get(url, timeout=5.0)
-                except httpx.ConnectError:
-                    # Fallback to HTTPS
-                    url = "https://192.168.178.210/api/nowplaying/1"
-                    resp = await client.get(url, timeout=5.0)
-
-                if resp.status_code == 200:
-                    data = resp.json()
-                    np = data.get('now_playing', {}).get('song', {})
-                    
-                    for mount in data.get('station', {}).get('mounts', []):
-                         if mount.get('is_default'):
-                             state.stream_url = mount.get('url')
-
-                    current_track = {
-                        "title": np.get('title', ''),
-                        "artist": np.get('artist', ''),
-                        "album": np.get('album', ''),
-                        "art": np.get('art', '').replace('http://192.168.178.210', 'https://radio.yourparty.tech').replace('https://192.168.178.210', 'https://radio.yourparty.tech'), 
-                        "id": str(np.get('id', '0')), 
-                        "duration": np.get('duration', 0)
-                    }
-
-                    # Fallback logic if AzuraCast returns empty fields but has 'text'
-                    if not current_track['title'] or not current_track['artist']:
-                        full_text = np.get('text', '')
-                        if ' - ' in full_text:
-                            parts = full_text.split(' - ', 1)
-                            if not current_track['artist']:
-                                current_track['artist'] = parts[0]
-                            if not current_track['title']:
-                                current_track['title'] = parts[1]
-                        elif full_text and not current_track['title']:
-                             current_track['title'] = full_text
-                    
-                    # Final fallback
-                    if not current_track['title']: current_track['title'] = 'Unknown Track'
-                    if not current_track['artist']: current_track['artist'] = 'Unknown Artist'
-                    
-                    # Inject Mongo Data if connected
-                    if state.mongo_client:
-                         song_id = current_track['id']
-                         # Fetch Rating
-                         rating_data = state.mongo_client.get_track_rating(song_id=song_id)
-                         if rating_data:
-                              current_track['rating'] = rating_data
-                         else:
-                              current_track['rating'] = {"average": 0.0, "total": 0}
-                              
-                         # Fetch Mood
-                         mood_data = state.mongo_client.get_song_moods(song_id)
-                         if mood_data.get('top_mood'):
-                              current_track['top_mood'] = mood_data['top_mood']
-                         else:
-                              current_track['top_mood'] = None
-
-                    state.now_playing = current_track
-                    logger.info(f"Polled Track: {current_track['title']}")
-                    
-                    # Broadcast to WS
-                    await manager.broadcast({
-                        "type": "song",
-                        "song": current_track
-                    })
+            data = await fetch_public_nowplaying()
+            if data:
+                await apply_nowplaying(data)
         except Exception as e:
             logger.error(f"Polling Error: {e}")
             
-        await asyncio.sleep(2.0) # Faster polling for more responsiveness
+        await asyncio.sleep(STATUS_POLL_SECONDS)
+
+@app.post("/webhooks/azuracast")
+async def azuracast_webhook(http_request: Request):
+    """AzuraCast "Generic Web Hook" target (song changed / listener triggers)."""
+    try:
+        webhook_receiver.authenticate(http_request.headers)
+        try:
+            payload = await http_request.json()
+        except ValueError:
+            raise WebhookError(400, "Invalid JSON payload.")
+        event = webhook_receiver.ingest(payload)
+    except WebhookError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+    if event is None:
+        return {"status": "ignored"}
+    # Only one worker receives the webhook; the others take the payload from the bus
+    relay_event("nowplaying", {"payload": payload})
+    await apply_nowplaying(payload)
+    return {"status": "ok", "event": event}
 
 # --- MISSING ENDPOINTS IMPLEMENTATION ---
 
+# In-memory vote throttling (per client IP, per route); allowed hits are relayed
+# so the limits hold across all workers, not per worker
+def shared_limiter(name: str, env: str, default: str) -> SlidingWindowLimiter:
+    return SlidingWindowLimiter.from_env(
+        env, default, on_hit=lambda key: relay_event("rate_hit", {"limiter": name, "key": key})
+    )
+
+rate_limiter = shared_limiter("rate", "RATE_LIMIT_RATE", "10/600")
+mood_tag_limiter = shared_limiter("mood_tag", "RATE_LIMIT_MOOD_TAG", "30/600")
+vote_mood_limiter = shared_limiter("vote_mood", "RATE_LIMIT_VOTE_MOOD", f"10/{MOOD_VOTE_COOLDOWN_MINUTES * 60}")
+RATE_LIMITERS = {"rate": rate_limiter, "mood_tag": mood_tag_limiter, "vote_mood": vote_mood_limiter}
+
+def enforce_rate_limit(limiter: SlidingWindowLimiter, http_request: Request):
+    """Raise 429 if the caller's IP exceeded the route's limit."""
+    forwarded = http_request.headers.get("X-Forwarded-For")
+    ip = forwarded.split(",")[0].strip() if forwarded else http_request.client.host
+    if not limiter.hit(ip):
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded. Try again later.",
+            headers={"Retry-After": str(limiter.retry_after(ip))}
+        )
+
 class RatingRequest(BaseModel):
     song_id: str
     rating: int
@@ -623,8 +809,9 @@ class RatingRequest(BaseModel):
     artist: Optional[str] = None
 
 @app.post("/rate")
-async def rate_track(request: RatingRequest):
+async def rate_track(request: RatingRequest, http_request: Request):
     """Handle rating submission from frontend."""
+    enforce_rate_limit(rate_limiter, http_request)
     logger.info(f"Received rating: {request.rating} for song {request.song_id}")
     
     if state.mongo_client:
@@ -655,8 +842,9 @@ class MoodRequest(BaseModel):
     artist: Optional[str] = None
 
 @app.post("/mood-tag")
-async def tag_mood(request: MoodRequest):
+async def tag_mood(request: MoodRequest, http_request: Request):
     """Handle mood tagging from frontend."""
+    enforce_rate_limit(mood_tag_limiter, http_request)
     logger.info(f"Received tag - Mood: {request.mood}, Genre: {request.genre} for song {request.song_id}")
     
     if state.mongo_client:
@@ -684,7 +872,7 @@ VALID_MOODS = [
 ]
 
 @app.post("/vote-mood")
-async def vote_mood(request: MoodVoteRequest):
+async def vote_mood(request: MoodVoteRequest, http_request: Request):
     """
     Handle dual mood voting from frontend.
     
@@ -707,6 +895,8 @@ async def vote_mood(request: MoodVoteRequest):
     
     if not request.mood_current and not request.mood_next and not request.rating:
         raise HTTPException(status_code=400, detail="At least one of mood_current, mood_next, or rating required")
+
+    enforce_rate_limit(vote_mood_limiter, http_request)
     
     logger.info(f"Mood vote: song={request.song_id}, current={request.mood_current}, next={request.mood_next}")
     
@@ -752,20 +942,33 @@ async def vote_mood(request: MoodVoteRequest):
     return result
 
 @app.get("/mood-stats")
-async def get_mood_stats():
+async def get_mood_stats(request: Request):
     """Get aggregated mood statistics for the current time window."""
     if not state.mongo_client:
         return {"error": "Database not connected"}
-    
-    return {
-        "dominant_next_mood": state.mongo_client.get_dominant_next_mood(time_window_minutes=10),
-        "feature_flags": {
-            "FEATURE_MOOD_VOTES": FEATURE_MOOD_VOTES,
-            "FEATURE_MOOD_SYNC": FEATURE_MOOD_SYNC,
-            "FEATURE_MOOD_AUTODJ": FEATURE_MOOD_AUTODJ,
-            "MOOD_CYCLE_SECONDS": MOOD_CYCLE_SECONDS
+
+    # Standings change on votes and as old minute buckets leave the window; the
+    # ETag is the digest of the standings, so every worker with the same votes agrees
+    tally = state.mongo_client.next_mood_tally
+    key = (tally.version, int(time.time() // 60))
+    if mood_stats_memo["key"] != key:
+        content = {
+            "dominant_next_mood": state.mongo_client.get_dominant_next_mood(time_window_minutes=10),
+            "next_mood_standings": state.mongo_client.get_next_mood_standings(time_window_minutes=10),
+            "feature_flags": {
+                "FEATURE_MOOD_VOTES": FEATURE_MOOD_VOTES,
+                "FEATURE_MOOD_SYNC": FEATURE_MOOD_SYNC,
+                "FEATURE_MOOD_AUTODJ": FEATURE_MOOD_AUTODJ,
+                "MOOD_CYCLE_SECONDS": MOOD_CYCLE_SECONDS
+            }
         }
-    }
+        mood_stats_memo.update(key=key, etag=make_etag("mood-stats", content), content=content)
+
+    not_modified, headers = check_conditional(request, mood_stats_memo["etag"], max_age=5)
+    if not_modified:
+        return not_modified
+
+    return JSONResponse(headers=headers, content=mood_stats_memo["content"])
 
 @app.get("/history")
 async def get_history():
@@ -798,7 +1001,7 @@ async def get_ratings(song_id: Optional[str] = None):
          return state.mongo_client.get_track_rating(song_id)
 
     # Return All for Dashboard
-    tracks = state.mongo_client.get_all_rated_tracks()
+    tracks = state.mongo_client.iter_rated_tracks()
     return {
         t['song_id']: {
             "average": t['rating']['average'], 
@@ -821,12 +1024,12 @@ async def get_history():
         return []
         
     # Get last 10 rated tracks as 'history'
-    tracks = state.mongo_client.get_all_rated_tracks(min_rating=0.0)
+    tracks = state.mongo_client.get_all_rated_tracks(min_rating=0.0, limit=10)
     # Sort by 'added_at' or similar if available, or just take top
     
     history_items = []
     import time
-    for t in tracks[:10]:
+    for t in tracks:
         history_items.append({
             "song": t,
             "played_at": time.time() - 3600 # Mock time relative to now is okay for display
@@ -839,9 +1042,17 @@ class SteeringRequest(BaseModel):
     target: Optional[str] = None # e.g. "energetic"
 
 @app.get("/control/steer")
-async def get_steering():
+async def get_steering(request: Request):
     """Get current steering status."""
-    return state.steering_status
+    not_modified, headers = check_conditional(
+        request,
+        make_etag("steer", resource_versions.version("steer")),
+        resource_versions.last_modified("steer"),
+        max_age=1,
+    )
+    if not_modified:
+        return not_modified
+    return JSONResponse(content=state.steering_status, headers=headers)
 
 @app.post("/control/steer")
 async def set_steering(request: SteeringRequest):
@@ -851,6 +1062,8 @@ async def set_steering(request: SteeringRequest):
         "target": request.target,
         "updated_at": datetime.utcnow().isoformat()
     }
+    steering_changed()
+    relay_event("steering", {"status": dict(state.steering_status)})
     logger.info(f"Steering updated: {state.steering_status}")
     return state.steering_status
 
@@ -868,13 +1081,19 @@ async def vote_next(request: VoteNextRequest):
     # Simple persistence in-memory for now to show impact
     state.steering_status['target'] = request.vote
     state.steering_status['mode'] = 'manual'
+    steering_changed()
+    relay_event("steering", {"status": dict(state.steering_status), "vote": request.vote})
+    await announce_vibe(request.vote)
     
+    return {"status": "accepted", "vote": request.vote, "trend": request.vote.upper(), "prediction": {"title": f"Upcoming {request.vote.capitalize()} Track"}}
+
+async def announce_vibe(vote: str):
     # Broadcast to all clients
     await manager.broadcast({
         "type": "vibe",
         "data": {
-            "vote": request.vote,
-            "trend": request.vote.upper(),
+            "vote": vote,
+            "trend": vote.upper(),
             "status": "Vibe Shift Detected!"
         }
     })
@@ -884,8 +1103,6 @@ async def vote_next(request: VoteNextRequest):
         "type": "steering",
         "data": state.steering_status
     })
-    
-    return {"status": "accepted", "vote": request.vote, "trend": request.vote.upper(), "prediction": {"title": f"Upcoming {request.vote.capitalize()} Track"}}
 
 @app.post("/tasks/recalc-playlists")
 async def recalc_playlists_task(bg_tasks: BackgroundTasks):
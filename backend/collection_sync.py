@@ -0,0 +1,125 @@
+"""
+Incremental Collection Sync
+
+Keyset pagination and delta sync for the /ratings and /moods collections
+(documents keyed by song id, with an integer `updated_at`):
+
+    ?limit=N[&cursor=...]   keyset pages ordered by song id
+    ?since=<updated_at>     only documents changed at or after the watermark,
+                            ordered by (updated_at, song id), also paged by cursor
+    ?format=ndjson          stream every match as one JSON object per line
+
+Every response carries a watermark. Start a delta sync with the watermark of
+the first page of a full sync; documents at the boundary may be delivered
+twice, so clients should upsert. Both orders are served by indexes: _id, and
+(updated_at, _id).
+"""
+
+import json
+import time
+import base64
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from serialization import dumps_json
+
+SYNC_PAGE_DEFAULT = 500
+SYNC_PAGE_MAX = 5000
+# Watermarks trail the clock so votes still in the write-behind buffer are not skipped
+SYNC_WATERMARK_LAG_SECONDS = 5
+
+# formatter(doc) -> public fields of a stored document
+Formatter = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque, URL-safe token for the sort key of the last document on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    """Sort key encoded by encode_cursor() (raises ValueError on a malformed token)."""
+    padded = token + "=" * (-len(token) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list):
+        raise ValueError("cursor must encode a list")
+    return values
+
+
+def sync_query(since: Optional[int], cursor: Optional[str]) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """Mongo filter and sort for one sync request (raises ValueError or TypeError on a bad cursor)."""
+    if since is None:
+        query = {"_id": {"$gt": decode_cursor(cursor)[0]}} if cursor else {}
+        return query, [("_id", 1)]
+
+    if cursor:
+        updated_at, song_id = decode_cursor(cursor)
+        query = {"$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": song_id}},
+        ]}
+    else:
+        query = {"updated_at": {"$gte": since}}
+    return query, [("updated_at", 1), ("_id", 1)]
+
+
+def sync_watermark(now: Optional[float] = None) -> int:
+    """`since` value for the next delta sync of a client syncing now."""
+    return int(time.time() if now is None else now) - SYNC_WATERMARK_LAG_SECONDS
+
+
+def sync_page(collection, formatter: Formatter, since: Optional[int], cursor: Optional[str],
+              limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    One page of a full or delta sync (blocking).
+
+    Args:
+        collection: pymongo collection
+        formatter: Public fields per document
+        since: Delta sync watermark (None: full sync)
+        cursor: next_cursor of the previous page
+        limit: Page size (SYNC_PAGE_DEFAULT when omitted, capped at SYNC_PAGE_MAX)
+
+    Returns:
+        {"items": {song_id: fields}, "next_cursor": token or None on the last page, "watermark": ...}
+
+    Raises:
+        ValueError, TypeError: Malformed cursor
+    """
+    query, sort = sync_query(since, cursor)
+    watermark = sync_watermark()
+    limit = min(SYNC_PAGE_DEFAULT if limit is None else limit, SYNC_PAGE_MAX)
+    docs = list(collection.find(query).sort(sort).limit(limit))
+    next_cursor = None
+    if len(docs) == limit:
+        last = docs[-1]
+        next_cursor = encode_cursor([last["_id"]] if since is None else [last.get("updated_at"), last["_id"]])
+    return {
+        "items": {doc["_id"]: formatter(doc) for doc in docs},
+        "next_cursor": next_cursor,
+        "watermark": watermark,
+    }
+
+
+def ndjson_lines(docs: Iterable[Dict[str, Any]], formatter: Formatter) -> Iterator[bytes]:
+    """One JSON object per document and line, with the song id as "song_id"."""
+    for doc in docs:
+        yield dumps_json({"song_id": doc["_id"], **formatter(doc)}) + b"\n"
+
+
+def sync_stream(collection, formatter: Formatter, since: Optional[int], cursor: Optional[str],
+                limit: Optional[int] = None) -> Tuple[Iterator[bytes], int]:
+    """
+    Every match as NDJSON lines, read lazily from one cursor.
+
+    Returns:
+        (lines, watermark)
+
+    Raises:
+        ValueError, TypeError: Malformed cursor
+    """
+    query, sort = sync_query(since, cursor)
+    watermark = sync_watermark()
+    docs = collection.find(query).sort(sort)
+    if limit:
+        docs = docs.limit(min(limit, SYNC_PAGE_MAX))
+    return ndjson_lines(docs, formatter), watermark
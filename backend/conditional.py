@@ -0,0 +1,172 @@
+"""
+Conditional GET Support
+
+Cheap validators for the constantly polled read endpoints. Every resource
+has a version token that is maintained when it changes, so an ETag is built
+from the token alone and a matching If-None-Match is answered with 304 Not
+Modified before any database or serialization work happens.
+
+- Tokens mean the same data in every worker, since consecutive requests of
+  one client may reach different workers (see ResourceVersions)
+- MongoDB-backed resources start from the newest updated_at (an index-only
+  read at startup); writes made outside the API are picked up on restart
+- Last-Modified is advisory: If-None-Match takes precedence and carries the
+  exact validator
+- Responses carry Cache-Control so the nginx gateway can micro-cache them
+"""
+
+import hashlib
+import secrets
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from serialization import dumps_json
+
+BOOT_TIME = time.time()
+
+
+def time_token(timestamp: float) -> str:
+    """Fixed-width token that sorts like the timestamp it was made from."""
+    return format(int(timestamp * 1_000_000), "014x")
+
+
+class ResourceVersions:
+    """
+    Version token per named resource, with the wall-clock time of its last change.
+
+    A token must identify the same data in every worker:
+    - set(name, content): the digest of the new content, for state every
+      worker holds in memory (each computes the same token by itself)
+    - bump(name): a new time-ordered token for data kept elsewhere (MongoDB).
+      The writer relays it over the event bus and the other workers apply()
+      it; tokens compare in time order, so every worker converges on the
+      newest one whatever order the events arrive in
+
+    A resource uses one of the two, never both.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, str] = {}
+        self._modified: Dict[str, float] = {}
+        # Keeps tokens of different workers bumping in the same microsecond apart
+        self._suffix = secrets.token_hex(3)
+
+    def set(self, name: str, content) -> str:
+        """Version `name` by its content; returns the token."""
+        token = content_digest(content)
+        if self._tokens.get(name) != token:
+            self._tokens[name] = token
+            self._modified[name] = time.time()
+        return token
+
+    def bump(self, *names: str) -> Dict[str, str]:
+        """
+        Give `names` a new token.
+
+        Returns:
+            {name: token} to relay to the other workers
+        """
+        now = time.time()
+        token = f"{time_token(now)}-{self._suffix}"
+        for name in names:
+            self._tokens[name] = token
+            self._modified[name] = now
+        return {name: token for name in names}
+
+    def apply(self, tokens: Dict[str, str], modified: Optional[float] = None):
+        """Take over tokens bumped by another worker, unless ours are newer."""
+        for name, token in tokens.items():
+            if token > self._tokens.get(name, ""):
+                self._tokens[name] = token
+                self._modified[name] = modified or time.time()
+
+    def seed(self, name: str, updated_at: float):
+        """Start `name` from the newest updated_at of its data (same in every worker)."""
+        if updated_at:
+            self.apply({name: time_token(updated_at)}, updated_at)
+
+    def version(self, name: str) -> str:
+        return self._tokens.get(name, "0")
+
+    def last_modified(self, name: str) -> float:
+        return self._modified.get(name, BOOT_TIME)
+
+
+def content_digest(*parts) -> str:
+    """Stable hex digest of JSON-encodable parts (dict key order does not matter)."""
+    return hashlib.blake2b(dumps_json(list(parts), sort_keys=True), digest_size=12).hexdigest()
+
+
+def make_etag(*parts) -> str:
+    """
+    Weak ETag for a response.
+
+    Args:
+        parts: Resource name, version token and anything else that shapes the body
+    """
+    return 'W/"' + content_digest(*parts) + '"'
+
+
+def request_variant(request: Request) -> str:
+    """Short token for everything besides the data that shapes the body (query string, Accept)."""
+    key = f"{request.url.query}|{request.headers.get('accept', '')}"
+    return format(zlib.crc32(key.encode()), "08x")
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same validator
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 7232 section 6)
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def cache_headers(etag: str, last_modified: Optional[float] = None, max_age: int = 1) -> Dict[str, str]:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def check_conditional(request: Request, etag: str, last_modified: Optional[float] = None,
+                      max_age: int = 1) -> Tuple[Optional[Response], Dict[str, str]]:
+    """
+    Evaluate the request's validators.
+
+    Returns:
+        (304 response or None, headers to put on the full response)
+    """
+    headers = cache_headers(etag, last_modified, max_age)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
@@ -0,0 +1,102 @@
+"""
+Counter Update Pipelines
+
+Builders for the MongoDB update pipelines that apply vote increments to the
+ratings and moods documents. Derived fields (star average, top mood/genre)
+are recomputed in the same write, so a vote is one atomic update and
+concurrent votes never write stale aggregates. The same builders are used for
+direct writes and for the coalesced writes of the vote buffer.
+
+Increments use dotted paths as in a classic $inc ("like", "distribution.4",
+"moods.chill").
+"""
+
+from typing import Any, Dict
+
+
+def _field_plus(path: str, amount: int) -> Dict[str, Any]:
+    return {"$add": [{"$ifNull": [f"${path}", 0]}, amount]}
+
+
+def rating_update_pipeline(inc: Dict[str, int], set_fields: Dict[str, Any]) -> list:
+    """
+    Build an update pipeline that applies counter increments and recomputes
+    the star average server-side, so the whole vote is one atomic write.
+
+    `inc` uses the same dotted keys as a classic $inc ("like", "distribution.4", "total").
+    """
+    stars = [f"distribution.{k}" for k in range(1, 6)]
+    fields = dict(set_fields)
+    for path, amount in inc.items():
+        fields[path] = _field_plus(path, amount)
+    # Materialize every star slot so the average stage can read them all.
+    for path in stars:
+        fields.setdefault(path, _field_plus(path, 0))
+
+    star_total = {"$add": [f"${path}" for path in stars]}
+    weighted_sum = {"$add": [{"$multiply": [k, f"$distribution.{k}"]} for k in range(1, 6)]}
+
+    return [
+        {"$set": fields},
+        {"$set": {
+            "average": {
+                "$cond": [
+                    {"$gt": [star_total, 0]},
+                    {"$round": [{"$divide": [weighted_sum, star_total]}, 3]},
+                    0.0,
+                ]
+            }
+        }},
+    ]
+
+
+def rating_increments(vote: str = None, rating_value: int = None) -> Dict[str, int]:
+    inc = {}
+    if vote:
+        inc[vote] = 1
+
+    if rating_value:
+        inc[f"distribution.{rating_value}"] = 1
+        inc["total"] = 1
+    return inc
+
+
+def _top_key(path: str, current: str) -> Dict[str, Any]:
+    """Server-side arg-max over a counter sub-document; keeps the old value if it is empty."""
+    best = {
+        "$reduce": {
+            "input": {"$objectToArray": {"$ifNull": [f"${path}", {}]}},
+            "initialValue": {"k": None, "v": 0},
+            "in": {"$cond": [{"$gt": ["$$this.v", "$$value.v"]}, "$$this", "$$value"]},
+        }
+    }
+    return {"$ifNull": [{"$let": {"vars": {"best": best}, "in": "$$best.k"}}, f"${current}"]}
+
+
+def mood_update_pipeline(inc: Dict[str, int], set_fields: Dict[str, Any]) -> list:
+    """
+    Update pipeline for moods_col: applies mood/genre increments plus metadata
+    and recomputes top_mood / top_genre in the same write.
+    """
+    fields = dict(set_fields)
+    for path, amount in inc.items():
+        fields[path] = _field_plus(path, amount)
+
+    stages = [{"$set": fields}] if fields else []
+    stages.append({"$set": {
+        "top_mood": _top_key("moods", "top_mood"),
+        "top_genre": _top_key("genres", "top_genre"),
+    }})
+    return stages
+
+
+def apply_increments(doc: Dict[str, Any], inc: Dict[str, int]) -> Dict[str, Any]:
+    """Apply dotted-path increments to a copy of a document (optimistic read-your-write)."""
+    doc = dict(doc)
+    for path, amount in inc.items():
+        head, _, leaf = path.rpartition(".")
+        target = doc
+        if head:
+            target = doc[head] = dict(doc.get(head) or {})
+        target[leaf] = target.get(leaf, 0) + amount
+    return doc
@@ -0,0 +1,261 @@
+"""
+Event Bus
+
+Relays state changes between API workers so every worker can serve its own
+WebSocket clients and in-memory caches consistently (votes, steering,
+now-playing pushes, invalidations):
+
+1. A worker applies a change locally (read-your-writes) and publishes it
+2. Every other worker receives the event and applies the same change,
+   including the broadcast to its own sockets
+3. Events a worker published itself are ignored on receipt
+
+Backends (EVENT_BUS):
+- "local" (default): in-process only, i.e. the single-worker behaviour; several
+  InProcessBus instances can share a hub to simulate workers in tests
+- "redis": Redis pub/sub (or any Redis-compatible server such as Valkey/KeyDB),
+  EVENT_BUS_URL, requires the `redis` package
+- "mongo": MongoDB change streams on a small TTL'd events collection
+  (requires a replica set, a single-node one is enough)
+
+Delivery is at-most-once and live only: a worker that starts later warms its
+state from MongoDB, not from the bus.
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import inspect
+import logging
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from prometheus_client import Counter
+
+from serialization import dumps_json
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger("EventBus")
+
+BUS_EVENTS = Counter('event_bus_events_total', 'Events relayed between workers', ['direction', 'kind'])
+
+Handler = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class EventBus(ABC):
+    """
+    Base class: handler registry, outbound queue and inbound dispatch.
+    Subclasses implement _send() and _listen().
+    """
+
+    def __init__(self, channel: str = "yourparty-events"):
+        self.channel = channel
+        # Unique per bus instance: hostname + pid alone is not unique inside one test process
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(3)}"
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def on(self, kind: str, handler: Handler):
+        """Run `handler(data)` for `kind` events published by other workers."""
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def publish(self, kind: str, data: Dict[str, Any]):
+        """
+        Queue an event for the other workers. Non-blocking and safe to call from
+        worker threads (e.g. a vote buffer flush); a no-op before start().
+        """
+        if self._loop is None:
+            return
+        envelope = {"kind": kind, "data": data, "origin": self.worker_id, "ts": time.time()}
+        self._loop.call_soon_threadsafe(self._outbox.put_nowait, envelope)
+
+    async def start(self):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._pump()), asyncio.create_task(self._listen())]
+        logger.info(f"{type(self).__name__} started as {self.worker_id}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._loop = None
+
+    async def _pump(self):
+        while True:
+            envelope = await self._outbox.get()
+            try:
+                await self._send(envelope)
+                BUS_EVENTS.labels("published", envelope["kind"]).inc()
+            except Exception as e:
+                BUS_EVENTS.labels("failed", envelope["kind"]).inc()
+                logger.error(f"Publishing {envelope['kind']} failed: {e}")
+
+    async def _deliver(self, envelope: Dict[str, Any]):
+        if envelope.get("origin") == self.worker_id:
+            return
+        kind = envelope.get("kind")
+        BUS_EVENTS.labels("received", kind).inc()
+        for handler in self._handlers.get(kind, []):
+            try:
+                result = handler(envelope.get("data") or {})
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Handler for {kind} failed: {e}")
+
+    @abstractmethod
+    async def _send(self, envelope: Dict[str, Any]):
+        """Hand one envelope to the transport."""
+
+    @abstractmethod
+    async def _listen(self):
+        """Receive envelopes from the transport and pass them to _deliver(); runs until cancelled."""
+
+
+class InProcessBus(EventBus):
+    """Delivers to the other buses registered on the same hub (a plain list)."""
+
+    def __init__(self, channel: str = "yourparty-events", hub: Optional[List["InProcessBus"]] = None):
+        super().__init__(channel)
+        self.hub = hub if hub is not None else []
+        self.hub.append(self)
+
+    async def _send(self, envelope: Dict[str, Any]):
+        for bus in list(self.hub):
+            if bus is not self and bus._loop is not None:
+                await bus._deliver(envelope)
+
+    async def _listen(self):
+        # Nothing to listen to; _send() delivers directly
+        await asyncio.Event().wait()
+
+
+class RedisBus(EventBus):
+    """Redis pub/sub on one channel."""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", channel: str = "yourparty-events"):
+        if aioredis is None:
+            raise RuntimeError("EVENT_BUS=redis requires the 'redis' package")
+        super().__init__(channel)
+        self.url = url
+        self._redis = aioredis.from_url(url)
+
+    async def close(self):
+        await super().close()
+        await self._redis.aclose()
+
+    async def _send(self, envelope: Dict[str, Any]):
+        await self._redis.publish(self.channel, dumps_json(envelope))
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self._deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis subscription lost ({e}), retrying in 2s")
+                await asyncio.sleep(2)
+
+
+class MongoBus(EventBus):
+    """Inserts events into a collection and follows it with a change stream."""
+
+    def __init__(self, collection, ttl_seconds: int = 3600):
+        super().__init__(collection.name)
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._stop = threading.Event()
+        # Clear while _watch() runs in its thread
+        self._idle = threading.Event()
+        self._idle.set()
+
+    async def start(self):
+        # Events are only needed while they are being relayed; let MongoDB drop old ones
+        await asyncio.to_thread(self.collection.create_index, "created_at", expireAfterSeconds=self.ttl_seconds)
+        self._stop.clear()
+        await super().start()
+
+    async def close(self):
+        # Cancelling the listener does not stop its thread; wait for _watch() to
+        # see the flag (it polls every max_await_time_ms) before the loop is cleared
+        self._stop.set()
+        await asyncio.to_thread(self._idle.wait, 5)
+        await super().close()
+
+    async def _send(self, envelope: Dict[str, Any]):
+        doc = {**envelope, "created_at": datetime.now(timezone.utc)}
+        await asyncio.to_thread(self.collection.insert_one, doc)
+
+    async def _listen(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._watch)
+            except Exception as e:
+                logger.warning(f"Change stream lost ({e}), retrying in 2s")
+            if self._stop.is_set():
+                return
+            await asyncio.sleep(2)
+
+    def _watch(self):
+        # Runs in a thread: pymongo change streams are blocking
+        loop = self._loop
+        if loop is None or self._stop.is_set():
+            return
+        self._idle.clear()
+        try:
+            pipeline = [{"$match": {"operationType": "insert"}}]
+            with self.collection.watch(pipeline, max_await_time_ms=1000) as stream:
+                while not self._stop.is_set():
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    envelope = change["fullDocument"]
+                    envelope.pop("_id", None)
+                    envelope.pop("created_at", None)
+                    asyncio.run_coroutine_threadsafe(self._deliver(envelope), loop)
+        finally:
+            self._idle.set()
+
+
+def create_event_bus(db=None) -> EventBus:
+    """
+    Bus selected by EVENT_BUS ("local", "redis" or "mongo").
+
+    Args:
+        db: pymongo Database for the "mongo" backend
+    """
+    backend = os.getenv("EVENT_BUS", "local").lower()
+    channel = os.getenv("EVENT_BUS_CHANNEL", "yourparty-events")
+    if backend == "redis":
+        return RedisBus(os.getenv("EVENT_BUS_URL", "redis://localhost:6379/0"), channel)
+    if backend == "mongo":
+        if db is None:
+            raise RuntimeError("EVENT_BUS=mongo requires a MongoDB connection")
+        return MongoBus(db[channel.replace("-", "_")])
+    if backend != "local":
+        logger.warning(f"Unknown EVENT_BUS={backend!r}, using local")
+    return InProcessBus(channel)
@@ -0,0 +1,159 @@
+"""
+Shared HTTP Client
+
+One pooled httpx.AsyncClient per process for upstream calls (AzuraCast,
+n8n), instead of a new client - and a new TCP/TLS handshake - per request.
+The client is opened and closed by the app lifespan; timeouts are set per
+call because a now-playing poll and a media update have very different
+budgets.
+
+Configuration (environment):
+- HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE: pool limits
+- HTTP_KEEPALIVE_EXPIRY: seconds an idle connection is kept open
+- HTTP_TIMEOUT: default timeout for calls that don't pass one
+- HTTP2: "true" to negotiate HTTP/2 (needs the optional `h2` package)
+"""
+
+import os
+import time
+import logging
+from typing import Optional
+
+import httpx
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger("HTTPPool")
+
+HTTP_INFLIGHT = Gauge('upstream_http_inflight_requests', 'Upstream HTTP requests in flight', ['upstream'])
+HTTP_LATENCY = Histogram(
+    'upstream_http_request_seconds',
+    'Latency of upstream HTTP requests',
+    ['upstream', 'method'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+HTTP_POOL_CONNECTIONS = Gauge(
+    'upstream_http_pool_connections',
+    'Pooled upstream connections by state',
+    ['upstream', 'state']
+)
+HTTP_POOL_MAX = Gauge('upstream_http_pool_max_connections', 'Configured upstream connection limit', ['upstream'])
+
+
+class SharedHTTPClient:
+    """
+    Lazily created, process-wide httpx.AsyncClient with pool metrics.
+    """
+
+    def __init__(
+        self,
+        name: str = "upstream",
+        timeout: float = 10.0,
+        max_connections: int = 50,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            name: Upstream label for metrics
+            timeout: Default timeout in seconds for calls that don't pass one
+            max_connections: Maximum concurrent connections
+            max_keepalive: Idle connections kept for reuse
+            keepalive_expiry: Seconds before an idle connection is closed
+            http2: Negotiate HTTP/2 when the `h2` package is installed
+            transport: Replaces the pooled transport (e.g. httpx.MockTransport in tests)
+        """
+        self.name = name
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP2=true but the 'h2' package is not installed, using HTTP/1.1")
+                self.http2 = False
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        HTTP_POOL_MAX.labels(name).set(max_connections)
+
+    @classmethod
+    def from_env(cls, name: str = "upstream") -> "SharedHTTPClient":
+        return cls(
+            name=name,
+            timeout=float(os.getenv("HTTP_TIMEOUT", "10")),
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")),
+            max_keepalive=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+            http2=os.getenv("HTTP2", "false").lower() == "true",
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so calls made outside the lifespan still work.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                follow_redirects=True,
+                verify=False,
+                transport=self.transport,
+            )
+        return self._client
+
+    async def start(self):
+        self.client
+        logger.info(f"HTTP pool '{self.name}' ready (limits={self.limits}, http2={self.http2})")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._sample_pool()
+
+    async def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request through the shared pool.
+
+        Args:
+            method: HTTP method
+            url: Absolute URL
+            timeout: Per-call timeout in seconds (defaults to the client timeout)
+
+        Returns:
+            The httpx response (status is not checked)
+        """
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        inflight = HTTP_INFLIGHT.labels(self.name)
+        inflight.inc()
+        started = time.perf_counter()
+        try:
+            return await self.client.request(method, url, **kwargs)
+        finally:
+            inflight.dec()
+            HTTP_LATENCY.labels(self.name, method).observe(time.perf_counter() - started)
+            self._sample_pool()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    def _sample_pool(self):
+        # httpx has no public pool stats; read httpcore's pool defensively.
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        HTTP_POOL_CONNECTIONS.labels(self.name, "active").set(len(connections) - idle)
+        HTTP_POOL_CONNECTIONS.labels(self.name, "idle").set(idle)
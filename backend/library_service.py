@@ -47,14 +47,12 @@ class LibraryService:
         try:
             tracks = list(self.mongo.tracks_collection.find())
             
-            # Enrich with ratings
+            # Enrich with ratings (one batched summary lookup for the whole library).
+            # ObjectId/datetime values are left as-is; serialization.py encodes them.
+            ratings = self.mongo.get_track_ratings([t['song_id'] for t in tracks if 'song_id' in t])
             for track in tracks:
                 if 'song_id' in track:
-                    rating = self.mongo.get_track_rating(song_id=track['song_id'])
-                    track['rating'] = rating
-                
-                # Convert ObjectId to string for JSON
-                track['_id'] = str(track['_id'])
+                    track['rating'] = ratings.get(track['song_id'])
             
             logger.info(f"Loaded {len(tracks)} tracks from database")
             return tracks
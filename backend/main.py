@@ -1,18 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import time
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 from datetime import timedelta
 
 import httpx
-from fastapi import BackgroundTasks, FastAPI, Request, Depends, HTTPException, status
+from fastapi import BackgroundTasks, FastAPI, Request, Depends, HTTPException, Query, status
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.requests import HTTPConnection
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from mutagen.id3 import ID3, TXXX
 
@@ -72,63 +74,86 @@ moods_col = db["moods"]
 steering_col = db["steering"]
 steering_votes_col = db["steering_votes"]
 
-def get_steering_state():
-    # Check if we have an active "forced" override (Admin)
-    state = steering_col.find_one({"_id": "current"})
-    
-    # Handle missing state doc
-    if not state:
-        state = {"state": {"mode": "auto"}}
 
-    # Check community votes if mode is auto or community
-    # Logic: If Admin Mode is 'auto', we look at community votes from last 10 mins
-    admin_mode = state.get("state", {}).get("mode", "auto")
-    admin_target = state.get("state", {}).get("target")
+def ensure_indexes():
+    # (updated_at, _id) backs the ?since= delta sync of /ratings and /moods
+    ratings_col.create_index([("updated_at", 1), ("_id", 1)])
+    moods_col.create_index([("updated_at", 1), ("_id", 1)])
+
+from steering_cache import SteeringStateCache
+from counter_pipelines import apply_increments, mood_update_pipeline, rating_increments, rating_update_pipeline
+from vote_tally import SlidingTally
+from http_pool import SharedHTTPClient
+from nowplaying_cache import PolledPayload, UpstreamError
+from webhook_ingest import AzuraCastWebhookReceiver, WebhookError
+from media_catalog import MediaCatalog
+from song_enrichment import load_song_enrichment
+from collection_sync import SYNC_PAGE_MAX, sync_page, sync_stream
+from serialization import dumps_json, negotiated_response
+from ws_manager import ConnectionManager
+from event_bus import create_event_bus
+from conditional import ResourceVersions, check_conditional, make_etag, request_variant
+
+# Version tokens behind the ETags of /ratings and /moods (and WebSocket frame cache keys)
+resource_versions = ResourceVersions()
+
+# Relays votes, steering changes and cache invalidations between uvicorn workers (EVENT_BUS)
+event_bus = create_event_bus(db)
+
+
+def resources_changed(*names: str):
+    """Move the ETag validators of `names` forward here and in the other workers."""
+    if names:
+        event_bus.publish("resources", {"versions": resource_versions.bump(*names), "at": time.time()})
+
+
+event_bus.on("resources", lambda data: resource_versions.apply(data["versions"], data.get("at")))
+
+
+def newest_updated_at(collection) -> float:
+    """Newest updated_at in `collection`, answered from the (updated_at, _id) index alone."""
+    doc = collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+    return (doc or {}).get("updated_at") or 0
+
+
+def seed_resource_versions():
+    resource_versions.seed("ratings", newest_updated_at(ratings_col))
+    resource_versions.seed("moods", newest_updated_at(moods_col))
+
+
+# Admin override + community votes of the last 10 minutes, served from memory
+steering_cache = SteeringStateCache(steering_col, steering_votes_col, window_seconds=600)
+
+
+def get_steering_state():
+    return steering_cache.get()
 
-    if admin_mode != "auto":
-        return {"mode": admin_mode, "target": admin_target, "source": "admin"}
-        
-    # Community Logic
-    # Get votes from last 10 minutes
-    cutoff = int(time.time()) - 600
-    pipeline = [
-        {"$match": {"timestamp": {"$gt": cutoff}}},
-        {"$group": {"_id": "$vote", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    votes = list(steering_votes_col.aggregate(pipeline))
-    if votes:
-        winner = votes[0]["_id"]
-        return {"mode": "mood", "target": winner, "source": "community"}
-        
-    return {"mode": "auto", "target": None, "source": "random"}
 
 def set_steering_state(mode: str, target: str = None):
-    steering_col.update_one(
-        {"_id": "current"},
-        {"$set": {"state": {"mode": mode, "target": target}, "updated_at": int(time.time())}},
-        upsert=True
-    )
+    steering_cache.set_admin(mode, target)
+    event_bus.publish("steering_admin", {"mode": mode, "target": target})
+
+
+EMPTY_RATING = {
+    "like": 0,
+    "dislike": 0,
+    "neutral": 0,
+    "distribution": {str(k): 0 for k in range(1, 6)},
+    "total": 0,
+    "average": 0.0,
+    "updated_at": 0,
+}
 
-def get_rating_counts(song_id: str) -> Dict[str, Any]:
-    entry = ratings_col.find_one({"_id": song_id})
+
+def format_rating(entry: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Normalize a ratings_col document into the public counter shape."""
     if not entry:
-        return {
-            "like": 0,
-            "dislike": 0,
-            "neutral": 0,
-            "distribution": {str(k): 0 for k in range(1, 6)},
-            "total": 0,
-            "average": 0.0,
-            "updated_at": 0,
-        }
-    
+        return {**EMPTY_RATING, "distribution": dict(EMPTY_RATING["distribution"])}
+
     dist = entry.get("distribution", {})
     # Ensure keys are strings for JSON response
     normalized_dist = {str(k): dist.get(str(k), 0) for k in range(1, 6)}
-    
+
     return {
         "like": entry.get("like", 0),
         "dislike": entry.get("dislike", 0),
@@ -139,44 +164,93 @@ def get_rating_counts(song_id: str) -> Dict[str, Any]:
         "updated_at": entry.get("updated_at", 0),
     }
 
-def update_rating_in_db(song_id: str, vote: str = None, rating_value: int = None):
-    update_ops = {
-        "$set": {"updated_at": int(time.time())},
-        "$inc": {"total": 0} # Placeholder to ensure $inc exists
-    }
-    
-    inc = {}
-    if vote:
-        inc[vote] = 1
-    
-    if rating_value:
-        inc[f"distribution.{rating_value}"] = 1
-        inc["total"] = 1
-        
-    if inc:
-        update_ops["$inc"] = inc
-    else:
-        del update_ops["$inc"]
 
-    # Upsert the document
+def get_rating_counts(song_id: str) -> Dict[str, Any]:
+    return format_rating(ratings_col.find_one({"_id": song_id}))
+
+
+def update_rating_in_db(song_id: str, vote: str = None, rating_value: int = None) -> Dict[str, Any]:
+    # Single round trip: counters and average are updated atomically and the
+    # final document comes back, so concurrent votes can't write stale averages.
     entry = ratings_col.find_one_and_update(
         {"_id": song_id},
-        update_ops,
+        rating_update_pipeline(rating_increments(vote, rating_value), {"updated_at": int(time.time())}),
         upsert=True,
         return_document=ReturnDocument.AFTER
     )
-    
-    # Recalculate average (MongoDB aggregation or simple math in python)
-    # Simple math here since we have the doc
+    resources_changed("ratings")
+
+    return format_rating(entry)
+
+
+def optimistic_rating(song_id: str, doc: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Persisted rating counters plus whatever is still waiting in the vote buffer.
+
+    Pass `doc` when the ratings document was already loaded (e.g. in a batch).
+    """
+    if doc is None:
+        doc = ratings_col.find_one({"_id": song_id})
+    entry = apply_increments(doc or {}, vote_buffer.pending_inc(ratings_col, song_id))
     dist = entry.get("distribution", {})
-    total_stars = sum(dist.get(str(k), 0) for k in range(1, 6))
-    weighted_sum = sum(k * dist.get(str(k), 0) for k in range(1, 6))
-    
-    new_avg = round(weighted_sum / total_stars, 3) if total_stars > 0 else 0.0
-    
-    ratings_col.update_one({"_id": song_id}, {"$set": {"average": new_avg}})
-    
-    return get_rating_counts(song_id)
+    stars = sum(dist.get(str(k), 0) for k in range(1, 6))
+    weighted = sum(k * dist.get(str(k), 0) for k in range(1, 6))
+    entry["average"] = round(weighted / stars, 3) if stars > 0 else 0.0
+    return format_rating(entry)
+
+
+def optimistic_moods(song_id: str, doc: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    if doc is None:
+        doc = moods_col.find_one({"_id": song_id})
+    entry = apply_increments(doc or {}, vote_buffer.pending_inc(moods_col, song_id))
+    for field, top in (("moods", "top_mood"), ("genres", "top_genre")):
+        counts = entry.get(field) or {}
+        if counts:
+            entry[top] = max(counts, key=counts.get)
+    return entry
+
+
+# ---------------------------------------------------------------------------
+# Vote write-behind buffer
+# ---------------------------------------------------------------------------
+
+from vote_buffer import VoteBuffer
+
+VOTE_BUFFER_ENABLED = os.getenv("VOTE_BUFFER_ENABLED", "true").lower() == "true"
+
+vote_logs_col = db["vote_logs"]
+
+vote_buffer = VoteBuffer(
+    flush_interval=int(os.getenv("VOTE_FLUSH_INTERVAL_MS", "250")) / 1000,
+    flush_ops=int(os.getenv("VOTE_FLUSH_MAX_OPS", "500")),
+    max_pending=int(os.getenv("VOTE_BUFFER_MAX_PENDING", "10000")),
+    # Buffered votes only change what /ratings and /moods return once they are flushed
+    on_flush=lambda names: resources_changed(*(n for n in ("ratings", "moods") if n in names)),
+)
+vote_buffer.register(ratings_col, rating_update_pipeline)
+vote_buffer.register(moods_col, mood_update_pipeline)
+vote_buffer.register(vote_logs_col)
+vote_buffer.register(steering_votes_col)
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting (in-memory, per route)
+# ---------------------------------------------------------------------------
+
+from rate_limiter import SlidingWindowLimiter
+
+
+def shared_limiter(name: str, env: str, default: str) -> SlidingWindowLimiter:
+    """Per-IP limiter whose allowed hits are relayed, so the limit holds across all workers."""
+    limiter = SlidingWindowLimiter.from_env(
+        env, default, on_hit=lambda key: event_bus.publish("rate_hit", {"limiter": name, "key": key})
+    )
+    event_bus.on("rate_hit", lambda data: limiter.record(data["key"]) if data.get("limiter") == name else None)
+    return limiter
+
+
+rate_limiter = shared_limiter("rate", "RATE_LIMIT_RATE", "10/600")
+mood_tag_limiter = shared_limiter("mood_tag", "RATE_LIMIT_MOOD_TAG", "30/600")
+vote_next_limiter = shared_limiter("vote_next", "RATE_LIMIT_VOTE_NEXT", "1/5")
 
 
 # ---------------------------------------------------------------------------
@@ -187,14 +261,47 @@ AZURACAST_URL = os.getenv("AZURACAST_URL", "http://192.168.178.210")
 AZURACAST_API_KEY = os.getenv("AZURACAST_API_KEY")
 MUSIC_DIR = Path(os.getenv("MUSIC_DIR", "/var/radio/music"))
 
+# One pooled client for every upstream call (AzuraCast, n8n)
+http_client = SharedHTTPClient.from_env("azuracast")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
     if not AZURACAST_URL or not AZURACAST_API_KEY:
         print("[WARN] AZURACAST_URL or AZURACAST_API_KEY missing  API will not function correctly.")
+    await http_client.start()
+    if VOTE_BUFFER_ENABLED:
+        await vote_buffer.start()
+    try:
+        await asyncio.to_thread(ensure_indexes)
+    except Exception as e:
+        print(f"[WARN] Could not ensure MongoDB indexes: {e}")
+    try:
+        # Index-only reads; every worker starts /ratings and /moods from the same ETag
+        await asyncio.to_thread(seed_resource_versions)
+    except Exception as e:
+        print(f"[WARN] Could not seed ETag versions: {e}")
+    try:
+        await asyncio.to_thread(steering_cache.warm)
+        await asyncio.to_thread(warm_community_votes)
+    except Exception as e:
+        print(f"[WARN] Steering cache warm-up failed, will load lazily: {e}")
+    await event_bus.start()
+    vote_broadcaster = asyncio.create_task(vote_broadcast_loop())
+    await status_cache.start()
+    await history_cache.start()
+    await media_catalog.start()
     yield
-    # shutdown (no-op)
+    # shutdown: persist any buffered votes before the process exits
+    vote_broadcaster.cancel()
+    await event_bus.close()
+    await status_cache.close()
+    await history_cache.close()
+    await media_catalog.close()
+    await manager.close()
+    await http_client.close()
+    await vote_buffer.close()
 
 
 # attach lifespan to the app
@@ -232,122 +339,250 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
 
 
-@app.get("/status")
-async def get_enriched_status():
-    url = f"{AZURACAST_URL}/api/nowplaying/1"
+
+
+async def fetch_azuracast(path: str, timeout: float = 10) -> Any:
+    url = f"{AZURACAST_URL}{path}"
     headers = {"Authorization": f"Bearer {AZURACAST_API_KEY}"}
 
     try:
-        async with httpx.AsyncClient(timeout=60, follow_redirects=True, verify=False) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+        response = await http_client.get(url, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as exc:
-        return JSONResponse(
-            status_code=exc.response.status_code,
-            content={"error": f"AzuraCast HTTP {exc.response.status_code}", "details": exc.response.text},
+        raise UpstreamError(
+            exc.response.status_code,
+            {"error": f"AzuraCast HTTP {exc.response.status_code}", "details": exc.response.text},
         )
     except httpx.RequestError as exc:
-        return JSONResponse(status_code=502, content={"error": f"AzuraCast unreachable: {exc}"})
-
-    if isinstance(data, dict):
-        now_playing = data.get("now_playing") or {}
-        song = now_playing.get("song") or {}
-        song_id = song.get("id")
-        if song_id:
-            # Add rating data
-            song["rating"] = get_rating_counts(song_id)
-            # Add mood data
-            mood_doc = moods_col.find_one({"_id": song_id}) or {}
-            song["moods"] = mood_doc.get("moods", {})
-            song["top_mood"] = mood_doc.get("top_mood")
-            song["genres"] = mood_doc.get("genres", {})
-            song["top_genre"] = mood_doc.get("top_genre")
-            data["now_playing"]["song"] = song
-
-    return data
+        raise UpstreamError(502, {"error": f"AzuraCast unreachable: {exc}"})
+
+
+def song_enrichment(song_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Rating and mood fields merged into AzuraCast song objects, including buffered votes."""
+    return load_song_enrichment(ratings_col, moods_col, song_ids, optimistic_rating, optimistic_moods)
+
+
+def now_playing_songs(data: Any) -> List[Dict[str, Any]]:
+    if not isinstance(data, dict):
+        return []
+    song = (data.get("now_playing") or {}).get("song")
+    return [song] if song else []
+
+
+def history_songs(data: Any) -> List[Dict[str, Any]]:
+    if not isinstance(data, list):
+        return []
+    return [entry.get("song") for entry in data if isinstance(entry, dict) and entry.get("song")]
+
+
+async def broadcast_song_change(data: Any):
+    songs = now_playing_songs(data)
+    if songs:
+        await manager.broadcast({"type": "song", "song": songs[0]})
+
+
+# AzuraCast pushes now-playing changes to /webhooks/azuracast when a secret is configured;
+# polling then only runs as a slow safety net.
+webhook_receiver = AzuraCastWebhookReceiver.from_env()
+NOWPLAYING_POLL_DEFAULT = "60" if webhook_receiver.enabled else "5"
+NOWPLAYING_MAX_AGE_DEFAULT = "90" if webhook_receiver.enabled else "15"
+
+# AzuraCast payloads are polled once per process and served to every listener from memory.
+status_cache = PolledPayload(
+    "nowplaying",
+    lambda: fetch_azuracast("/api/nowplaying/1"),
+    now_playing_songs,
+    song_enrichment,
+    poll_interval=float(os.getenv("NOWPLAYING_POLL_SECONDS", NOWPLAYING_POLL_DEFAULT)),
+    max_age=float(os.getenv("NOWPLAYING_MAX_AGE_SECONDS", NOWPLAYING_MAX_AGE_DEFAULT)),
+    on_change=broadcast_song_change,
+)
+history_cache = PolledPayload(
+    "history",
+    lambda: fetch_azuracast("/api/station/1/history"),
+    history_songs,
+    song_enrichment,
+    poll_interval=float(os.getenv("HISTORY_POLL_SECONDS", "30")),
+    max_age=float(os.getenv("HISTORY_MAX_AGE_SECONDS", "60")),
+)
+
+
+def mark_song_dirty(song_id: str, relay: bool = True):
+    """A vote changed this song; cached payloads containing it re-enrich on next read."""
+    status_cache.mark_dirty(song_id)
+    history_cache.mark_dirty(song_id)
+    media_catalog.mark_dirty(song_id)
+    if relay:
+        event_bus.publish("song_dirty", {"song_id": song_id})
+
+
+event_bus.on("song_dirty", lambda data: mark_song_dirty(data["song_id"], relay=False))
+
+
+@app.get("/status")
+async def get_enriched_status(request: Request):
+    try:
+        data = await status_cache.get()
+    except UpstreamError as exc:
+        return JSONResponse(status_code=exc.status_code, content=exc.content)
+
+    not_modified, headers = check_conditional(
+        request, make_etag("status", status_cache.digest), status_cache.updated_at, max_age=2
+    )
+    if not_modified:
+        return not_modified
+    return JSONResponse(content=data, headers=headers)
 
 
 @app.get("/history")
 async def get_history():
-    url = f"{AZURACAST_URL}/api/station/1/history"
-    headers = {"Authorization": f"Bearer {AZURACAST_API_KEY}"}
+    try:
+        return await history_cache.get()
+    except UpstreamError as exc:
+        return JSONResponse(status_code=exc.status_code, content=exc.content)
+
 
+@app.post("/webhooks/azuracast")
+async def azuracast_webhook(request: Request):
+    """AzuraCast "Generic Web Hook" target (song changed / listener triggers)."""
     try:
-        async with httpx.AsyncClient(timeout=60, follow_redirects=True, verify=False) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-    except httpx.HTTPStatusError as exc:
-        return JSONResponse(
-            status_code=exc.response.status_code,
-            content={"error": f"AzuraCast HTTP {exc.response.status_code}", "details": exc.response.text},
-        )
-    except httpx.RequestError as exc:
-        return JSONResponse(status_code=502, content={"error": f"AzuraCast unreachable: {exc}"})
+        webhook_receiver.authenticate(request.headers)
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            raise WebhookError(400, "Invalid JSON payload.")
+        event = webhook_receiver.ingest(payload)
+    except WebhookError as exc:
+        return JSONResponse(status_code=exc.status_code, content={"error": str(exc)})
+
+    if event is None:
+        return {"status": "ignored"}
+
+    # Only one worker receives the webhook; the others take the payload from the bus
+    event_bus.publish("nowplaying", {"payload": payload})
+    await apply_pushed_nowplaying(payload, event)
+    return {"status": "ok", "event": event}
+
+
+async def apply_pushed_nowplaying(payload: Any, event: str):
+    await status_cache.push(payload)
+    if event == "song_changed":
+        history_cache.expire()
+
+
+async def relayed_nowplaying(data: Dict[str, Any]):
+    try:
+        # Also keeps this worker's de-duplication state in step with the receiving worker
+        event = webhook_receiver.ingest(data["payload"])
+    except WebhookError:
+        return
+    if event is not None:
+        await apply_pushed_nowplaying(data["payload"], event)
+
+
+event_bus.on("nowplaying", relayed_nowplaying)
 
-    if isinstance(data, list):
-        for entry in data:
-            song = entry.get("song") if isinstance(entry, dict) else None
-            song_id = song.get("id") if isinstance(song, dict) else None
-            if song_id:
-                # Add rating data
-                song["rating"] = get_rating_counts(song_id)
-                # Add mood data
-                mood_doc = moods_col.find_one({"_id": song_id}) or {}
-                song["moods"] = mood_doc.get("moods", {})
-                song["top_mood"] = mood_doc.get("top_mood")
-                song["genres"] = mood_doc.get("genres", {})
-                song["top_genre"] = mood_doc.get("top_genre")
 
-    return data
+# Local mirror of the AzuraCast media listing, refreshed in the background
+media_catalog = MediaCatalog(
+    lambda: fetch_azuracast("/api/station/1/files", timeout=60),
+    song_enrichment,
+    refresh_interval=float(os.getenv("MEDIA_CATALOG_REFRESH_SECONDS", "600")),
+)
+LIBRARY_PAGE_DEFAULT = 100
+LIBRARY_PAGE_MAX = 500
 
 
 @app.get("/library")
-async def get_library():
-    # AzuraCast API: /api/station/{station_id}/files
-    url = f"{AZURACAST_URL}/api/station/1/files"
-    headers = {"Authorization": f"Bearer {AZURACAST_API_KEY}"}
+async def get_library(
+    request: Request,
+    offset: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=LIBRARY_PAGE_MAX),
+    artist: str | None = None,
+    playlist: str | None = None,
+    mood: str | None = None,
+    fields: str | None = None,
+):
+    """
+    Media library, filterable by artist / playlist / mood; `fields` is a comma-separated projection.
 
+    With offset or limit, one page in an envelope (total, version, items);
+    limit defaults to LIBRARY_PAGE_DEFAULT and is capped at LIBRARY_PAGE_MAX.
+    Without them, the bare list of every matching file, as before pagination existed.
+    """
     try:
-        async with httpx.AsyncClient(timeout=60, follow_redirects=True, verify=False) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-    except httpx.HTTPStatusError as exc:
-        return JSONResponse(
-            status_code=exc.response.status_code,
-            content={"error": f"AzuraCast HTTP {exc.response.status_code}", "details": exc.response.text},
-        )
-    except httpx.RequestError as exc:
-        return JSONResponse(status_code=502, content={"error": f"AzuraCast unreachable: {exc}"})
+        await media_catalog.ensure_loaded()
+    except UpstreamError as exc:
+        return JSONResponse(status_code=exc.status_code, content=exc.content)
+
+    paginated = offset is not None or limit is not None
+    page = media_catalog.query(
+        offset=offset or 0,
+        limit=(LIBRARY_PAGE_DEFAULT if limit is None else limit) if paginated else None,
+        artist=artist,
+        playlist=playlist,
+        mood=mood,
+        fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+    )
+    return negotiated_response(request, page if paginated else page["items"])
+
+
+def client_ip(request: HTTPConnection) -> str:
+    """Client address of an HTTP request or WebSocket (behind the nginx proxy)."""
+    forwarded = request.headers.get("X-Forwarded-For")
+    return forwarded.split(",")[0].strip() if forwarded else request.client.host
+
+
+class VoteError(Exception):
+    """A vote was rejected; carries the HTTP status the route answers with."""
+
+    def __init__(self, status_code: int, message: str, retry_after: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
 
-    return data
+def vote_error_response(exc: VoteError) -> JSONResponse:
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+    return JSONResponse(status_code=exc.status_code, content={"error": str(exc)}, headers=headers)
+
+
+def rate_limited(limiter: SlidingWindowLimiter, key: str, message: str) -> JSONResponse | None:
+    if limiter.hit(key):
+        return None
+    return JSONResponse(
+        status_code=429,
+        content={"error": message},
+        headers={"Retry-After": str(limiter.retry_after(key))},
+    )
 
 
 @app.post("/rate")
 async def rate_track(request: Request, background_tasks: BackgroundTasks):
-    forwarded = request.headers.get("X-Forwarded-For")
-    ip = forwarded.split(",")[0] if forwarded else request.client.host
-    
-    # Check rate limit (10 votes per 10 minutes per IP)
-    cutoff = int(time.time()) - 600
-    recent_votes = db["vote_logs"].count_documents({
-        "ip": ip,
-        "updated_at": {"$gt": cutoff}
-    })
-    
-    if recent_votes > 10:
-        return JSONResponse(status_code=429, content={"error": "Rate limit exceeded. Try again later."})
+    ip = client_ip(request)
+
+    # Check rate limit (10 votes per 10 minutes per IP by default)
+    throttled = rate_limited(rate_limiter, ip, "Rate limit exceeded. Try again later.")
+    if throttled:
+        return throttled
 
     try:
         payload = await request.json()
     except json.JSONDecodeError:
         return JSONResponse(status_code=400, content={"error": "Invalid JSON payload."})
 
+    try:
+        return submit_rating(payload, ip, background_tasks)
+    except VoteError as exc:
+        return vote_error_response(exc)
+
+
+def submit_rating(payload: Dict[str, Any], ip: str, background_tasks: BackgroundTasks) -> Dict[str, Any]:
+    """Validate and store a like/dislike and/or star rating (shared by /rate and the WebSocket)."""
     song_id = str(payload.get("song_id", "")).strip()
     if not song_id:
-        return JSONResponse(status_code=400, content={"error": "'song_id' is required."})
+        raise VoteError(400, "'song_id' is required.")
 
     vote = payload.get("vote")
     if isinstance(vote, str):
@@ -366,50 +601,51 @@ async def rate_track(request: Request, background_tasks: BackgroundTasks):
         rating_value = None
 
     if vote and vote not in {"like", "dislike", "neutral"}:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "Invalid vote. Must be one of 'like', 'dislike', 'neutral'."},
-        )
+        raise VoteError(400, "Invalid vote. Must be one of 'like', 'dislike', 'neutral'.")
 
     if vote is None and rating_value is None:
-        return JSONResponse(
-            status_code=400,
-            content={"error": "Provide at least one of 'vote' or numeric 'rating'."},
-        )
+        raise VoteError(400, "Provide at least one of 'vote' or numeric 'rating'.")
 
     # --- METADATA SYNC (Robustness Fix) ---
     # If the frontend sends title/artist, update our metadata store (moods_col)
     title = str(payload.get("title", "")).strip()
     artist = str(payload.get("artist", "")).strip()
     
+    now = int(time.time())
     if title or artist:
-        update_meta = { "$set": { "updated_at": int(time.time()) } }
-        if title: update_meta["$set"]["title"] = title
-        if artist: update_meta["$set"]["artist"] = artist
-        
+        meta = {"updated_at": now}
+        if title: meta["title"] = title
+        if artist: meta["artist"] = artist
+
         # Upsert into moods collection (which serves as our master metadata list)
-        moods_col.update_one({"_id": song_id}, update_meta, upsert=True)
+        if not vote_buffer.stage_update(moods_col, song_id, {}, meta):
+            moods_col.update_one({"_id": song_id}, {"$set": meta}, upsert=True)
+            resources_changed("moods")
 
-    # Update DB
-    new_counts = update_rating_in_db(song_id, vote, rating_value)
-    
-    # Log vote for rate limiting
-    db["vote_logs"].insert_one({
+    # Update DB (write-behind when the buffer has room, direct otherwise)
+    if vote_buffer.stage_update(ratings_col, song_id, rating_increments(vote, rating_value), {"updated_at": now}):
+        new_counts = optimistic_rating(song_id)
+    else:
+        new_counts = update_rating_in_db(song_id, vote, rating_value)
+
+    mark_song_dirty(song_id)
+
+    # Audit log of individual votes (rate limiting itself is in-memory)
+    vote_log = {
         "ip": ip,
         "song_id": song_id,
         "vote": vote,
         "rating": rating_value,
-        "updated_at": int(time.time())
-    })
+        "updated_at": now
+    }
+    if not vote_buffer.stage_insert(vote_logs_col, vote_log):
+        vote_logs_col.insert_one(vote_log)
 
-    # Trigger ID3 writeback
-    background_tasks.add_task(write_metadata_to_id3, song_id)
-    
-    # Trigger Playlist Curation (Fetch new average first)
-    updated_doc = ratings_col.find_one({"_id": song_id})
-    if updated_doc:
-         avg = updated_doc.get("average", 0.0)
-         background_tasks.add_task(sync_rating_to_playlist, song_id, avg)
+    # Trigger ID3 writeback with the counters including this vote
+    background_tasks.add_task(write_metadata_to_id3, song_id, rating_entry=new_counts)
+
+    # Trigger Playlist Curation with the average returned by the atomic update
+    background_tasks.add_task(sync_rating_to_playlist, song_id, new_counts["average"])
 
     return {
         "status": "ok",
@@ -420,64 +656,120 @@ async def rate_track(request: Request, background_tasks: BackgroundTasks):
     }
 
 
+def format_mood(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize a moods_col document into the public shape."""
+    return {
+        "title": doc.get("title", ""),
+        "artist": doc.get("artist", ""),
+        "moods": doc.get("moods", {}),
+        "genres": doc.get("genres", {}),
+        "top_mood": doc.get("top_mood"),
+        "top_genre": doc.get("top_genre"),
+        "total_votes": doc.get("total_votes", 0),
+        "updated_at": doc.get("updated_at", 0),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Incremental sync for /ratings and /moods (cursor / since / NDJSON, see collection_sync)
+# ---------------------------------------------------------------------------
+
+# Micro-cache window for the gateway; ETags keep revalidation cheap after that
+SYNC_CACHE_MAX_AGE = 5
+
+
+def wants_ndjson(request: Request, fmt: str | None) -> bool:
+    return fmt == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+
+
+def sync_collection(collection, formatter, request: Request, limit: int | None, cursor: str | None,
+                    since: int | None, fmt: str | None, headers: Dict[str, str] | None = None):
+    try:
+        if wants_ndjson(request, fmt):
+            lines, watermark = sync_stream(collection, formatter, since, cursor, limit)
+            return StreamingResponse(
+                lines,
+                media_type="application/x-ndjson",
+                headers={**(headers or {}), "X-Sync-Watermark": str(watermark)},
+            )
+        page = sync_page(collection, formatter, since, cursor, limit)
+    except (ValueError, TypeError):
+        return JSONResponse(status_code=400, content={"error": "Invalid cursor."})
+    return negotiated_response(request, page, headers=headers)
+
+
 @app.get("/ratings")
-def get_all_ratings():
-    # Fetch all ratings from DB
-    cursor = ratings_col.find({})
-    results = {}
-    for doc in cursor:
-        song_id = doc["_id"]
-        dist = doc.get("distribution", {})
-        normalized_dist = {str(k): dist.get(str(k), 0) for k in range(1, 6)}
-        
-        results[song_id] = {
-            "like": doc.get("like", 0),
-            "dislike": doc.get("dislike", 0),
-            "neutral": doc.get("neutral", 0),
-            "distribution": normalized_dist,
-            "total": doc.get("total", 0),
-            "average": doc.get("average", 0.0),
-            "updated_at": doc.get("updated_at", 0),
-        }
-    return results
+def get_all_ratings(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=SYNC_PAGE_MAX),
+    cursor: str | None = None,
+    since: int | None = None,
+    fmt: str | None = Query(None, alias="format"),
+):
+    not_modified, headers = check_conditional(
+        request,
+        make_etag("ratings", resource_versions.version("ratings"), request_variant(request)),
+        resource_versions.last_modified("ratings"),
+        max_age=SYNC_CACHE_MAX_AGE,
+    )
+    if not_modified:
+        return not_modified
+    if limit is None and cursor is None and since is None and not wants_ndjson(request, fmt):
+        # Legacy full dump, kept for the control page
+        return negotiated_response(request, {doc["_id"]: format_rating(doc) for doc in ratings_col.find({})}, headers=headers)
+    return sync_collection(ratings_col, format_rating, request, limit, cursor, since, fmt, headers)
 
 
 @app.get("/moods")
-def get_all_moods():
-    # Fetch all mood data from DB
-    cursor = moods_col.find({})
-    results = {}
-    for doc in cursor:
-        song_id = doc["_id"]
-        results[song_id] = {
-            "title": doc.get("title", ""),
-            "artist": doc.get("artist", ""),
-            "moods": doc.get("moods", {}),
-            "genres": doc.get("genres", {}),
-            "top_mood": doc.get("top_mood"),
-            "top_genre": doc.get("top_genre"),
-            "total_votes": doc.get("total_votes", 0),
-            "updated_at": doc.get("updated_at", 0),
-        }
-    return results
+def get_all_moods(
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=SYNC_PAGE_MAX),
+    cursor: str | None = None,
+    since: int | None = None,
+    fmt: str | None = Query(None, alias="format"),
+):
+    not_modified, headers = check_conditional(
+        request,
+        make_etag("moods", resource_versions.version("moods"), request_variant(request)),
+        resource_versions.last_modified("moods"),
+        max_age=SYNC_CACHE_MAX_AGE,
+    )
+    if not_modified:
+        return not_modified
+    if limit is None and cursor is None and since is None and not wants_ndjson(request, fmt):
+        # Legacy full dump, kept for the control page
+        return negotiated_response(request, {doc["_id"]: format_mood(doc) for doc in moods_col.find({})}, headers=headers)
+    return sync_collection(moods_col, format_mood, request, limit, cursor, since, fmt, headers)
 
 
 @app.post("/mood-tag")
 async def tag_mood(request: Request, background_tasks: BackgroundTasks):
+    throttled = rate_limited(mood_tag_limiter, client_ip(request), "Rate limit exceeded. Try again later.")
+    if throttled:
+        return throttled
+
     try:
         payload = await request.json()
     except json.JSONDecodeError:
         return JSONResponse(status_code=400, content={"error": "Invalid JSON payload."})
 
+    try:
+        return submit_mood_tag(payload, background_tasks)
+    except VoteError as exc:
+        return vote_error_response(exc)
+
+
+def submit_mood_tag(payload: Dict[str, Any], background_tasks: BackgroundTasks) -> Dict[str, Any]:
+    """Validate and store a mood and/or genre tag (shared by /mood-tag and the WebSocket)."""
     song_id = str(payload.get("song_id", "")).strip()
     mood = str(payload.get("mood", "")).strip().lower()
     genre = str(payload.get("genre", "")).strip().lower()
     
     if not song_id:
-        return JSONResponse(status_code=400, content={"error": "song_id is required."})
+        raise VoteError(400, "song_id is required.")
 
     if not mood and not genre:
-        return JSONResponse(status_code=400, content={"error": "At least one of mood or genre is required."})
+        raise VoteError(400, "At least one of mood or genre is required.")
 
     valid_moods = {"energetic", "chill", "dark", "euphoric", "melancholic", "groovy", "hypnotic", "aggressive", "trippy", "warm"}
     valid_genres = {
@@ -487,51 +779,39 @@ async def tag_mood(request: Request, background_tasks: BackgroundTasks):
     }
 
     if mood and mood not in valid_moods:
-        return JSONResponse(status_code=400, content={"error": f"Invalid mood. Must be one of {valid_moods}"})
+        raise VoteError(400, f"Invalid mood. Must be one of {valid_moods}")
     
     if genre and genre not in valid_genres:
-        return JSONResponse(status_code=400, content={"error": f"Invalid genre. Must be one of {valid_genres}"})
+        raise VoteError(400, f"Invalid genre. Must be one of {valid_genres}")
 
     # Update DB
-    update_ops = {
-        "$set": {
-            "updated_at": int(time.time()),
-            "title": payload.get("title", ""),
-            "artist": payload.get("artist", "")
-        },
-        "$inc": {
-            "total_votes": 1
-        }
+    meta = {
+        "updated_at": int(time.time()),
+        "title": payload.get("title", ""),
+        "artist": payload.get("artist", "")
     }
-    
+    inc = {"total_votes": 1}
     if mood:
-        update_ops["$inc"][f"moods.{mood}"] = 1
+        inc[f"moods.{mood}"] = 1
     if genre:
-        update_ops["$inc"][f"genres.{genre}"] = 1
-    
-    entry = moods_col.find_one_and_update(
-        {"_id": song_id},
-        update_ops,
-        upsert=True,
-        return_document=ReturnDocument.AFTER
-    )
-    
-    # Calculate top mood
-    moods = entry.get("moods", {})
-    if moods:
-        top_mood = max(moods, key=moods.get)
-        moods_col.update_one({"_id": song_id}, {"$set": {"top_mood": top_mood}})
-        entry["top_mood"] = top_mood
-
-    # Calculate top genre
-    genres = entry.get("genres", {})
-    if genres:
-        top_genre = max(genres, key=genres.get)
-        moods_col.update_one({"_id": song_id}, {"$set": {"top_genre": top_genre}})
-        entry["top_genre"] = top_genre
-
-    # Trigger ID3 writeback
-    background_tasks.add_task(write_metadata_to_id3, song_id)
+        inc[f"genres.{genre}"] = 1
+
+    if vote_buffer.stage_update(moods_col, song_id, inc, meta):
+        entry = optimistic_moods(song_id)
+    else:
+        # top_mood / top_genre are recomputed inside the same atomic update
+        entry = moods_col.find_one_and_update(
+            {"_id": song_id},
+            mood_update_pipeline(inc, meta),
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        resources_changed("moods")
+
+    mark_song_dirty(song_id)
+
+    # Trigger ID3 writeback with the counters including this vote
+    background_tasks.add_task(write_metadata_to_id3, song_id, mood_entry=entry)
     background_tasks.add_task(sync_mood_to_playlist, song_id, mood)
 
     # Flattened response for easier frontend consumption
@@ -555,25 +835,9 @@ async def tag_mood(request: Request, background_tasks: BackgroundTasks):
 # --- WebSocket Manager ---
 from fastapi import WebSocket, WebSocketDisconnect
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-manager = ConnectionManager()
+# Message types clients can subscribe to on /ws/{client_id} (default: all of them)
+WS_TOPICS = ("song", "steering_update", "control_update", "vote_update")
+manager = ConnectionManager.from_env("main", topics=WS_TOPICS)
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
@@ -582,15 +846,81 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     try:
         # Send current steering votes
         votes = get_current_steering_votes()
-        await websocket.send_json({"type": "steering_update", "votes": votes})
+        # Every new client gets the same snapshot until the next vote; encode it once
+        await manager.send(websocket, {"type": "steering_update", "votes": votes},
+                           key=("steering_update", resource_versions.version("steering_votes")))
     except:
         pass
         
+    ip = client_ip(websocket)
+    connection_key = f"ws-{manager.connection_id(websocket)}"
     try:
         while True:
-            await websocket.receive_text()
+            # Subscriptions and heartbeats are handled by the manager, votes below
+            message = await manager.handle_message(websocket, await websocket.receive_text())
+            if message is not None:
+                await handle_ws_vote(websocket, ip, connection_key, message)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
+        ws_vote_limiter.reset(connection_key)
+
+
+# Votes over the socket: {"type": <one of WS_VOTE_LIMITS>, "ref": <echoed back>, ...same
+# fields as the HTTP body}. Every message is answered with
+# {"type": "ack", "ref": ..., "for": <type>, "ok": true, "result": <HTTP response body>}
+# or {"type": "ack", ..., "ok": false, "status": <HTTP status>, "error": ...}.
+WS_VOTE_LIMITS = {
+    # message type -> (per-IP limiter of the matching HTTP route, rejection message)
+    "rate": (rate_limiter, "Rate limit exceeded. Try again later."),
+    "mood_tag": (mood_tag_limiter, "Rate limit exceeded. Try again later."),
+    "vote_next": (None, None),
+    "control_vote_next": (vote_next_limiter, "Too fast (5s cooldown)"),
+}
+# Per-connection cap on vote messages, on top of the per-IP limits shared with HTTP
+# (a connection lives in one worker, so this one is not relayed)
+ws_vote_limiter = SlidingWindowLimiter.from_env("RATE_LIMIT_WS_VOTES", "20/10")
+ws_background_tasks: set = set()
+
+
+async def handle_ws_vote(websocket: WebSocket, ip: str, connection_key: str, message: Dict[str, Any]):
+    kind = message.get("type")
+    ack = {"type": "ack", "ref": message.get("ref"), "for": kind}
+    background_tasks = BackgroundTasks()
+    try:
+        if kind not in WS_VOTE_LIMITS:
+            raise VoteError(400, f"Unknown message type {kind!r}.")
+        if not ws_vote_limiter.hit(connection_key):
+            raise VoteError(429, "Too many messages.", ws_vote_limiter.retry_after(connection_key))
+        limiter, rejection = WS_VOTE_LIMITS[kind]
+        if limiter and not limiter.hit(ip):
+            raise VoteError(429, rejection, limiter.retry_after(ip))
+
+        if kind == "rate":
+            result = submit_rating(message, ip, background_tasks)
+        elif kind == "mood_tag":
+            result = submit_mood_tag(message, background_tasks)
+        elif kind == "vote_next":
+            result = await submit_vibe_vote(message)
+        else:
+            result = submit_steering_vote(message, ip)
+    except VoteError as exc:
+        await manager.send(websocket, {**ack, "ok": False, "status": exc.status_code, "error": str(exc),
+                                       "retry_after": exc.retry_after})
+        return
+    except Exception as e:
+        # The HTTP routes answer 500 here; the client's pending vote must still settle
+        print(f"[ERROR] WS vote failed ({kind}, ref={message.get('ref')}): {e}")
+        await manager.send(websocket, {**ack, "ok": False, "status": 500, "error": "Internal error."})
+        return
+
+    await manager.send(websocket, {**ack, "ok": True, "result": result})
+    if background_tasks.tasks:
+        # Same follow-up work (ID3 writeback, playlist sync) the HTTP routes run after responding
+        task = asyncio.create_task(background_tasks())
+        ws_background_tasks.add(task)
+        task.add_done_callback(ws_background_tasks.discard)
 
 # --- End WebSocket Manager ---
 
@@ -615,18 +945,20 @@ async def vote_next_vibe(request: Request):
     except json.JSONDecodeError:
         return JSONResponse(status_code=400, content={"error": "Invalid JSON payload."})
 
-    vote = payload.get("vote", "").lower().strip()
+    try:
+        return await submit_vibe_vote(payload)
+    except VoteError as exc:
+        return vote_error_response(exc)
+
+
+async def submit_vibe_vote(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Count a vote for the next vibe (shared by /vote-next and the WebSocket)."""
+    vote = str(payload.get("vote") or "").lower().strip()
     if vote not in current_steering_votes:
-        return JSONResponse(status_code=400, content={"error": "Invalid vote option."})
+        raise VoteError(400, "Invalid vote option.")
 
-    # Increment vote
-    current_steering_votes[vote] += 1
-    
-    # Broadcast update
-    await manager.broadcast({
-        "type": "steering_update",
-        "votes": current_steering_votes
-    })
+    await count_vibe_vote(vote)
+    event_bus.publish("vibe_vote", {"vote": vote})
     
     # Get prediction for this mood
     prediction = predict_next_track_for_mood(vote)
@@ -637,6 +969,25 @@ async def vote_next_vibe(request: Request):
         "prediction": prediction
     }
 
+async def count_vibe_vote(vote: str):
+    current_steering_votes[vote] += 1
+    resource_versions.bump("steering_votes")
+
+    # Broadcast update (the frame is reused for clients connecting before the next vote)
+    await manager.broadcast({
+        "type": "steering_update",
+        "votes": current_steering_votes
+    }, key=("steering_update", resource_versions.version("steering_votes")))
+
+
+async def relayed_vibe_vote(data: Dict[str, Any]):
+    if data.get("vote") in current_steering_votes:
+        await count_vibe_vote(data["vote"])
+
+
+event_bus.on("vibe_vote", relayed_vibe_vote)
+
+
 def predict_next_track_for_mood(mood: str):
     """
     Find the likely next track for a given mood based on ratings.
@@ -685,16 +1036,28 @@ async def set_steering(request: Request, current_user: User = Depends(get_curren
     target = payload.get("target")
     
     set_steering_state(mode, target)
+    await announce_steering(mode, target)
     
+    return {"status": "ok", "mode": mode, "target": target}
+
+
+
+async def announce_steering(mode: str, target: str = None):
     await manager.broadcast({
         "type": "control_update",
         "mode": mode,
         "target": target
     })
-    
-    return {"status": "ok", "mode": mode, "target": target}
 
 
+async def relayed_steering_admin(data: Dict[str, Any]):
+    # Already persisted by the publishing worker
+    steering_cache.apply_admin(data["mode"], data.get("target"))
+    await announce_steering(data["mode"], data.get("target"))
+
+
+event_bus.on("steering_admin", relayed_steering_admin)
+
 
 @app.post("/control/vote-next")
 async def vote_next_steering(request: Request):
@@ -702,58 +1065,97 @@ async def vote_next_steering(request: Request):
     Community voting for the next vibe.
     payload: { "vote": "energetic" }
     """
-    # Rate Limit
-    forwarded = request.headers.get("X-Forwarded-For")
-    ip = forwarded.split(",")[0] if forwarded else request.client.host
-    now = int(time.time())
-    
-    # Check rate limit (using a simplified method since I can't inject global easily in this tool call sequence)
-    # Using the steering_votes_col to check recent votes from this IP
-    recent_vote = steering_votes_col.find_one({
-        "ip": ip,
-        "timestamp": {"$gt": now - 5}
-    })
-    
-    if recent_vote:
-         return JSONResponse(status_code=429, content={"error": "Too fast (5s cooldown)"})
+    ip = client_ip(request)
+    throttled = rate_limited(vote_next_limiter, ip, "Too fast (5s cooldown)")
+    if throttled:
+        return throttled
 
     try:
 
         payload = await request.json()
     except json.JSONDecodeError:
         return JSONResponse(status_code=400, content={"error": "Invalid JSON payload."})
-        
-    vote = payload.get("vote", "").lower().strip()
+
+    try:
+        return submit_steering_vote(payload, ip)
+    except VoteError as exc:
+        return vote_error_response(exc)
+
+
+def submit_steering_vote(payload: Dict[str, Any], ip: str) -> Dict[str, Any]:
+    """Record a community steering vote (shared by /control/vote-next and the WebSocket)."""
+    vote = str(payload.get("vote") or "").lower().strip()
     if not vote:
-        return JSONResponse(status_code=400, content={"error": "Vote required"})
+        raise VoteError(400, "Vote required")
         
-    # Record vote
-    steering_votes_col.insert_one({
+    # Record vote (write-behind; the broadcast loop pushes the new standings)
+    now = int(time.time())
+    vote_doc = {
         "vote": vote,
-        "timestamp": int(time.time()),
-        "ip": request.client.host
-    })
+        "timestamp": now,
+        "ip": ip
+    }
+    if not vote_buffer.stage_insert(steering_votes_col, vote_doc):
+        steering_votes_col.insert_one(vote_doc)
+    count_community_vote(vote, now)
+    event_bus.publish("community_vote", {"vote": vote, "timestamp": now})
 
-    # Broadcast Votes
-    cutoff = int(time.time()) - 300 # Last 5 mins
-    pipeline = [
-        {"$match": {"timestamp": {"$gt": cutoff}}},
-        {"$group": {"_id": "$vote", "count": {"$sum": 1}}}
-    ]
-    results = list(steering_votes_col.aggregate(pipeline))
-    stats = {r["_id"]: r["count"] for r in results}
-    
-    await manager.broadcast({
-        "type": "vote_update",
-        "stats": stats,
-        "total": sum(stats.values())
-    })
-    
     return {"status": "ok", "voted": vote}
 
+
+def count_community_vote(vote: str, timestamp: int):
+    steering_cache.record_vote(vote, timestamp)
+    community_votes.add(vote, timestamp)
+
+
+event_bus.on("community_vote", lambda data: count_community_vote(data["vote"], data["timestamp"]))
+
+# Community vote standings for the vote_update broadcast (last 5 minutes),
+# maintained incrementally and pushed on a fixed tick instead of per vote.
+community_votes = SlidingTally(window_seconds=300)
+VOTE_BROADCAST_INTERVAL = int(os.getenv("VOTE_BROADCAST_INTERVAL_MS", "250")) / 1000
+
+
+def warm_community_votes():
+    cutoff = int(time.time()) - community_votes.window
+    cursor = steering_votes_col.find(
+        {"timestamp": {"$gt": cutoff}},
+        {"vote": 1, "timestamp": 1, "_id": 0}
+    ).sort("timestamp", 1)
+    for doc in cursor:
+        if doc.get("vote"):
+            community_votes.add(doc["vote"], doc["timestamp"])
+
+
+async def vote_broadcast_loop():
+    """Broadcast vote_update at most once per tick, and only if the standings changed."""
+    last_version = community_votes.version
+    while True:
+        await asyncio.sleep(VOTE_BROADCAST_INTERVAL)
+        try:
+            community_votes.expire()
+            if community_votes.version == last_version:
+                continue
+            last_version = community_votes.version
+            stats = community_votes.counts()
+            await manager.broadcast({
+                "type": "vote_update",
+                "stats": stats,
+                "total": sum(stats.values())
+            })
+        except Exception as e:
+            print(f"[VOTES] Broadcast error: {e}")
+
+
 @app.get("/control/steer")
-def get_steering():
-    return get_steering_state()
+def get_steering(request: Request):
+    state = get_steering_state()
+    not_modified, headers = check_conditional(
+        request, make_etag("steer", steering_cache.digest), steering_cache.changed_at, max_age=1
+    )
+    if not_modified:
+        return not_modified
+    return JSONResponse(content=state, headers=headers)
 
 @app.get("/control/next-song")
 def get_next_song_candidate():
@@ -854,18 +1256,17 @@ async def liquidsoap_next_track():
     url = f"{AZURACAST_URL}/api/station/1/media/{song_id}"
     headers = {"Authorization": f"Bearer {AZURACAST_API_KEY}"}
     
-    async with httpx.AsyncClient(timeout=5, verify=False) as client:
-        try:
-            resp = await client.get(url, headers=headers)
-            if resp.status_code == 200:
-                data = resp.json()
-                rel_path = data.get("path")
-                if rel_path:
-                    # Construct absolute path expected by Liquidsoap inside the container
-                    full_path = str(MUSIC_DIR / rel_path)
-                    return full_path
-        except:
-            pass
+    try:
+        resp = await http_client.get(url, headers=headers, timeout=5)
+        if resp.status_code == 200:
+            data = resp.json()
+            rel_path = data.get("path")
+            if rel_path:
+                # Construct absolute path expected by Liquidsoap inside the container
+                full_path = str(MUSIC_DIR / rel_path)
+                return full_path
+    except:
+        pass
             
     return "/var/radio/music/fallback.mp3"
 
@@ -904,6 +1305,7 @@ async def update_metadata(request: Request):
         update_ops,
         upsert=True
     )
+    resources_changed("moods")
 
     return {"status": "ok", "song_id": song_id, "title": title, "artist": artist}
 
@@ -913,10 +1315,14 @@ async def update_metadata(request: Request):
 # ---------------------------------------------------------------------------
 
 
-async def write_metadata_to_id3(song_id: str) -> None:
+async def write_metadata_to_id3(song_id: str, rating_entry: Dict[str, Any] | None = None,
+                                mood_entry: Dict[str, Any] | None = None) -> None:
     """
     Write rating AND mood data from MongoDB to MP3 ID3 tags.
     Includes comprehensive logging for debugging and monitoring.
+
+    The vote routes pass the counters they just computed: with the write-behind
+    buffer the vote may not be in MongoDB yet when this task runs.
     """
     import logging
     import json
@@ -924,10 +1330,15 @@ async def write_metadata_to_id3(song_id: str) -> None:
     
     logger.info(f"[ID3_WRITE_START] Song ID: {song_id}")
     
-    # Fetch rating data
-    rating_entry = ratings_col.find_one({"_id": song_id}) or {}
-    # Fetch mood data
-    mood_entry = moods_col.find_one({"_id": song_id}) or {}
+    # Fetch whatever the caller did not pass (persisted state plus still-buffered votes)
+    if rating_entry is None:
+        rating_doc = ratings_col.find_one({"_id": song_id})
+        pending = vote_buffer.pending_inc(ratings_col, song_id)
+        rating_entry = optimistic_rating(song_id, rating_doc) if rating_doc or pending else {}
+    if mood_entry is None:
+        mood_doc = moods_col.find_one({"_id": song_id})
+        pending = vote_buffer.pending_inc(moods_col, song_id)
+        mood_entry = optimistic_moods(song_id, mood_doc) if mood_doc or pending else {}
     
     if not rating_entry and not mood_entry:
         logger.warning(f"[ID3_WRITE_SKIP] No metadata in MongoDB for song_id: {song_id}")
@@ -943,11 +1354,10 @@ async def write_metadata_to_id3(song_id: str) -> None:
     logger.debug(f"[ID3_WRITE_API] Fetching media info from: {url}")
 
     try:
-        async with httpx.AsyncClient(timeout=60, follow_redirects=True, verify=False) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            media = response.json()
-            relative_path = media.get("path")
+        response = await http_client.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        media = response.json()
+        relative_path = media.get("path")
     except httpx.HTTPError as exc:
         logger.error(f"[ID3_WRITE_ERROR] Failed to fetch media info for {song_id}: {exc}")
         return
@@ -1026,69 +1436,67 @@ async def add_to_azuracast_playlist(song_id: str, playlist_name: str):
     
     playlist_id = None
     
-    async with httpx.AsyncClient(timeout=10, verify=False) as client:
+    try:
+        resp = await http_client.get(url, headers=headers, timeout=10)
+        if resp.status_code == 200:
+            playlists = resp.json()
+            for pl in playlists:
+                if pl["name"] == playlist_name:
+                    playlist_id = pl["id"]
+                    break
+    except Exception as e:
+        print(f"[PLAYLIST_SYNC] Error fetching playlists: {e}")
+        return
+
+    # Create if missing
+    if not playlist_id:
         try:
-            resp = await client.get(url, headers=headers)
+            create_payload = {
+                "name": playlist_name,
+                "is_enabled": True,
+                "type": "default",
+                "weight": 5,
+                "include_in_requests": True
+            }
+            resp = await http_client.post(url, json=create_payload, headers=headers, timeout=10)
             if resp.status_code == 200:
-                playlists = resp.json()
-                for pl in playlists:
-                    if pl["name"] == playlist_name:
-                        playlist_id = pl["id"]
-                        break
+                new_pl = resp.json()
+                playlist_id = new_pl["id"]
+                print(f"[PLAYLIST_SYNC] Created playlist '{playlist_name}' (ID: {playlist_id})")
         except Exception as e:
-            print(f"[PLAYLIST_SYNC] Error fetching playlists: {e}")
+            print(f"[PLAYLIST_SYNC] Error creating playlist: {e}")
             return
-
-        # Create if missing
-        if not playlist_id:
-            try:
-                create_payload = {
-                    "name": playlist_name,
-                    "is_enabled": True,
-                    "type": "default",
-                    "weight": 5,
-                    "include_in_requests": True
-                }
-                resp = await client.post(url, json=create_payload, headers=headers)
-                if resp.status_code == 200:
-                    new_pl = resp.json()
-                    playlist_id = new_pl["id"]
-                    print(f"[PLAYLIST_SYNC] Created playlist '{playlist_name}' (ID: {playlist_id})")
-            except Exception as e:
-                print(f"[PLAYLIST_SYNC] Error creating playlist: {e}")
-                return
-                
+            
     if not playlist_id:
         return
 
     # 2. Add song to playlist
     media_url = f"{AZURACAST_URL}/api/station/1/media/{song_id}"
     
-    async with httpx.AsyncClient(timeout=10, verify=False) as client:
-        try:
-            resp = await client.get(media_url, headers=headers)
-            if resp.status_code != 200:
-                return
-            
-            media_data = resp.json()
-            current_playlists = [p["id"] for p in media_data.get("playlists", [])]
-            
-            if playlist_id in current_playlists:
-                return # Already in playlist
-                
-            current_playlists.append(playlist_id)
-            
-            # Update media (Merge Logic)
-            media_data["playlists"] = current_playlists
+    try:
+        resp = await http_client.get(media_url, headers=headers, timeout=10)
+        if resp.status_code != 200:
+            return
+        
+        media_data = resp.json()
+        current_playlists = [p["id"] for p in media_data.get("playlists", [])]
+        
+        if playlist_id in current_playlists:
+            return # Already in playlist
             
-            resp = await client.put(media_url, json=media_data, headers=headers)
-            if resp.status_code == 200:
-                 print(f"[PLAYLIST_SYNC] Added song {song_id} to '{playlist_name}'")
-            else:
-                 print(f"[PLAYLIST_SYNC] Failed to update media {song_id}: {resp.status_code} {resp.text}")
+        current_playlists.append(playlist_id)
+        
+        # Update media (Merge Logic)
+        media_data["playlists"] = current_playlists
+        
+        resp = await http_client.put(media_url, json=media_data, headers=headers, timeout=10)
+        if resp.status_code == 200:
+             print(f"[PLAYLIST_SYNC] Added song {song_id} to '{playlist_name}'")
+        else:
+             print(f"[PLAYLIST_SYNC] Failed to update media {song_id}: {resp.status_code} {resp.text}")
 
-        except Exception as e:
-            print(f"[PLAYLIST_SYNC] Error updating media: {e}")
+    except Exception as e:
+        print(f"[PLAYLIST_SYNC] Error updating media: {e}")
 
 async def sync_mood_to_playlist(song_id: str, mood: str):
     if mood:
@@ -1148,36 +1556,35 @@ async def update_metrics_loop():
 
     while True:
         try:
-            async with httpx.AsyncClient(verify=False) as client:
-                # 1. AzuraCast Playlists
-                if azura_key:
-                    headers = {"Authorization": f"Bearer {azura_key}"}
-                    try:
-                        r = await client.get(f"{azura_url}/station/1/playlists", headers=headers, timeout=10)
-                        if r.status_code == 200:
-                            data = r.json()
-                            if isinstance(data, dict) and 'rows' in data:
-                                data = data['rows']
-                            
-                            if isinstance(data, list):
-                                for pl in data:
-                                    name = pl.get('name', 'unknown')
-                                    count = pl.get('num_songs', pl.get('count', 0))
-                                    PLAYLIST_TRACKS.labels(name=name).set(count)
-                    except Exception as e:
-                         print(f"[MONITORING] AzuraCast Fetch Warn: {e}")
-                
-                # 2. n8n Status
+            # 1. AzuraCast Playlists
+            if azura_key:
+                headers = {"Authorization": f"Bearer {azura_key}"}
+                try:
+                    r = await http_client.get(f"{azura_url}/station/1/playlists", headers=headers, timeout=10)
+                    if r.status_code == 200:
+                        data = r.json()
+                        if isinstance(data, dict) and 'rows' in data:
+                            data = data['rows']
+                        
+                        if isinstance(data, list):
+                            for pl in data:
+                                name = pl.get('name', 'unknown')
+                                count = pl.get('num_songs', pl.get('count', 0))
+                                PLAYLIST_TRACKS.labels(name=name).set(count)
+                except Exception as e:
+                     print(f"[MONITORING] AzuraCast Fetch Warn: {e}")
+            
+            # 2. n8n Status
+            try:
+                r = await http_client.get(n8n_url, timeout=2)
+                N8N_STATUS.set(1 if r.status_code < 500 else 0)
+            except:
+                # Fallback to public
                 try:
-                    r = await client.get(n8n_url, timeout=2)
+                    r = await http_client.get("https://n8n.yourparty.tech/healthz", timeout=2)
                     N8N_STATUS.set(1 if r.status_code < 500 else 0)
                 except:
-                    # Fallback to public
-                    try:
-                        r = await client.get("https://n8n.yourparty.tech/healthz", timeout=2)
-                        N8N_STATUS.set(1 if r.status_code < 500 else 0)
-                    except:
-                        N8N_STATUS.set(0)
+                    N8N_STATUS.set(0)
 
         except Exception as e:
             print(f"[MONITORING] Critical Loop Error: {e}")
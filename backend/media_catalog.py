@@ -0,0 +1,255 @@
+"""
+Media Catalog Mirror
+
+In-memory mirror of AzuraCast's media listing (/api/station/1/files) so
+/library is served locally with pagination, field projection and filters
+instead of proxying the full listing on every request.
+
+1. The listing is re-fetched every REFRESH_INTERVAL in the background and
+   diffed against the mirror: only added or modified files (by fingerprint)
+   are re-enriched with ratings/moods, removed files are dropped
+2. Songs whose ratings or moods changed are re-enriched in small batches
+3. Indexes (by playlist, by top mood) are rebuilt off the event loop and the
+   whole snapshot is swapped at once, so readers never see a half-applied refresh
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from nowplaying_cache import UpstreamError
+
+logger = logging.getLogger("MediaCatalog")
+
+MEDIA_CATALOG_ITEMS = Gauge('media_catalog_items', 'Media files in the local catalog mirror')
+MEDIA_CATALOG_CHANGES = Counter('media_catalog_changes_total', 'Catalog entries changed by refreshes', ['change'])
+
+# fetch() -> AzuraCast file listing; enrich(song_ids) -> {song_id: extra fields} (blocking)
+Fetcher = Callable[[], Awaitable[Any]]
+Enricher = Callable[[List[str]], Dict[str, Dict[str, Any]]]
+
+
+def _fingerprint(entry: Dict[str, Any]) -> str:
+    # The whole entry: playlist membership changes without touching mtime
+    return hashlib.md5(json.dumps(entry, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Snapshot:
+    """Immutable view of the catalog; replaced wholesale on every change."""
+
+    __slots__ = ("items", "fingerprints", "ordered", "by_song", "by_playlist", "by_mood", "version", "refreshed_at")
+
+    def __init__(self, items: Dict[str, Dict[str, Any]], fingerprints: Dict[str, str], version: int, refreshed_at: float):
+        self.items = items
+        self.fingerprints = fingerprints
+        self.version = version
+        self.refreshed_at = refreshed_at
+        # (lowercased artist, entry) pairs so artist filters don't re-normalize per request
+        self.ordered: List[Tuple[str, Dict[str, Any]]] = sorted(
+            ((str(e.get("artist") or "").lower(), e) for e in items.values()),
+            key=lambda pair: (pair[0], str(pair[1].get("title") or "").lower(), str(pair[1].get("id")))
+        )
+        self.by_song: Dict[str, List[str]] = defaultdict(list)
+        self.by_playlist: Dict[str, List[Tuple[str, Dict[str, Any]]]] = defaultdict(list)
+        self.by_mood: Dict[str, List[Tuple[str, Dict[str, Any]]]] = defaultdict(list)
+        for pair in self.ordered:
+            entry = pair[1]
+            if entry.get("song_id"):
+                self.by_song[entry["song_id"]].append(str(entry["id"]))
+            for playlist in entry.get("playlists") or []:
+                name = playlist.get("name") if isinstance(playlist, dict) else playlist
+                if name:
+                    self.by_playlist[str(name).lower()].append(pair)
+            if entry.get("top_mood"):
+                self.by_mood[str(entry["top_mood"]).lower()].append(pair)
+
+
+class MediaCatalog:
+    """
+    Background-refreshed, queryable copy of the station's media files.
+    """
+
+    def __init__(self, fetch: Fetcher, enrich: Enricher, refresh_interval: float = 600.0, enrich_interval: float = 5.0):
+        """
+        Args:
+            fetch: Coroutine returning the AzuraCast file listing
+            enrich: Builds rating/mood fields per song_id
+            refresh_interval: Seconds between full listing refreshes
+            enrich_interval: Seconds between re-enrichment passes for voted-on songs
+        """
+        self.refresh_interval = refresh_interval
+        self.enrich_interval = enrich_interval
+        self._fetch = fetch
+        self._enrich = enrich
+        self._snapshot: Optional[_Snapshot] = None
+        self._dirty: Set[str] = set()
+        self._inflight: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def mark_dirty(self, song_id: str):
+        """Ratings/moods of `song_id` changed; re-enrich it on the next pass."""
+        if self._snapshot and song_id in self._snapshot.by_song:
+            self._dirty.add(song_id)
+
+    async def ensure_loaded(self):
+        """Block until the first listing has been mirrored (raises UpstreamError if it cannot be fetched)."""
+        if self._snapshot is None:
+            await self.refresh()
+
+    async def refresh(self):
+        """
+        Fetch the listing and apply the delta, joining a refresh that is already running.
+
+        A failed refresh leaves the current snapshot in place.
+
+        Raises:
+            UpstreamError: AzuraCast failed or answered with something other than a listing
+        """
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+        await asyncio.shield(self._inflight)
+
+    async def _refresh(self):
+        listing = await self._fetch()
+        if not isinstance(listing, list):
+            raise UpstreamError(502, {"error": f"Unexpected AzuraCast media listing: {type(listing).__name__}"})
+        await asyncio.to_thread(self._apply_listing, listing)
+
+    def _apply_listing(self, listing: List[Any]):
+        previous = self._snapshot
+        old_items = previous.items if previous else {}
+        old_fingerprints = previous.fingerprints if previous else {}
+
+        items: Dict[str, Dict[str, Any]] = {}
+        fingerprints: Dict[str, str] = {}
+        changed: List[str] = []
+        for entry in listing:
+            if not isinstance(entry, dict) or entry.get("id") is None:
+                continue
+            media_id = str(entry["id"])
+            fingerprint = _fingerprint(entry)
+            fingerprints[media_id] = fingerprint
+            if old_fingerprints.get(media_id) == fingerprint:
+                items[media_id] = old_items[media_id]
+            else:
+                items[media_id] = entry
+                changed.append(media_id)
+
+        removed = len(set(old_items) - set(items))
+        added = sum(1 for media_id in changed if media_id not in old_items)
+        if previous and not changed and not removed:
+            return
+
+        song_ids = [items[media_id]["song_id"] for media_id in changed if items[media_id].get("song_id")]
+        extras = self._enrich(song_ids) if song_ids else {}
+        for media_id in changed:
+            items[media_id] = {**items[media_id], **extras.get(items[media_id].get("song_id"), {})}
+
+        version = previous.version + 1 if previous else 1
+        self._snapshot = _Snapshot(items, fingerprints, version, time.time())
+        MEDIA_CATALOG_ITEMS.set(len(items))
+        MEDIA_CATALOG_CHANGES.labels("added").inc(added)
+        MEDIA_CATALOG_CHANGES.labels("modified").inc(len(changed) - added)
+        MEDIA_CATALOG_CHANGES.labels("removed").inc(removed)
+        logger.info(f"Catalog v{version}: {len(items)} files (+{added} ~{len(changed) - added} -{removed})")
+
+    def _apply_enrichment(self, song_ids: List[str]):
+        snapshot = self._snapshot
+        extras = self._enrich(song_ids)
+        items = dict(snapshot.items)
+        for song_id in song_ids:
+            for media_id in snapshot.by_song.get(song_id, []):
+                items[media_id] = {**items[media_id], **extras.get(song_id, {})}
+        self._snapshot = _Snapshot(items, snapshot.fingerprints, snapshot.version + 1, snapshot.refreshed_at)
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = 100,
+        artist: Optional[str] = None,
+        playlist: Optional[str] = None,
+        mood: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        One page of the catalog.
+
+        Args:
+            offset: Entries to skip
+            limit: Page size (None: every entry from offset on)
+            artist: Case-insensitive substring match on the artist
+            playlist: Playlist name (case-insensitive)
+            mood: Top mood (case-insensitive)
+            fields: Keys to include per entry (all when omitted)
+
+        Returns:
+            Page envelope with total match count, catalog version and items
+        """
+        snapshot = self._snapshot
+        if playlist:
+            candidates = snapshot.by_playlist.get(playlist.lower(), [])
+        elif mood:
+            candidates = snapshot.by_mood.get(mood.lower(), [])
+        else:
+            candidates = snapshot.ordered
+
+        if playlist and mood:
+            mood = mood.lower()
+            candidates = [pair for pair in candidates if str(pair[1].get("top_mood") or "").lower() == mood]
+        if artist:
+            needle = artist.lower()
+            candidates = [pair for pair in candidates if needle in pair[0]]
+
+        end = offset + limit if limit is not None else None
+        page = [entry for _, entry in candidates[offset:end]]
+        if fields:
+            fields = list(fields)
+            page = [{key: entry.get(key) for key in fields} for entry in page]
+
+        return {
+            "total": len(candidates),
+            "offset": offset,
+            "limit": limit,
+            "version": snapshot.version,
+            "refreshed_at": int(snapshot.refreshed_at),
+            "items": page,
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Media catalog refresh every {self.refresh_interval}s")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        next_refresh = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_refresh:
+                    # Scheduled before the attempt so a failing upstream is retried at the normal rate
+                    next_refresh = time.monotonic() + self.refresh_interval
+                    await self.refresh()
+                if self._dirty and self._snapshot:
+                    song_ids, self._dirty = list(self._dirty), set()
+                    await asyncio.to_thread(self._apply_enrichment, song_ids)
+            except Exception as e:
+                logger.error(f"Media catalog refresh error: {e}")
+            await asyncio.sleep(self.enrich_interval)
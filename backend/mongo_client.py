@@ -1,11 +1,18 @@
+import os
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
-from pymongo import MongoClient
-from datetime import datetime
+import threading
+from typing import Callable, Dict, Any, Iterator, Optional, List
+from pymongo import MongoClient, ReturnDocument, ReplaceOne, DeleteOne, UpdateOne
+from datetime import datetime, timedelta, timezone
+
+from vote_tally import MinuteBucketTally
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NEXT_MOOD_HORIZON_MINUTES = 60
+
 class MongoDatabaseClient:
     """
     Client for MongoDB integration - handles ratings, metadata, and sync with library.
@@ -24,21 +31,66 @@ class MongoDatabaseClient:
             self.ratings_collection = self.db["ratings"]
             self.tracks_collection = self.db["tracks"]
             self.sync_log_collection = self.db["sync_log"]
+            # Materialized per-song rating counters (_id = song_id), maintained by submit_rating
+            self.rating_summaries_collection = self.db["rating_summaries"]
+            # Raw mood/genre votes plus the counters submit_mood maintains from them
+            self.moods_collection = self.db["moods"]
+            self.mood_summaries_collection = self.db["mood_summaries"]
+            self.mood_histogram_collection = self.db["mood_histogram"]
+            # Live "what mood next" standings, fed by submit_mood_next_vote
+            self.next_mood_tally = MinuteBucketTally(horizon_minutes=NEXT_MOOD_HORIZON_MINUTES)
+            self._next_mood_tally_warm = False
+            self._next_mood_tally_lock = threading.Lock()
+            # In-process change counters per song (ratings + moods), so pollers can
+            # tell whether cached enrichment is stale without querying MongoDB
+            self.song_versions: Dict[str, int] = {}
+            self._versions_epoch = 0
+            self._versions_lock = threading.Lock()
+            # Called with (kind, data) for every in-memory change made here, so it can be
+            # relayed to the other workers (see apply_remote_change)
+            self.on_change: Optional[Callable[[str, Dict[str, Any]], None]] = None
             
             # Create indexes for performance
             self.ratings_collection.create_index("song_id")
             self.ratings_collection.create_index("user_id")
             self.tracks_collection.create_index("file_path", unique=True)
             self.tracks_collection.create_index("song_id")
+            self.moods_collection.create_index("song_id")
             
             logger.info(f"Connected to MongoDB: {database_name}")
         except Exception as e:
             logger.error(f"MongoDB connection failed: {e}")
             raise
 
+    async def init(self):
+        """Async startup hook: warm in-memory state from MongoDB without blocking the event loop."""
+        await asyncio.to_thread(self.warm_next_mood_tally)
+
+    def get_song_version(self, song_id: str) -> int:
+        """Counter that increases whenever the song's rating or mood counters change in this process."""
+        return self._versions_epoch + self.song_versions.get(song_id, 0)
+
+    def _bump_song_version(self, song_id: Optional[str] = None, notify: bool = True):
+        # No song_id: a bulk rebuild touched everything
+        with self._versions_lock:
+            if song_id is None:
+                self._versions_epoch += 1
+            else:
+                self.song_versions[song_id] = self.song_versions.get(song_id, 0) + 1
+        if notify and self.on_change:
+            self.on_change("song", {"song_id": song_id})
+
+    def apply_remote_change(self, kind: str, data: Dict[str, Any]):
+        """Apply a change another worker reported through on_change (without re-reporting it)."""
+        if kind == "song":
+            self._bump_song_version(data.get("song_id"), notify=False)
+        elif kind == "next_mood" and self._next_mood_tally_warm:
+            # Before warming, the vote is loaded from MongoDB instead
+            self.next_mood_tally.add(data["mood_next"], data["timestamp"])
+
     def get_track_rating(self, file_path: str = None, song_id: str = None) -> Optional[Dict[str, Any]]:
         """
-        Get aggregated rating for a track.
+        Get aggregated rating for a track (single lookup in rating_summaries).
         
         Args:
             file_path: Local file path
@@ -48,50 +100,93 @@ class MongoDatabaseClient:
             Dict with rating statistics or None
         """
         try:
-            query = {}
-            if song_id:
-                query["song_id"] = song_id
-            elif file_path:
+            if not song_id and file_path:
                 # First find the track to get its song_id
                 track = self.tracks_collection.find_one({"file_path": file_path})
-                if track and "song_id" in track:
-                    query["song_id"] = track["song_id"]
-                else:
-                    return None
-            else:
+                song_id = track.get("song_id") if track else None
+            if not song_id:
                 return None
-            
-            # Aggregate ratings
-            pipeline = [
-                {"$match": query},
-                {"$group": {
-                    "_id": "$song_id",
-                    "average": {"$avg": "$rating"},
-                    "total": {"$sum": 1},
-                    "distribution": {
-                        "$push": "$rating"
-                    }
-                }}
-            ]
-            
-            result = list(self.ratings_collection.aggregate(pipeline))
-            if result:
-                data = result[0]
-                # Count distribution
-                dist = {}
-                for rating in data["distribution"]:
-                    dist[str(rating)] = dist.get(str(rating), 0) + 1
-                
-                return {
-                    "average": round(data["average"], 2),
-                    "total": data["total"],
-                    "distribution": dist
-                }
-            return None
+
+            summary = self.rating_summaries_collection.find_one({"_id": song_id})
+            return self._format_summary(summary) if summary else None
         except Exception as e:
             logger.error(f"Error fetching rating: {e}")
             return None
 
+    def get_track_ratings(self, song_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Batch variant of get_track_rating.
+
+        Args:
+            song_ids: AzuraCast song IDs
+
+        Returns:
+            Dict of song_id -> rating statistics (songs without ratings are omitted)
+        """
+        try:
+            cursor = self.rating_summaries_collection.find({"_id": {"$in": list(song_ids)}})
+            return {doc["_id"]: self._format_summary(doc) for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error fetching ratings: {e}")
+            return {}
+
+    @staticmethod
+    def _format_summary(summary: Dict[str, Any]) -> Dict[str, Any]:
+        total = summary.get("total", 0)
+        dist = summary.get("distribution", {})
+        return {
+            "average": round(summary.get("sum", 0) / total, 2) if total else 0.0,
+            "total": total,
+            "distribution": {str(k): dist.get(str(k), 0) for k in range(1, 6)}
+        }
+
+    def rebuild_rating_summaries(self) -> int:
+        """
+        Recompute rating_summaries from the raw ratings collection.
+
+        The result replaces the collection atomically ($out); votes submitted
+        while the rebuild runs should be reconciled by running it again.
+
+        Returns:
+            Number of songs with a summary
+        """
+        pipeline = [
+            {"$match": {"song_id": {"$ne": None}, "rating": {"$in": [1, 2, 3, 4, 5]}}},
+            {"$group": {
+                "_id": "$song_id",
+                "total": {"$sum": 1},
+                "sum": {"$sum": "$rating"},
+                **{f"star_{k}": {"$sum": {"$cond": [{"$eq": ["$rating", k]}, 1, 0]}} for k in range(1, 6)}
+            }},
+            {"$project": {
+                "total": 1,
+                "sum": 1,
+                "distribution": {str(k): f"$star_{k}" for k in range(1, 6)},
+                "updated_at": "$$NOW"
+            }},
+            {"$out": self.rating_summaries_collection.name}
+        ]
+        self.ratings_collection.aggregate(pipeline)
+        self._bump_song_version()
+        count = self.rating_summaries_collection.count_documents({})
+        logger.info(f"Rebuilt rating summaries for {count} songs")
+        return count
+
+    def backfill_rating_summaries(self) -> Optional[int]:
+        """
+        Build rating_summaries on first start (the collection is empty but raw
+        ratings exist, e.g. right after deploying the summaries).
+
+        Returns:
+            Number of songs summarized, or None if nothing had to be done
+        """
+        if self.rating_summaries_collection.estimated_document_count() > 0:
+            return None
+        if self.ratings_collection.find_one({}, {"_id": 1}) is None:
+            return None
+        logger.info("rating_summaries is empty, rebuilding it from the raw ratings")
+        return self.rebuild_rating_summaries()
+
     def submit_rating(self, song_id: str, rating: int, user_id: str = "anonymous", 
                      file_path: str = None) -> Dict[str, Any]:
         """
@@ -120,6 +215,18 @@ class MongoDatabaseClient:
             
             # Insert rating
             self.ratings_collection.insert_one(rating_doc)
+
+            # Maintain the materialized summary in the same request (O(1) reads later)
+            summary = self.rating_summaries_collection.find_one_and_update(
+                {"_id": song_id},
+                {
+                    "$inc": {"total": 1, "sum": rating, f"distribution.{rating}": 1},
+                    "$set": {"updated_at": datetime.utcnow()}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._bump_song_version(song_id)
             
             # Update or create track document
             if file_path:
@@ -132,12 +239,9 @@ class MongoDatabaseClient:
                     upsert=True
                 )
             
-            # Return updated rating stats
-            updated_ratings = self.get_track_rating(song_id=song_id)
-            
             return {
                 "success": True,
-                "ratings": updated_ratings
+                "ratings": self._format_summary(summary)
             }
         except Exception as e:
             logger.error(f"Error submitting rating: {e}")
@@ -146,25 +250,38 @@ class MongoDatabaseClient:
     def submit_mood(self, song_id: str, mood: str = None, genre: str = None, user_id: str = "anonymous") -> Dict[str, Any]:
         """
         Submit a new mood or genre tag for a track.
+
+        The raw vote is kept in `moods`; the per-song counters (mood_summaries)
+        and the global histogram (mood_histogram) are updated with $inc so
+        reads never have to re-aggregate the vote log.
         """
         try:
+            now = datetime.utcnow()
             doc = {
                 "song_id": song_id,
                 "user_id": user_id,
-                "timestamp": datetime.utcnow()
+                "timestamp": now
             }
+            inc = {"total": 1}
             if mood:
                 doc['mood'] = mood
+                inc[f"moods.{mood}"] = 1
             if genre:
                 doc['genre'] = genre
-            
-            # Use a separate collection for moods, or just log it
-            # For simplicity, let's assume a 'moods' collection
-            if not hasattr(self, 'moods_collection'):
-                 self.moods_collection = self.db["moods"]
-                 self.moods_collection.create_index("song_id")
+                inc[f"genres.{genre}"] = 1
 
             self.moods_collection.insert_one(doc)
+            self.mood_summaries_collection.update_one(
+                {"_id": song_id},
+                {"$inc": inc, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            self.mood_histogram_collection.update_one(
+                {"_id": "global"},
+                {"$inc": inc, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            self._bump_song_version(song_id)
             
             return {"success": True, "tag": mood or genre, "message": "Tag saved!"}
         except Exception as e:
@@ -172,20 +289,12 @@ class MongoDatabaseClient:
             return {"success": False, "error": str(e)}
 
     def get_all_moods(self) -> Dict[str, Any]:
-        """Aggregate top moods for all songs."""
+        """Top moods across all songs (read from the global histogram)."""
         try:
-            if not hasattr(self, 'moods_collection'):
-                 self.moods_collection = self.db["moods"]
-                 
-            pipeline = [
-                {"$group": {"_id": "$mood", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}},
-                {"$limit": 10}
-            ]
-            
-            results = list(self.moods_collection.aggregate(pipeline))
+            histogram = self.mood_histogram_collection.find_one({"_id": "global"}) or {}
+            ranked = sorted(histogram.get("moods", {}).items(), key=lambda kv: kv[1], reverse=True)
             return {
-                "top_moods": [{"tag": r["_id"], "count": r["count"]} for r in results if r["_id"]]
+                "top_moods": [{"tag": tag, "count": count} for tag, count in ranked[:10] if count > 0]
             }
         except Exception as e:
             logger.error(f"Error getting moods: {e}")
@@ -194,35 +303,138 @@ class MongoDatabaseClient:
     def get_song_moods(self, song_id: str) -> Dict[str, Any]:
         """Get mood tags for a specific song with counts."""
         try:
-            if not hasattr(self, 'moods_collection'):
-                 self.moods_collection = self.db["moods"]
-            
-            # Get all mood counts for this song
-            pipeline = [
-                {"$match": {"song_id": song_id}},
-                {"$group": {"_id": "$mood", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}}
-            ]
-            
-            results = list(self.moods_collection.aggregate(pipeline))
-            
-            mood_counts = {}
-            top_mood = None
-            for r in results:
-                if r["_id"]:
-                    mood_counts[r["_id"]] = r["count"]
-                    if top_mood is None:
-                        top_mood = r["_id"]
+            summary = self.mood_summaries_collection.find_one({"_id": song_id}) or {}
+            ranked = sorted(
+                ((mood, count) for mood, count in summary.get("moods", {}).items() if count > 0),
+                key=lambda kv: kv[1],
+                reverse=True
+            )
                 
             return {
-                "top_mood": top_mood,
-                "mood_counts": mood_counts,
-                "all_moods": [r["_id"] for r in results if r["_id"]]
+                "top_mood": ranked[0][0] if ranked else None,
+                "mood_counts": dict(ranked),
+                "all_moods": [mood for mood, _ in ranked]
             }
         except Exception as e:
             logger.error(f"Error getting song moods: {e}")
             return {"top_mood": None, "mood_counts": {}}
 
+    def reconcile_mood_counters(self, repair: bool = True) -> Dict[str, Any]:
+        """
+        Compare mood_summaries / mood_histogram against the raw vote log.
+
+        Only votes older than the start of the run are considered, and songs
+        whose counters changed while it ran are skipped, so live $inc updates
+        are never overwritten.
+
+        Args:
+            repair: Rewrite drifted counter documents from the raw votes
+
+        Returns:
+            Report with checked/drifted/repaired counts
+        """
+        started = datetime.utcnow()
+        expected: Dict[str, Dict[str, Any]] = {}
+        pipeline = [
+            {"$match": {"song_id": {"$ne": None}, "timestamp": {"$lt": started}}},
+            {"$group": {
+                "_id": {"song_id": "$song_id", "mood": "$mood", "genre": "$genre"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        for row in self.moods_collection.aggregate(pipeline, allowDiskUse=True):
+            key = row["_id"]
+            counters = expected.setdefault(key["song_id"], {"moods": {}, "genres": {}, "total": 0})
+            counters["total"] += row["count"]
+            if key.get("mood"):
+                counters["moods"][key["mood"]] = counters["moods"].get(key["mood"], 0) + row["count"]
+            if key.get("genre"):
+                counters["genres"][key["genre"]] = counters["genres"].get(key["genre"], 0) + row["count"]
+
+        drifted = []
+        skipped = 0
+        seen = set()
+        for summary in self.mood_summaries_collection.find({}):
+            song_id = summary["_id"]
+            seen.add(song_id)
+            if summary.get("updated_at") and summary["updated_at"] >= started:
+                skipped += 1
+                continue
+            actual = {
+                "moods": summary.get("moods", {}),
+                "genres": summary.get("genres", {}),
+                "total": summary.get("total", 0)
+            }
+            if actual != expected.get(song_id, {"moods": {}, "genres": {}, "total": 0}):
+                drifted.append(song_id)
+        drifted.extend(song_id for song_id in expected if song_id not in seen)
+
+        histogram = {"moods": {}, "genres": {}, "total": 0}
+        for counters in expected.values():
+            histogram["total"] += counters["total"]
+            for field in ("moods", "genres"):
+                for tag, count in counters[field].items():
+                    histogram[field][tag] = histogram[field].get(tag, 0) + count
+        current = self.mood_histogram_collection.find_one({"_id": "global"}) or {}
+        histogram_drift = {
+            "moods": current.get("moods", {}),
+            "genres": current.get("genres", {}),
+            "total": current.get("total", 0)
+        } != histogram
+
+        repaired = 0
+        if repair and drifted:
+            # Every write is conditional on the document not having been touched
+            # since the run started: a vote landing between the scan and the
+            # repair keeps its $inc and the song is picked up by the next run
+            ops = []
+            for song_id in drifted:
+                if song_id not in seen:
+                    ops.append(UpdateOne(
+                        {"_id": song_id},
+                        {"$setOnInsert": {**expected[song_id], "updated_at": started}},
+                        upsert=True
+                    ))
+                elif song_id in expected:
+                    ops.append(ReplaceOne(self._untouched_since(song_id, started), {**expected[song_id], "updated_at": started}))
+                else:
+                    ops.append(DeleteOne(self._untouched_since(song_id, started)))
+            result = self.mood_summaries_collection.bulk_write(ops, ordered=False)
+            repaired = result.upserted_count + result.modified_count + result.deleted_count
+            for song_id in drifted:
+                self._bump_song_version(song_id)
+        # Only rewrite the histogram when no votes raced with this run
+        if repair and histogram_drift and not skipped:
+            if current:
+                self.mood_histogram_collection.replace_one(
+                    self._untouched_since("global", started), {**histogram, "updated_at": started}
+                )
+            else:
+                self.mood_histogram_collection.update_one(
+                    {"_id": "global"}, {"$setOnInsert": {**histogram, "updated_at": started}}, upsert=True
+                )
+
+        report = {
+            "songs_checked": len(seen | set(expected)),
+            "drifted": len(drifted),
+            "repaired": repaired,
+            "skipped_live": skipped,
+            "histogram_drift": histogram_drift
+        }
+        if drifted or histogram_drift:
+            logger.warning(f"Mood counter drift detected: {report}")
+        else:
+            logger.info(f"Mood counters consistent: {report}")
+        return report
+    
+    @staticmethod
+    def _untouched_since(doc_id: str, started: datetime) -> Dict[str, Any]:
+        """Filter matching `doc_id` only if no $inc has touched it since `started`."""
+        return {
+            "_id": doc_id,
+            "$or": [{"updated_at": {"$lt": started}}, {"updated_at": {"$exists": False}}]
+        }
+
     # ========== MOOD VOTING SYSTEM ==========
     
     def submit_mood_next_vote(self, song_id: str, mood_next: str, user_id: str = "anonymous") -> Dict[str, Any]:
@@ -241,6 +453,9 @@ class MongoDatabaseClient:
                 self.mood_next_votes_collection.create_index("timestamp")
                 self.mood_next_votes_collection.create_index("mood_next")
             
+            # Warm first so the vote below is not counted twice
+            self.warm_next_mood_tally()
+
             vote_doc = {
                 "song_id": song_id,  # What was playing when vote was cast
                 "mood_next": mood_next,
@@ -249,12 +464,55 @@ class MongoDatabaseClient:
             }
             
             self.mood_next_votes_collection.insert_one(vote_doc)
+            voted_at = vote_doc["timestamp"].replace(tzinfo=timezone.utc).timestamp()
+            self.next_mood_tally.add(mood_next, voted_at)
+            if self.on_change:
+                self.on_change("next_mood", {"mood_next": mood_next, "timestamp": voted_at})
             logger.info(f"Mood next vote stored: {mood_next}")
             
             return {"success": True, "mood_next": mood_next}
         except Exception as e:
             logger.error(f"Error submitting mood_next vote: {e}")
             return {"success": False, "error": str(e)}
+
+    def warm_next_mood_tally(self):
+        """Load the last hour of mood_next votes into the in-memory tally (once)."""
+        if self._next_mood_tally_warm:
+            return
+        with self._next_mood_tally_lock:
+            if self._next_mood_tally_warm:
+                return
+            if not hasattr(self, 'mood_next_votes_collection'):
+                self.mood_next_votes_collection = self.db["mood_next_votes"]
+            cutoff = datetime.utcnow() - timedelta(minutes=NEXT_MOOD_HORIZON_MINUTES)
+            loaded = 0
+            cursor = self.mood_next_votes_collection.find(
+                {"timestamp": {"$gte": cutoff}},
+                {"mood_next": 1, "timestamp": 1, "_id": 0}
+            )
+            for vote in cursor:
+                if vote.get("mood_next"):
+                    self.next_mood_tally.add(vote["mood_next"], vote["timestamp"].replace(tzinfo=timezone.utc).timestamp())
+                    loaded += 1
+            self._next_mood_tally_warm = True
+            logger.info(f"Next-mood tally warmed with {loaded} votes")
+
+    def get_next_mood_standings(self, time_window_minutes: int = 10) -> List[Dict[str, Any]]:
+        """
+        Full ranked distribution of mood_next votes in the time window.
+
+        Returns:
+            List of {"mood", "count"}, most votes first
+        """
+        try:
+            self.warm_next_mood_tally()
+            return [
+                {"mood": mood, "count": count}
+                for mood, count in self.next_mood_tally.ranking(time_window_minutes)
+            ]
+        except Exception as e:
+            logger.error(f"Error getting next mood standings: {e}")
+            return []
     
     def get_dominant_next_mood(self, time_window_minutes: int = 10) -> Optional[str]:
         """
@@ -262,72 +520,86 @@ class MongoDatabaseClient:
         Used by auto-DJ to select the next track.
         
         Args:
-            time_window_minutes: How far back to look for votes
+            time_window_minutes: How far back to look for votes (minute granularity)
             
         Returns:
             Most voted mood in the time window, or None
         """
         try:
-            if not hasattr(self, 'mood_next_votes_collection'):
-                self.mood_next_votes_collection = self.db["mood_next_votes"]
-            
-            from datetime import timedelta
-            cutoff = datetime.utcnow() - timedelta(minutes=time_window_minutes)
-            
-            pipeline = [
-                {"$match": {"timestamp": {"$gte": cutoff}}},
-                {"$group": {"_id": "$mood_next", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}},
-                {"$limit": 1}
-            ]
-            
-            results = list(self.mood_next_votes_collection.aggregate(pipeline))
-            
-            if results and results[0]["_id"]:
-                logger.info(f"Dominant next mood: {results[0]['_id']} ({results[0]['count']} votes)")
-                return results[0]["_id"]
+            self.warm_next_mood_tally()
+            dominant = self.next_mood_tally.dominant(time_window_minutes)
+            if dominant:
+                logger.info(f"Dominant next mood: {dominant[0]} ({dominant[1]} votes)")
+                return dominant[0]
             
             return None
         except Exception as e:
             logger.error(f"Error getting dominant next mood: {e}")
             return None
     
-    def get_tracks_by_mood(self, mood: str, limit: int = 50) -> List[Dict[str, Any]]:
+    def get_tracks_by_mood(self, mood: str, limit: int = 50,
+                           exclude_song_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
-        Get tracks tagged with a specific mood.
+        Get weighted candidate tracks tagged with a specific mood.
         Used for auto-DJ track selection.
+
+        One aggregation does everything: match the song mood counters, sample
+        `limit` songs, join their track metadata and rating summary, and weight
+        each candidate by votes x average rating.
         
         Args:
             mood: Target mood
             limit: Maximum tracks to return
+            exclude_song_ids: Song IDs to skip (e.g. recently played)
             
         Returns:
-            List of track documents with that mood
+            List of track documents with that mood and a selection `weight`
         """
         try:
-            if not hasattr(self, 'moods_collection'):
-                self.moods_collection = self.db["moods"]
-            
-            # Get all song_ids with this mood
-            mood_docs = list(self.moods_collection.find(
-                {"mood": mood},
-                {"song_id": 1}
-            ).limit(limit * 2))  # Get more to filter
-            
-            song_ids = list(set(doc["song_id"] for doc in mood_docs if doc.get("song_id")))
-            
-            # Enrich with track metadata
-            tracks = []
-            for song_id in song_ids[:limit]:
-                track = self.tracks_collection.find_one({"song_id": song_id})
-                if track:
-                    tracks.append({
-                        "song_id": song_id,
-                        "file_path": track.get("file_path"),
-                        "metadata": track.get("metadata", {}),
-                        "mood": mood
-                    })
-            
+            match: Dict[str, Any] = {f"moods.{mood}": {"$gt": 0}}
+            if exclude_song_ids:
+                match["_id"] = {"$nin": list(exclude_song_ids)}
+
+            pipeline = [
+                {"$match": match},
+                {"$sample": {"size": limit}},
+                {"$addFields": {"votes": f"$moods.{mood}"}},
+                {"$lookup": {
+                    "from": self.tracks_collection.name,
+                    "localField": "_id",
+                    "foreignField": "song_id",
+                    "as": "track"
+                }},
+                {"$unwind": "$track"},
+                {"$lookup": {
+                    "from": self.rating_summaries_collection.name,
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "as": "summary"
+                }},
+                {"$project": {
+                    "_id": 0,
+                    "song_id": "$_id",
+                    "file_path": "$track.file_path",
+                    "metadata": {"$ifNull": ["$track.metadata", {}]},
+                    "votes": 1,
+                    "average": {"$let": {
+                        "vars": {"summary": {"$arrayElemAt": ["$summary", 0]}},
+                        "in": {"$cond": [
+                            {"$gt": ["$$summary.total", 0]},
+                            {"$divide": ["$$summary.sum", "$$summary.total"]},
+                            None
+                        ]}
+                    }}
+                }},
+                # Unrated songs count as a neutral 3 stars
+                {"$addFields": {
+                    "mood": mood,
+                    "weight": {"$multiply": ["$votes", {"$ifNull": ["$average", 3]}]}
+                }}
+            ]
+
+            tracks = list(self.mood_summaries_collection.aggregate(pipeline))
             logger.info(f"Found {len(tracks)} tracks with mood: {mood}")
             return tracks
         except Exception as e:
@@ -366,83 +638,95 @@ class MongoDatabaseClient:
             logger.error(f"Error syncing metadata: {e}")
             return {"success": False, "error": str(e)}
 
-    def get_all_rated_tracks(self, min_rating: float = 0.0) -> List[Dict[str, Any]]:
+    def get_all_rated_tracks(self, min_rating: float = 0.0, limit: Optional[int] = None, skip: int = 0) -> List[Dict[str, Any]]:
         """
         Get all tracks with ratings above a threshold.
         
         Args:
             min_rating: Minimum average rating filter
+            limit: Optional page size
+            skip: Optional page offset
         
         Returns:
-            List of tracks with their ratings
+            List of tracks with their ratings, best rated first
+        """
+        return list(self.iter_rated_tracks(min_rating, limit=limit, skip=skip))
+
+    def iter_rated_tracks(self, min_rating: float = 0.0, limit: Optional[int] = None, skip: int = 0,
+                          batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Stream rated tracks from a single server-side pipeline.
+
+        Ratings come from rating_summaries and track metadata is joined with
+        $lookup, so callers that stop early (e.g. "top 20") only pay for what
+        they consume.
+
+        Args:
+            min_rating: Minimum average rating filter
+            limit: Optional maximum number of tracks
+            skip: Optional offset
+            batch_size: Cursor batch size
+
+        Yields:
+            Track dicts with song_id, file_path, metadata and rating
         """
+        pipeline = [
+            {"$match": {"total": {"$gt": 0}}},
+            {"$addFields": {"average": {"$divide": ["$sum", "$total"]}}},
+            {"$match": {"average": {"$gte": min_rating}}},
+            {"$sort": {"average": -1, "_id": 1}}
+        ]
+        if skip:
+            pipeline.append({"$skip": skip})
+        if limit:
+            pipeline.append({"$limit": limit})
+        # Join after paging so only the returned songs hit the tracks collection
+        pipeline += [
+            {"$lookup": {
+                "from": self.tracks_collection.name,
+                "localField": "_id",
+                "foreignField": "song_id",
+                "as": "track"
+            }},
+            {"$project": {
+                "average": 1,
+                "total": 1,
+                "file_path": {"$arrayElemAt": ["$track.file_path", 0]},
+                "metadata": {"$arrayElemAt": ["$track.metadata", 0]}
+            }}
+        ]
+
         try:
-            # Aggregate tracks with ratings
-            pipeline = [
-                {"$group": {
-                    "_id": "$song_id",
-                    "average": {"$avg": "$rating"},
-                    "total": {"$sum": 1}
-                }},
-                {"$match": {"average": {"$gte": min_rating}}},
-                {"$sort": {"average": -1}}
-            ]
-            
-            raw_results = list(self.ratings_collection.aggregate(pipeline))
-            logger.info(f"DEBUG: Raw Aggregation Found {len(raw_results)} groups.")
-            for r in raw_results:
-                 logger.info(f"DEBUG Group: {r}")
-            
-            # Enrich with track metadata
-            result = []
-            for rating in raw_results:
-                if not rating["_id"]:
-                    continue # Skip null grouping (old data?))
-                track = self.tracks_collection.find_one({"song_id": rating["_id"]})
-                if track:
-                    result.append({
-                        "song_id": rating["_id"],
-                        "file_path": track.get("file_path"),
-                        "metadata": track.get("metadata", {}),
-                        "rating": {
-                            "average": round(rating["average"], 2),
-                            "total": rating["total"]
-                        }
-                    })
-                else:
-                    # Include even if track is missing, so sync script can try to heal it
-                    result.append({
-                        "song_id": rating["_id"],
-                        "file_path": None,
-                        "metadata": {},
+            cursor = self.rating_summaries_collection.aggregate(pipeline, batchSize=batch_size)
+            with cursor:
+                for doc in cursor:
+                    # Tracks without a library entry are included so sync scripts can try to heal them
+                    yield {
+                        "song_id": doc["_id"],
+                        "file_path": doc.get("file_path"),
+                        "metadata": self._display_metadata(doc.get("metadata") or {}, doc.get("file_path")),
                         "rating": {
-                            "average": round(rating["average"], 2),
-                            "total": rating["total"]
+                            "average": round(doc["average"], 2),
+                            "total": doc["total"]
                         }
-                    })
-
-                # Post-processing: Fallback for Unknown Title/Artist
-                last_entry = result[-1]
-                meta = last_entry["metadata"]
-                if not meta.get("title") or not meta.get("artist"):
-                    fp = last_entry.get("file_path")
-                    if fp:
-                        import os
-                        filename = os.path.basename(fp)
-                        name_part = os.path.splitext(filename)[0]
-                        if " - " in name_part:
-                            parts = name_part.split(" - ", 1)
-                            if not meta.get("artist"): meta["artist"] = parts[0]
-                            if not meta.get("title"): meta["title"] = parts[1]
-                        else:
-                            if not meta.get("title"): meta["title"] = name_part
-                            if not meta.get("artist"): meta["artist"] = "Unknown Artist"
-                        last_entry["metadata"] = meta
-            
-            return result
+                    }
         except Exception as e:
             logger.error(f"Error fetching rated tracks: {e}")
-            return []
+
+    @staticmethod
+    def _display_metadata(meta: Dict[str, Any], file_path: Optional[str]) -> Dict[str, Any]:
+        """Fallback for Unknown Title/Artist: derive them from the file name."""
+        if (meta.get("title") and meta.get("artist")) or not file_path:
+            return meta
+        name_part = os.path.splitext(os.path.basename(file_path))[0]
+        if " - " in name_part:
+            parts = name_part.split(" - ", 1)
+            if not meta.get("artist"): meta["artist"] = parts[0]
+            if not meta.get("title"): meta["title"] = parts[1]
+        else:
+            if not meta.get("title"): meta["title"] = name_part
+            if not meta.get("artist"): meta["artist"] = "Unknown Artist"
+        return meta
 
     def log_sync_operation(self, operation: str, details: Dict[str, Any]):
         """
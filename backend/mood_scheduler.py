@@ -12,8 +12,10 @@ Feature Flags:
 """
 
 import os
+import random
 import asyncio
 import logging
+from collections import deque
 from datetime import datetime
 from typing import Optional, Dict, Any
 
@@ -25,6 +27,10 @@ MOOD_CYCLE_SECONDS = int(os.getenv("MOOD_CYCLE_SECONDS", "300"))
 AZURACAST_URL = os.getenv("AZURACAST_URL", "http://192.168.178.210")
 AZURACAST_API_KEY = os.getenv("AZURACAST_API_KEY")
 STATION_ID = 1
+MOOD_RECENT_EXCLUDE = int(os.getenv("MOOD_RECENT_EXCLUDE", "20"))
+
+# Song IDs queued by this worker recently; excluded from mood candidates
+recently_queued = deque(maxlen=MOOD_RECENT_EXCLUDE)
 
 # Prometheus metrics (optional)
 try:
@@ -61,15 +67,15 @@ async def select_next_track_by_mood(mongo_client, dominant_mood: str) -> Optiona
         return None
     
     try:
-        tracks = mongo_client.get_tracks_by_mood(dominant_mood, limit=20)
+        # One query: sampled, joined and already weighted candidates
+        tracks = mongo_client.get_tracks_by_mood(dominant_mood, limit=20, exclude_song_ids=list(recently_queued))
         
         if not tracks:
             logger.info(f"No tracks found for mood: {dominant_mood}")
             return None
         
-        # Simple random selection from matching tracks
-        import random
-        selected = random.choice(tracks)
+        # Weighted random selection (more votes / better rating -> more likely)
+        selected = random.choices(tracks, weights=[t.get("weight", 1) for t in tracks], k=1)[0]
         
         logger.info(f"Selected track for mood '{dominant_mood}': {selected.get('metadata', {}).get('title', 'Unknown')}")
         return selected
@@ -104,6 +110,7 @@ async def queue_track_in_azuracast(azura_client, track: Dict[str, Any]) -> bool:
         if success:
             logger.info(f"Successfully queued track: {track.get('metadata', {}).get('title', song_id)}")
             MOOD_QUEUE_TRIGGERED.inc()
+            recently_queued.append(song_id)
         
         return success
         
@@ -118,14 +125,13 @@ async def get_fallback_track(mongo_client) -> Optional[Dict[str, Any]]:
     """
     try:
         # Get highly-rated tracks as fallback
-        tracks = mongo_client.get_all_rated_tracks(min_rating=3.0)
+        tracks = mongo_client.get_all_rated_tracks(min_rating=3.0, limit=20)  # Top 20 rated
         
         if not tracks:
             logger.warning("No fallback tracks available")
             return None
         
-        import random
-        selected = random.choice(tracks[:20])  # Top 20 rated
+        selected = random.choice(tracks)
         
         MOOD_FALLBACK_TRIGGERED.inc()
         logger.info(f"Using fallback track: {selected.get('metadata', {}).get('title', 'Unknown')}")
@@ -0,0 +1,197 @@
+"""
+Now-Playing Cache
+
+One background poller owns each AzuraCast payload (now-playing, history) so
+listener requests are served from memory instead of hitting AzuraCast and
+MongoDB once per request:
+
+1. The poller fetches the payload every POLL_INTERVAL
+2. Songs are enriched (ratings, moods) only when the set of songs changed or
+   a vote marked one of them dirty; otherwise the previous enrichment is reused
+3. Readers get the cached payload while it is younger than MAX_AGE; past that
+   (poller stalled, upstream down) the first reader refreshes and concurrent
+   readers wait on that same refresh (single-flight)
+4. Payloads pushed by AzuraCast webhooks are applied immediately, so with
+   webhooks enabled the poller is only a slow safety net
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+from conditional import content_digest
+
+logger = logging.getLogger("NowPlayingCache")
+
+NOWPLAYING_REFRESHES = Counter(
+    'nowplaying_cache_refresh_total',
+    'Upstream refreshes of cached AzuraCast payloads',
+    ['payload', 'source', 'result']
+)
+
+# fetch() -> freshly decoded payload; songs(payload) -> song dicts to enrich in place;
+# enrich(song_ids) -> {song_id: extra fields} (blocking, runs in a thread)
+Fetcher = Callable[[], Awaitable[Any]]
+SongSelector = Callable[[Any], List[Dict[str, Any]]]
+Enricher = Callable[[List[str]], Dict[str, Dict[str, Any]]]
+
+
+class UpstreamError(Exception):
+    """AzuraCast could not be fetched; carries the response the route should return."""
+
+    def __init__(self, status_code: int, content: Dict[str, Any]):
+        super().__init__(content.get("error"))
+        self.status_code = status_code
+        self.content = content
+
+
+class PolledPayload:
+    """
+    Cached, enriched copy of one upstream payload.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Fetcher,
+        songs: SongSelector,
+        enrich: Enricher,
+        poll_interval: float = 5.0,
+        max_age: float = 15.0,
+        on_change: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ):
+        """
+        Args:
+            name: Label used in logs and metrics
+            fetch: Coroutine returning the decoded upstream payload (raises UpstreamError)
+            songs: Returns the song dicts inside a payload that should be enriched
+            enrich: Builds extra fields per song_id
+            poll_interval: Seconds between background refreshes
+            max_age: Oldest payload readers will be served before they force a refresh
+            on_change: Awaited with the enriched payload whenever its songs change
+        """
+        self.name = name
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self._fetch = fetch
+        self._songs = songs
+        self._enrich = enrich
+        self._on_change = on_change
+
+        self._value: Any = None
+        self._fetched_at = 0.0
+        # Bumped whenever readers would see a different payload (validators for conditional GETs)
+        self.version = 0
+        self.updated_at = time.time()
+        # Digest of the enriched payload; the same data gives the same digest in every worker
+        self.digest: Optional[str] = None
+        self._song_ids: Tuple[str, ...] = ()
+        self._extras: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._inflight: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    @property
+    def song_ids(self) -> Tuple[str, ...]:
+        return self._song_ids
+
+    def mark_dirty(self, song_id: str):
+        """A vote changed `song_id`; re-enrich on the next read if it is in the payload."""
+        if song_id in self._song_ids:
+            self._dirty = True
+
+    async def get(self) -> Any:
+        """Cached payload, refreshing first if it is missing, too old, or dirty."""
+        if self._value is None or self.age > self.max_age:
+            await self.refresh()
+        elif self._dirty:
+            await self.refresh(fetch=False)
+        return self._value
+
+    async def refresh(self, fetch: bool = True) -> Any:
+        """Refresh the payload, joining a refresh that is already running."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh(fetch))
+        # shield: a reader that disconnects must not cancel the refresh others wait on
+        return await asyncio.shield(self._inflight)
+
+    async def push(self, payload: Any) -> Any:
+        """Ingest a payload the upstream delivered itself (webhook) as if it had just been fetched."""
+        return await self._apply(payload, source="push")
+
+    def expire(self):
+        """Force the next read to refetch (e.g. history after a song change)."""
+        self._fetched_at = 0.0
+
+    async def _refresh(self, fetch: bool) -> Any:
+        if not fetch and self._value is not None:
+            return await self._apply(self._value, source=None)
+        try:
+            payload = await self._fetch()
+        except UpstreamError:
+            NOWPLAYING_REFRESHES.labels(self.name, "poll", "error").inc()
+            raise
+        return await self._apply(payload, source="poll")
+
+    async def _apply(self, payload: Any, source: Optional[str]) -> Any:
+        # source: "poll" / "push" for new upstream data, None to re-enrich the cached payload
+        songs = [song for song in self._songs(payload) if isinstance(song, dict) and song.get("id")]
+        song_ids = tuple(song["id"] for song in songs)
+        changed = song_ids != self._song_ids
+
+        if changed or self._dirty:
+            # Clear before enriching so a vote landing mid-enrichment dirties the next read.
+            self._dirty = False
+            self._extras = await asyncio.to_thread(self._enrich, list(dict.fromkeys(song_ids)))
+        for song in songs:
+            song.update(self._extras.get(song["id"], {}))
+
+        self._value = payload
+        self._song_ids = song_ids
+        # Most polls return what readers already have; keep their validators valid then
+        digest = content_digest(payload)
+        if digest != self.digest:
+            self.digest = digest
+            self.version += 1
+            self.updated_at = time.time()
+        if source:
+            self._fetched_at = time.monotonic()
+            NOWPLAYING_REFRESHES.labels(self.name, source, "changed" if changed else "unchanged").inc()
+
+        if changed and self._on_change:
+            try:
+                await self._on_change(payload)
+            except Exception as e:
+                logger.error(f"{self.name}: change callback failed: {e}")
+        return payload
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"{self.name}: polling every {self.poll_interval}s (max age {self.max_age}s)")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except UpstreamError as e:
+                logger.warning(f"{self.name}: upstream refresh failed: {e}")
+            except Exception as e:
+                logger.error(f"{self.name}: refresh error: {e}")
+            await asyncio.sleep(self.poll_interval)
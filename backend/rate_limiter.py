@@ -0,0 +1,125 @@
+"""
+In-Memory Rate Limiter
+
+Sliding-window limiter used by the voting routes instead of counting
+recent votes in MongoDB. Each key (usually a client IP) keeps at most
+`limit` timestamps, idle keys are evicted once their window has passed,
+and the number of tracked keys is capped so memory stays bounded.
+
+Limits are configured per route as "<hits>/<seconds>", e.g. RATE_LIMIT_RATE="10/600".
+
+The windows live in each worker's memory. With several uvicorn workers the
+APIs relay every allowed hit over the event bus (on_hit) and the other
+workers record() it, so a client gets the configured limit in total rather
+than once per worker. Relaying is asynchronous: requests that race across
+workers within the bus latency can still slip through.
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Optional, Tuple
+
+logger = logging.getLogger("RateLimiter")
+
+
+def parse_rate(spec: str) -> Tuple[int, float]:
+    """Parse "10/600" into (10, 600.0)."""
+    hits, _, seconds = spec.partition("/")
+    return int(hits), float(seconds)
+
+
+class SlidingWindowLimiter:
+    """
+    Per-key sliding window: allows `limit` hits within any `window` seconds.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 50000,
+                 on_hit: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            limit: Hits allowed per window
+            window: Window length in seconds
+            max_keys: Upper bound on tracked keys (least recently seen are dropped first)
+            on_hit: Called with the key of every allowed hit (to relay it to other workers)
+        """
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.on_hit = on_hit
+        self._hits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls, name: str, default: str, max_keys: int = 50000,
+                 on_hit: Optional[Callable[[str], None]] = None) -> "SlidingWindowLimiter":
+        spec = os.getenv(name, default)
+        try:
+            limit, window = parse_rate(spec)
+        except ValueError:
+            logger.warning(f"Invalid {name}={spec!r}, using {default}")
+            limit, window = parse_rate(default)
+        return cls(limit, window, max_keys, on_hit)
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+    def hit(self, key: str, now: Optional[float] = None) -> bool:
+        """
+        Record a hit for `key` if it is within the limit.
+
+        Returns:
+            True if allowed, False if the caller should be throttled
+        """
+        now = time.monotonic() if now is None else now
+        hits = self._window(key, now)
+        if len(hits) >= self.limit:
+            return False
+        hits.append(now)
+        if self.on_hit is not None:
+            self.on_hit(key)
+        return True
+
+    def record(self, key: str, now: Optional[float] = None):
+        """Count a hit another worker already allowed (never throttled, never relayed)."""
+        now = time.monotonic() if now is None else now
+        # At most `limit` timestamps are kept; the newest ones decide retry_after
+        self._window(key, now).append(now)
+
+    def retry_after(self, key: str, now: Optional[float] = None) -> int:
+        """Seconds until `key` may hit again (0 if it already may)."""
+        now = time.monotonic() if now is None else now
+        hits = self._hits.get(key)
+        if not hits or len(hits) < self.limit:
+            return 0
+        return max(0, int(hits[0] + self.window - now) + 1)
+
+    def reset(self, key: str):
+        """Forget `key`, e.g. when the connection it identifies is gone."""
+        self._hits.pop(key, None)
+
+    def _window(self, key: str, now: float) -> Deque[float]:
+        """Hits of `key` still inside the window ending at `now`."""
+        self._evict_idle(now)
+
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = deque(maxlen=self.limit)
+            if len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+        else:
+            self._hits.move_to_end(key)
+
+        cutoff = now - self.window
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        return hits
+
+    def _evict_idle(self, now: float):
+        # Keys are kept in last-seen order, so idle ones sit at the front.
+        cutoff = now - self.window
+        while self._hits:
+            key, hits = next(iter(self._hits.items()))
+            if hits and hits[-1] > cutoff:
+                break
+            del self._hits[key]
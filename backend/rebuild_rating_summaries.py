@@ -0,0 +1,42 @@
+"""
+One-shot rebuild of the materialized rating summaries.
+
+Recomputes the rating_summaries collection (total, sum, 5-slot distribution
+per song) from the raw ratings collection. Run after restoring a backup,
+after importing ratings directly, or whenever the summaries look off.
+
+Usage:
+    python rebuild_rating_summaries.py
+"""
+
+import os
+import logging
+from mongo_client import MongoDatabaseClient
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("RatingSummaryRebuild")
+
+
+def build_mongo_uri() -> str:
+    mongo_uri = os.getenv("MONGO_URI")
+    if mongo_uri:
+        return mongo_uri
+    user = os.getenv("MONGO_INITDB_ROOT_USERNAME", "root")
+    pwd = os.getenv("MONGO_INITDB_ROOT_PASSWORD", "")
+    host = os.getenv("MONGO_HOST", "192.168.178.222")
+    port = os.getenv("MONGO_PORT", "27017")
+    if user and pwd:
+        return f"mongodb://{user}:{pwd}@{host}:{port}/"
+    return f"mongodb://{host}:{port}/"
+
+
+if __name__ == "__main__":
+    db = MongoDatabaseClient(build_mongo_uri(), os.getenv("MONGO_DB_NAME", "radio_ratings"))
+    try:
+        count = db.rebuild_rating_summaries()
+        logger.info(f"Done. {count} songs summarized.")
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+"""
+Replay recorded AzuraCast now-playing payloads against the webhook receiver.
+
+Stands in for AzuraCast when testing /webhooks/azuracast locally: each file
+is POSTed the way AzuraCast's Generic Web Hook would send it, and the
+receiver's verdict (song_changed / listeners / ignored / error) is printed.
+Any saved /api/nowplaying/1 response works as a recording, e.g. the
+azuracast_status.json snapshot in the repository root.
+
+Usage:
+    python replay_webhooks.py ../azuracast_status.json
+    python replay_webhooks.py --url http://localhost:8000/webhooks/azuracast --repeat 3 --interval 1 a.json b.json
+
+The secret defaults to AZURACAST_WEBHOOK_SECRET.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import httpx
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("WebhookReplay")
+
+
+def load_recording(path: str):
+    """Read a recorded payload (handles the UTF-16 files PowerShell tends to write)."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw.startswith((b"\xff\xfe", b"\xfe\xff")):
+        text = raw.decode("utf-16")
+    else:
+        text = raw.decode("utf-8-sig")
+    return json.loads(text)
+
+
+def replay(url: str, secret: str, paths, repeat: int = 1, interval: float = 0.0) -> int:
+    """
+    POST each recording `repeat` times.
+
+    Returns:
+        Number of deliveries the receiver rejected
+    """
+    headers = {"X-Webhook-Secret": secret} if secret else {}
+    failures = 0
+    with httpx.Client(timeout=10) as client:
+        for _ in range(repeat):
+            for path in paths:
+                payload = load_recording(path)
+                resp = client.post(url, json=payload, headers=headers)
+                try:
+                    verdict = resp.json()
+                except ValueError:
+                    verdict = resp.text
+                logger.info(f"{os.path.basename(path)} -> {resp.status_code} {verdict}")
+                if resp.status_code >= 400:
+                    failures += 1
+                if interval:
+                    time.sleep(interval)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded AzuraCast webhook payloads")
+    parser.add_argument("payloads", nargs="+", help="Recorded now-playing JSON files")
+    parser.add_argument("--url", default="http://localhost:8000/webhooks/azuracast")
+    parser.add_argument("--secret", default=os.getenv("AZURACAST_WEBHOOK_SECRET", ""))
+    parser.add_argument("--repeat", type=int, default=1, help="Send every payload N times (exercises de-duplication)")
+    parser.add_argument("--interval", type=float, default=0.0, help="Seconds between deliveries")
+    args = parser.parse_args()
+
+    sys.exit(1 if replay(args.url, args.secret, args.payloads, args.repeat, args.interval) else 0)
@@ -0,0 +1,89 @@
+"""
+Response Serialization
+
+Fast encoders for the bulk endpoints (/ratings, /moods, /library,
+/library/all, /mongo/tracks/rated), bypassing FastAPI's jsonable_encoder
+walk over every document:
+
+- JSON via orjson when installed (stdlib json otherwise)
+- MessagePack when the client sends `Accept: application/msgpack` (or
+  `?format=msgpack`, for clients that cannot set headers) and the msgpack
+  package is installed; `?format=json` forces JSON
+- ObjectId and datetime values from MongoDB are encoded natively, so
+  documents can be returned as they come out of pymongo
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Mapping, Optional
+
+from bson import ObjectId
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(obj: Any) -> Any:
+    """Encode the MongoDB types the fast encoders don't know."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps_json(content: Any, sort_keys: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(content, default=_default, option=option)
+    return json.dumps(content, default=_default, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_msgpack(content)
+
+
+def wants_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    fmt = request.query_params.get("format")
+    if fmt in ("json", "msgpack"):
+        return fmt == "msgpack"
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_TYPES)
+
+
+def negotiated_response(request: Request, content: Any, status_code: int = 200,
+                        headers: Optional[Mapping[str, str]] = None) -> Response:
+    """MessagePack if the client asked for it (and it is available), fast JSON otherwise."""
+    response_class = MsgPackResponse if wants_msgpack(request) else FastJSONResponse
+    response = response_class(content, status_code=status_code, headers=headers)
+    response.headers["Vary"] = "Accept"
+    return response
@@ -0,0 +1,106 @@
+"""
+Song Enrichment
+
+Rating and mood fields merged into AzuraCast song objects before they are
+served or broadcast:
+
+- load_song_enrichment(): fields for a batch of songs with one $in query per
+  collection, however many songs a payload (now-playing, history) holds
+- EnrichmentCache: per-song fields kept in a small LRU and tagged with the
+  song's rating/mood version, so they are reloaded only after a vote
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# view(song_id, doc) -> what readers see for a stored document (e.g. plus buffered votes)
+DocView = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+def _stored(song_id: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    return doc
+
+
+def load_song_enrichment(
+    ratings_col,
+    moods_col,
+    song_ids: Iterable[str],
+    rating_view: DocView = _stored,
+    mood_view: DocView = _stored,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Rating and mood fields for several songs (blocking).
+
+    Args:
+        ratings_col: Ratings collection (_id = song_id)
+        moods_col: Moods collection (_id = song_id)
+        song_ids: Songs to enrich; duplicates are looked up once
+        rating_view: Turns a ratings document (empty if missing) into the "rating" field
+        mood_view: Applied to a moods document (empty if missing) before its fields are read
+
+    Returns:
+        {song_id: {"rating", "moods", "top_mood", "genres", "top_genre"}} for every requested song
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    if not song_ids:
+        return {}
+    ratings = {doc["_id"]: doc for doc in ratings_col.find({"_id": {"$in": song_ids}})}
+    moods = {
+        doc["_id"]: doc
+        for doc in moods_col.find(
+            {"_id": {"$in": song_ids}},
+            {"moods": 1, "top_mood": 1, "genres": 1, "top_genre": 1}
+        )
+    }
+
+    extras = {}
+    for song_id in song_ids:
+        mood_doc = mood_view(song_id, moods.get(song_id, {}))
+        extras[song_id] = {
+            "rating": rating_view(song_id, ratings.get(song_id, {})),
+            "moods": mood_doc.get("moods", {}),
+            "top_mood": mood_doc.get("top_mood"),
+            "genres": mood_doc.get("genres", {}),
+            "top_genre": mood_doc.get("top_genre"),
+        }
+    return extras
+
+
+class EnrichmentCache:
+    """
+    LRU of per-song fields, each tagged with the song's version when it was loaded.
+    """
+
+    def __init__(self, version: Callable[[str], int], load: Callable[[str], Dict[str, Any]], size: int = 256):
+        """
+        Args:
+            version: Current rating/mood version of a song (changes with every vote)
+            load: Reads a song's fields from MongoDB (blocking)
+            size: Songs kept
+        """
+        self.size = size
+        self._version = version
+        self._load = load
+        self._entries: "OrderedDict[str, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, song_id: str) -> Optional[Dict[str, Any]]:
+        """Cached fields for a song, or None if missing or outdated."""
+        cached = self._entries.get(song_id)
+        if cached and cached[0] == self._version(song_id):
+            self._entries.move_to_end(song_id)
+            return cached[1]
+        return None
+
+    def load(self, song_id: str) -> Dict[str, Any]:
+        """Load a song's fields and cache them (blocking)."""
+        # Read the version first: a vote landing mid-load makes the entry stale, not wrong
+        version = self._version(song_id)
+        extras = self._load(song_id)
+        self._entries[song_id] = (version, extras)
+        self._entries.move_to_end(song_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return extras
@@ -0,0 +1,126 @@
+"""
+Steering State Cache
+
+Keeps the radio steering decision in memory so that the hot read paths
+(GET /control/steer, /control/next-song and the Liquidsoap pull) never touch
+MongoDB:
+
+- The admin override document is loaded once and then only changes through
+  set_admin(), which writes through to MongoDB
+- Community votes are counted in a SlidingTally fed by record_vote()
+- The computed state is cached until it is invalidated by a write or until
+  the oldest counted vote expires (its expiry time is tracked, not recomputed)
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from conditional import content_digest
+from vote_tally import SlidingTally
+
+logger = logging.getLogger("SteeringCache")
+
+
+class SteeringStateCache:
+    """
+    Memory-backed view of steering_col + recent steering_votes.
+    """
+
+    def __init__(self, steering_col, votes_col, window_seconds: int = 600):
+        """
+        Args:
+            steering_col: Collection holding the admin override ({"_id": "current"})
+            votes_col: Collection of community steering votes
+            window_seconds: How long a community vote counts
+        """
+        self.steering_col = steering_col
+        self.votes_col = votes_col
+        self.tally = SlidingTally(window_seconds)
+        self._admin: Optional[Dict[str, Any]] = None
+        self._loaded = False
+        self._state: Optional[Dict[str, Any]] = None
+        self._last_state: Optional[Dict[str, Any]] = None
+        self._valid_until: Optional[float] = None
+        self._lock = threading.Lock()
+        # Bumped when the computed state actually changes
+        self.version = 0
+        self.changed_at = time.time()
+        # Digest of the computed state: the ETag token, the same in every worker holding the same state
+        self.digest: Optional[str] = None
+
+    def warm(self):
+        """Load the admin override and the votes still inside the window."""
+        with self._lock:
+            if self._loaded:
+                return
+            doc = self.steering_col.find_one({"_id": "current"}) or {}
+            self._admin = doc.get("state") or {"mode": "auto"}
+            cutoff = int(time.time()) - self.tally.window
+            cursor = self.votes_col.find(
+                {"timestamp": {"$gt": cutoff}},
+                {"vote": 1, "timestamp": 1, "_id": 0}
+            ).sort("timestamp", 1)
+            for vote in cursor:
+                if vote.get("vote"):
+                    self.tally.add(vote["vote"], vote["timestamp"])
+            self._loaded = True
+            self._state = None
+            logger.info(f"Steering cache warmed ({len(self.tally.counts())} vote options in window)")
+
+    def invalidate(self):
+        self._state = None
+
+    def set_admin(self, mode: str, target: Optional[str] = None):
+        """Persist an admin override and update the cache in place."""
+        self.steering_col.update_one(
+            {"_id": "current"},
+            {"$set": {"state": {"mode": mode, "target": target}, "updated_at": int(time.time())}},
+            upsert=True
+        )
+        self.apply_admin(mode, target)
+
+    def apply_admin(self, mode: str, target: Optional[str] = None):
+        """Take over an override another worker already persisted."""
+        self._admin = {"mode": mode, "target": target}
+        self.invalidate()
+
+    def record_vote(self, vote: str, timestamp: Optional[float] = None):
+        """Count a community vote that has already been persisted."""
+        if self._loaded:
+            # Before warm() the vote is picked up from MongoDB instead
+            self.tally.add(vote, timestamp)
+        self.invalidate()
+
+    def get(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        state = self._state
+        if state is not None and (self._valid_until is None or now < self._valid_until):
+            return dict(state)
+
+        if not self._loaded:
+            self.warm()
+
+        admin_mode = self._admin.get("mode", "auto")
+        admin_target = self._admin.get("target")
+
+        if admin_mode != "auto":
+            # Votes don't matter while an admin override is active
+            state = {"mode": admin_mode, "target": admin_target, "source": "admin"}
+            valid_until = None
+        else:
+            winner = self.tally.top(now)
+            if winner:
+                state = {"mode": "mood", "target": winner[0], "source": "community"}
+            else:
+                state = {"mode": "auto", "target": None, "source": "random"}
+            valid_until = self.tally.next_expiry
+
+        if state != self._last_state:
+            self._last_state = state
+            self.version += 1
+            self.changed_at = now
+            self.digest = content_digest(state)
+        self._state, self._valid_until = state, valid_until
+        return dict(state)
@@ -55,14 +55,14 @@ def sync_db_to_files():
         # Actually mongo_client.py uses standard MongoClient (sync) unless it wrapped motor?
         # It imports `pymongo.MongoClient`, so it is synchronous.
         
-        tracks = db.get_all_rated_tracks(min_rating=0.0) # Get everything
-        logger.info(f"Found {len(tracks)} tracks with ratings in DB.")
+        # Stream everything instead of loading the whole library up front
+        tracks = db.iter_rated_tracks(min_rating=0.0)
         
         success_count = 0
         fail_count = 0
         
         for track in tracks:
-            # Data structure from get_all_rated_tracks:
+            # Data structure from iter_rated_tracks:
             # {
             #   "song_id": "...",
             #   "file_path": "...",
@@ -0,0 +1,110 @@
+import json
+
+import mongomock
+import pytest
+
+import collection_sync
+from collection_sync import decode_cursor, encode_cursor, sync_page, sync_query, sync_stream
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    monkeypatch.setattr(collection_sync.time, "time", lambda: NOW + 0.9)
+    collection = mongomock.MongoClient().db.ratings
+    # Three songs share updated_at 200, so a delta page boundary falls inside the tie
+    collection.insert_many([
+        {"_id": "a", "like": 1, "updated_at": 200},
+        {"_id": "b", "like": 2, "updated_at": 100},
+        {"_id": "c", "like": 3, "updated_at": 200},
+        {"_id": "d", "like": 4, "updated_at": 300},
+        {"_id": "e", "like": 5, "updated_at": 200},
+    ])
+    return collection
+
+
+def likes(doc):
+    return {"like": doc["like"]}
+
+
+def drain(collection, since=None, limit=2):
+    """Follow next_cursor to the end; returns the song ids of every page."""
+    pages, cursor = [], None
+    while True:
+        page = sync_page(collection, likes, since, cursor, limit)
+        pages.append(list(page["items"]))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("values", [["song-1"], [200, "song-1"], [0, ""], ["ünïcode/+="]])
+def test_cursor_round_trip(values):
+    token = encode_cursor(values)
+    assert "=" not in token and "+" not in token and "/" not in token
+    assert decode_cursor(token) == values
+
+
+@pytest.mark.parametrize("token", ["not base64!", "bm90IGpzb24", "eyJhIjogMX0"])
+def test_malformed_cursor_is_rejected(token):
+    # Not base64, base64 of "not json", and {"a": 1}: valid JSON, but not a list
+    with pytest.raises((ValueError, TypeError)):
+        sync_query(None, token)
+
+
+def test_delta_cursor_needs_two_values():
+    with pytest.raises((ValueError, TypeError)):
+        sync_query(100, encode_cursor(["a"]))
+
+
+def test_full_sync_pages_by_song_id(collection):
+    assert drain(collection) == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_delta_sync_pages_through_updated_at_ties(collection):
+    # Ordered by (updated_at, _id): the tie at 200 spans two pages without skips or repeats
+    assert drain(collection, since=150) == [["a", "c"], ["e", "d"], []]
+
+
+def test_delta_sync_includes_the_watermark_second(collection):
+    page = sync_page(collection, likes, 300, None)
+    assert list(page["items"]) == ["d"]
+    assert page["items"]["d"] == {"like": 4}
+
+
+def test_last_full_page_still_gets_a_cursor(collection):
+    # The page is full, so the client asks once more and gets an empty last page
+    assert drain(collection, limit=5) == [["a", "b", "c", "d", "e"], []]
+
+
+def test_watermark_trails_the_clock(collection):
+    page = sync_page(collection, likes, None, None)
+    assert page["watermark"] == NOW - collection_sync.SYNC_WATERMARK_LAG_SECONDS
+    assert page["next_cursor"] is None
+
+
+def test_page_size_defaults_and_is_capped(collection, monkeypatch):
+    monkeypatch.setattr(collection_sync, "SYNC_PAGE_DEFAULT", 3)
+    monkeypatch.setattr(collection_sync, "SYNC_PAGE_MAX", 4)
+    assert len(sync_page(collection, likes, None, None)["items"]) == 3
+    assert len(sync_page(collection, likes, None, None, limit=50)["items"]) == 4
+
+
+def test_ndjson_stream_frames_one_document_per_line(collection):
+    lines, watermark = sync_stream(collection, likes, 150, None)
+    lines = list(lines)
+
+    assert watermark == NOW - collection_sync.SYNC_WATERMARK_LAG_SECONDS
+    assert all(line.endswith(b"\n") and line.count(b"\n") == 1 for line in lines)
+    assert [json.loads(line) for line in lines] == [
+        {"song_id": "a", "like": 1},
+        {"song_id": "c", "like": 3},
+        {"song_id": "e", "like": 5},
+        {"song_id": "d", "like": 4},
+    ]
+
+
+def test_ndjson_stream_resumes_from_cursor_and_limit(collection):
+    lines, _ = sync_stream(collection, likes, None, encode_cursor(["b"]), limit=2)
+    assert [json.loads(line)["song_id"] for line in lines] == ["c", "d"]
@@ -0,0 +1,135 @@
+from email.utils import formatdate
+
+from starlette.requests import Request
+
+import conditional
+
+from conditional import ResourceVersions, check_conditional, is_not_modified, make_etag, request_variant
+
+
+def make_request(headers=None, query=""):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/status",
+        "query_string": query.encode(),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+    })
+
+
+def test_etag_is_derived_from_content():
+    etag = make_etag("status", {"song": {"id": "a"}, "listeners": 3})
+    assert etag.startswith('W/"') and etag.endswith('"')
+    # Same content gives the same ETag in every worker, whatever the key order
+    assert etag == make_etag("status", {"listeners": 3, "song": {"id": "a"}})
+    assert etag != make_etag("status", {"song": {"id": "a"}, "listeners": 4})
+    assert etag != make_etag("steer", {"song": {"id": "a"}, "listeners": 3})
+
+
+def test_matching_if_none_match_is_not_modified():
+    etag = make_etag("x", 1)
+    assert is_not_modified(make_request({"If-None-Match": etag}), etag)
+    # Weak comparison: W/"x" and "x" are the same validator
+    assert is_not_modified(make_request({"If-None-Match": etag[2:]}), etag)
+    assert is_not_modified(make_request({"If-None-Match": f'"other", {etag}'}), etag)
+    assert is_not_modified(make_request({"If-None-Match": "*"}), etag)
+    assert not is_not_modified(make_request({"If-None-Match": make_etag("x", 2)}), etag)
+    assert not is_not_modified(make_request(), etag)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    etag = make_etag("x", 1)
+    request = make_request({
+        "If-None-Match": make_etag("x", 2),
+        "If-Modified-Since": formatdate(2_000_000_000, usegmt=True),
+    })
+    assert not is_not_modified(request, etag, last_modified=1_000_000_000)
+
+
+def test_if_modified_since():
+    etag = make_etag("x", 1)
+    since = make_request({"If-Modified-Since": formatdate(1_000_000_000, usegmt=True)})
+    assert is_not_modified(since, etag, last_modified=1_000_000_000.7)
+    assert not is_not_modified(since, etag, last_modified=1_000_000_001)
+    # Without a Last-Modified the date cannot be compared
+    assert not is_not_modified(since, etag)
+    assert not is_not_modified(make_request({"If-Modified-Since": "yesterday"}), etag, last_modified=0)
+
+
+def test_check_conditional_returns_304_with_validators():
+    etag = make_etag("x", 1)
+    not_modified, headers = check_conditional(make_request({"If-None-Match": etag}), etag, 1_000_000_000, max_age=5)
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert headers == {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=5",
+        "Last-Modified": formatdate(1_000_000_000, usegmt=True),
+    }
+
+
+def test_check_conditional_passes_through_when_stale():
+    etag = make_etag("x", 1)
+    not_modified, headers = check_conditional(make_request(), etag)
+    assert not_modified is None
+    assert headers == {"ETag": etag, "Cache-Control": "public, max-age=1"}
+
+
+def test_request_variant_depends_on_query_and_accept():
+    plain = request_variant(make_request(query="limit=10"))
+    assert plain == request_variant(make_request(query="limit=10"))
+    assert plain != request_variant(make_request(query="limit=20"))
+    assert plain != request_variant(make_request({"Accept": "application/x-msgpack"}, query="limit=10"))
+
+
+def test_content_versions_agree_across_workers():
+    first, second = ResourceVersions(), ResourceVersions()
+    assert first.version("status") == "0"
+    token = first.set("status", {"song": {"id": "a"}})
+    # Another worker holding the same state computes the same token
+    assert second.set("status", {"song": {"id": "a"}}) == token
+    assert first.set("status", {"song": {"id": "b"}}) != token
+
+
+def test_content_versions_keep_last_modified_when_unchanged(monkeypatch):
+    versions = ResourceVersions()
+    monkeypatch.setattr(conditional.time, "time", lambda: 100.0)
+    versions.set("steer", {"mode": "auto"})
+    monkeypatch.setattr(conditional.time, "time", lambda: 200.0)
+    versions.set("steer", {"mode": "auto"})
+    assert versions.last_modified("steer") == 100.0
+    versions.set("steer", {"mode": "manual"})
+    assert versions.last_modified("steer") == 200.0
+
+
+def test_bumped_versions_converge_in_any_order(monkeypatch):
+    writer_a, writer_b, reader = ResourceVersions(), ResourceVersions(), ResourceVersions()
+    monkeypatch.setattr(conditional.time, "time", lambda: 100.0)
+    older = writer_a.bump("ratings", "moods")
+    monkeypatch.setattr(conditional.time, "time", lambda: 101.0)
+    newer = writer_b.bump("ratings")
+    assert set(older) == {"ratings", "moods"}
+
+    # The relayed tokens arrive out of order; the newest one wins everywhere
+    reader.apply(newer, 101.0)
+    reader.apply(older, 100.0)
+    writer_b.apply(older, 100.0)
+    assert reader.version("ratings") == writer_b.version("ratings") == newer["ratings"]
+    assert reader.version("moods") == older["moods"]
+    assert reader.last_modified("ratings") == 101.0
+
+
+def test_seed_starts_every_worker_from_newest_update():
+    first, second = ResourceVersions(), ResourceVersions()
+    first.seed("ratings", 1_700_000_000)
+    second.seed("ratings", 1_700_000_000)
+    assert first.version("ratings") == second.version("ratings") != "0"
+    assert first.last_modified("ratings") == 1_700_000_000
+
+    # An empty collection keeps the default; a later bump moves past the seed
+    first.seed("moods", 0)
+    assert first.version("moods") == "0"
+    bumped = first.bump("ratings")["ratings"]
+    first.seed("ratings", 1_700_000_000)
+    assert first.version("ratings") == bumped
@@ -0,0 +1,236 @@
+import copy
+import math
+
+import pytest
+
+from counter_pipelines import apply_increments, mood_update_pipeline, rating_increments, rating_update_pipeline
+
+
+# A small evaluator for the aggregation expressions the pipelines use, so the
+# computed fields can be checked without a mongod (mongomock has no $round).
+
+def resolve(value, path):
+    for part in path.split(".") if path else []:
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def mongo_round(value, places):
+    # Half to even, like $round; scaling first avoids binary-float ties such as 2.675
+    scale = 10 ** places
+    return round(round(value * scale, 9)) / scale
+
+
+def cond(args, doc, variables):
+    condition, then, otherwise = args
+    return evaluate(then if evaluate(condition, doc, variables) else otherwise, doc, variables)
+
+
+def greater(args, doc, variables):
+    left, right = (evaluate(arg, doc, variables) for arg in args)
+    # BSON order: null sorts below every number
+    if left is None or right is None:
+        return left is not None
+    return left > right
+
+
+def reduce_(args, doc, variables):
+    value = evaluate(args["initialValue"], doc, variables)
+    for item in evaluate(args["input"], doc, variables) or []:
+        value = evaluate(args["in"], doc, {**variables, "this": item, "value": value})
+    return value
+
+
+def let(args, doc, variables):
+    bound = {name: evaluate(expr, doc, variables) for name, expr in args["vars"].items()}
+    return evaluate(args["in"], doc, {**variables, **bound})
+
+
+def if_null(args, doc, variables):
+    for arg in args:
+        value = evaluate(arg, doc, variables)
+        if value is not None:
+            return value
+    return None
+
+
+OPERATORS = {
+    "$add": lambda args, doc, v: sum(evaluate(arg, doc, v) for arg in args),
+    "$multiply": lambda args, doc, v: math.prod(evaluate(arg, doc, v) for arg in args),
+    "$divide": lambda args, doc, v: evaluate(args[0], doc, v) / evaluate(args[1], doc, v),
+    "$round": lambda args, doc, v: mongo_round(evaluate(args[0], doc, v), args[1]),
+    "$ifNull": if_null,
+    "$cond": cond,
+    "$gt": greater,
+    "$objectToArray": lambda arg, doc, v: [{"k": k, "v": value} for k, value in evaluate(arg, doc, v).items()],
+    "$reduce": reduce_,
+    "$let": let,
+}
+
+
+def evaluate(expr, doc, variables=None):
+    variables = variables or {}
+    if isinstance(expr, str) and expr.startswith("$$"):
+        name, _, path = expr[2:].partition(".")
+        return resolve(variables[name], path)
+    if isinstance(expr, str) and expr.startswith("$"):
+        return resolve(doc, expr[1:])
+    if isinstance(expr, list):
+        return [evaluate(item, doc, variables) for item in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1 and next(iter(expr)).startswith("$"):
+            operator, args = next(iter(expr.items()))
+            return OPERATORS[operator](args, doc, variables)
+        return {key: evaluate(value, doc, variables) for key, value in expr.items()}
+    return expr
+
+
+def run_pipeline(doc, pipeline):
+    """Apply $set stages the way an update pipeline does (each stage sees the previous one's output)."""
+    for stage in pipeline:
+        (operator, fields), = stage.items()
+        assert operator == "$set"
+        values = {path: evaluate(expr, doc) for path, expr in fields.items()}
+        doc = copy.deepcopy(doc)
+        for path, value in values.items():
+            head, _, leaf = path.rpartition(".")
+            target = doc
+            for part in head.split(".") if head else []:
+                target = target.setdefault(part, {})
+            target[leaf] = value
+    return doc
+
+
+def test_rating_increments():
+    assert rating_increments("like", 4) == {"like": 1, "distribution.4": 1, "total": 1}
+    assert rating_increments("dislike") == {"dislike": 1}
+    assert rating_increments(rating_value=2) == {"distribution.2": 1, "total": 1}
+    assert rating_increments() == {}
+
+
+def test_rating_pipeline_applies_increments_and_sets():
+    counters, average = rating_update_pipeline({"like": 1, "distribution.5": 2}, {"updated_at": 123})
+
+    fields = counters["$set"]
+    assert fields["updated_at"] == 123
+    assert fields["like"] == {"$add": [{"$ifNull": ["$like", 0]}, 1]}
+    assert fields["distribution.5"] == {"$add": [{"$ifNull": ["$distribution.5", 0]}, 2]}
+    # Untouched star slots are materialized so the average stage can read them
+    for k in range(1, 5):
+        assert fields[f"distribution.{k}"] == {"$add": [{"$ifNull": [f"$distribution.{k}", 0]}, 0]}
+    assert list(average["$set"]) == ["average"]
+
+
+def test_rating_pipeline_average_guards_empty_distribution():
+    _, average = rating_update_pipeline({"like": 1}, {})
+    condition, value, fallback = average["$set"]["average"]["$cond"]
+
+    star_total = {"$add": [f"$distribution.{k}" for k in range(1, 6)]}
+    assert condition == {"$gt": [star_total, 0]}
+    assert value == {"$round": [{"$divide": [
+        {"$add": [{"$multiply": [k, f"$distribution.{k}"]} for k in range(1, 6)]},
+        star_total,
+    ]}, 3]}
+    assert fallback == 0.0
+
+
+def test_rating_pipeline_does_not_mutate_set_fields():
+    set_fields = {"updated_at": 1}
+    rating_update_pipeline({"total": 1}, set_fields)
+    assert set_fields == {"updated_at": 1}
+
+
+def test_mood_pipeline_recomputes_top_keys():
+    stages = mood_update_pipeline({"moods.chill": 1}, {"title": "Song"})
+    assert len(stages) == 2
+    assert stages[0]["$set"]["title"] == "Song"
+    assert stages[0]["$set"]["moods.chill"] == {"$add": [{"$ifNull": ["$moods.chill", 0]}, 1]}
+    assert set(stages[1]["$set"]) == {"top_mood", "top_genre"}
+
+
+def test_mood_pipeline_without_changes_only_recomputes():
+    stages = mood_update_pipeline({}, {})
+    assert len(stages) == 1
+    assert set(stages[0]["$set"]) == {"top_mood", "top_genre"}
+
+
+def test_apply_increments_copies_nested_documents():
+    doc = {"like": 2, "distribution": {"4": 1}}
+    result = apply_increments(doc, {"like": 1, "distribution.4": 1, "distribution.5": 1, "total": 1})
+
+    assert result == {"like": 3, "distribution": {"4": 2, "5": 1}, "total": 1}
+    assert doc == {"like": 2, "distribution": {"4": 1}}
+
+
+def test_rating_pipeline_computes_average_on_insert():
+    doc = run_pipeline({}, rating_update_pipeline(rating_increments("like", 4), {"updated_at": 10}))
+    assert doc == {
+        "updated_at": 10,
+        "like": 1,
+        "total": 1,
+        "distribution": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 0},
+        "average": 4.0,
+    }
+
+
+def test_rating_pipeline_average_of_coalesced_votes():
+    doc = {"like": 3, "total": 2, "distribution": {"1": 1, "5": 1}, "average": 3.0}
+    # Two buffered 5-star votes and one 4-star vote written as one update
+    inc = {"distribution.5": 2, "distribution.4": 1, "total": 3, "like": 2}
+    updated = run_pipeline(doc, rating_update_pipeline(inc, {"updated_at": 20}))
+
+    # (1 + 4 + 3 * 5) / 5
+    assert updated["average"] == 4.0
+    assert updated["distribution"] == {"1": 1, "2": 0, "3": 0, "4": 1, "5": 3}
+    assert (updated["like"], updated["total"]) == (5, 5)
+
+
+@pytest.mark.parametrize("distribution, average", [
+    ({"1": 1, "2": 1, "5": 1}, 2.667),
+    ({"4": 2, "5": 1}, 4.333),
+    ({"3": 7}, 3.0),
+])
+def test_rating_pipeline_rounds_average_to_three_places(distribution, average):
+    doc = run_pipeline({"distribution": distribution}, rating_update_pipeline({}, {}))
+    assert doc["average"] == average
+
+
+def test_rating_pipeline_average_is_zero_without_stars():
+    doc = run_pipeline({"dislike": 4}, rating_update_pipeline(rating_increments("like"), {}))
+    assert doc["average"] == 0.0
+    assert (doc["like"], doc["dislike"]) == (1, 4)
+
+
+def test_rating_pipeline_counters_match_optimistic_read():
+    doc = {"like": 2, "distribution": {"4": 1}, "total": 1}
+    inc = {"like": 1, "distribution.4": 1, "distribution.2": 1, "total": 2}
+    written = run_pipeline(doc, rating_update_pipeline(inc, {}))
+    optimistic = apply_increments(doc, inc)
+    for key in ("like", "total"):
+        assert written[key] == optimistic[key]
+    assert {k: v for k, v in written["distribution"].items() if v} == optimistic["distribution"]
+
+
+def test_mood_pipeline_picks_top_mood():
+    doc = {"moods": {"chill": 2, "dark": 1}, "top_mood": "chill"}
+    updated = run_pipeline(doc, mood_update_pipeline({"moods.dark": 2, "genres.techno": 1}, {"title": "Song"}))
+
+    assert updated["moods"] == {"chill": 2, "dark": 3}
+    assert updated["top_mood"] == "dark"
+    assert updated["top_genre"] == "techno"
+    assert updated["title"] == "Song"
+
+
+def test_mood_pipeline_keeps_first_mood_on_a_tie():
+    doc = {"moods": {"chill": 2, "dark": 1}, "top_mood": "chill"}
+    updated = run_pipeline(doc, mood_update_pipeline({"moods.dark": 1}, {}))
+    assert updated["top_mood"] == "chill"
+
+
+def test_mood_pipeline_keeps_top_keys_without_counters():
+    doc = {"title": "Old", "top_mood": "chill", "top_genre": "house"}
+    updated = run_pipeline(doc, mood_update_pipeline({}, {"title": "New"}))
+    assert (updated["top_mood"], updated["top_genre"], updated["title"]) == ("chill", "house", "New")
+
+    fresh = run_pipeline({}, mood_update_pipeline({"moods.warm": 1}, {}))
+    assert (fresh["top_mood"], fresh["top_genre"]) == ("warm", None)
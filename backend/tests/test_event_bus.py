@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from event_bus import EventBus, InProcessBus, create_event_bus
+from rate_limiter import SlidingWindowLimiter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    # publish() hands envelopes to the pump task through the loop
+    await asyncio.sleep(0.01)
+
+
+async def started_workers(count):
+    hub = []
+    buses = [InProcessBus(hub=hub) for _ in range(count)]
+    for bus in buses:
+        await bus.start()
+    return buses
+
+
+async def close_all(buses):
+    for bus in buses:
+        await bus.close()
+
+
+def test_event_bus_is_abstract():
+    with pytest.raises(TypeError):
+        EventBus()
+
+
+def test_publish_fans_out_to_other_workers():
+    async def scenario():
+        buses = await started_workers(3)
+        received = {n: [] for n in range(3)}
+        for n, bus in enumerate(buses):
+            bus.on("steering", received[n].append)
+        buses[0].publish("steering", {"mode": "manual"})
+        await settle()
+        await close_all(buses)
+        return received
+
+    # The publisher already applied the change itself
+    assert run(scenario()) == {0: [], 1: [{"mode": "manual"}], 2: [{"mode": "manual"}]}
+
+
+def test_handlers_only_see_their_kind():
+    async def scenario():
+        sender, receiver = await started_workers(2)
+        votes, steering = [], []
+        receiver.on("vote", votes.append)
+        receiver.on("steering", steering.append)
+
+        async def async_handler(data):
+            votes.append(("async", data))
+
+        receiver.on("vote", async_handler)
+        sender.publish("vote", {"mood": "chill"})
+        sender.publish("unhandled", {})
+        await settle()
+        await close_all([sender, receiver])
+        return votes, steering
+
+    assert run(scenario()) == ([{"mood": "chill"}, ("async", {"mood": "chill"})], [])
+
+
+def test_failing_handler_does_not_stop_the_others():
+    async def scenario():
+        sender, receiver = await started_workers(2)
+        seen = []
+
+        def broken(data):
+            raise RuntimeError("boom")
+
+        receiver.on("vote", broken)
+        receiver.on("vote", seen.append)
+        sender.publish("vote", {"n": 1})
+        sender.publish("vote", {"n": 2})
+        await settle()
+        await close_all([sender, receiver])
+        return seen
+
+    assert run(scenario()) == [{"n": 1}, {"n": 2}]
+
+
+def test_publish_before_start_and_after_close_is_a_no_op():
+    async def scenario():
+        hub = []
+        sender, receiver = InProcessBus(hub=hub), InProcessBus(hub=hub)
+        seen = []
+        receiver.on("vote", seen.append)
+        sender.publish("vote", {"n": 0})
+
+        await sender.start()
+        await receiver.start()
+        sender.publish("vote", {"n": 1})
+        await settle()
+
+        await receiver.close()
+        sender.publish("vote", {"n": 2})
+        await settle()
+        await sender.close()
+        sender.publish("vote", {"n": 3})
+        return seen, sender._tasks
+
+    seen, tasks = run(scenario())
+    # A closed worker no longer receives, and closing cancelled the pump and listener
+    assert seen == [{"n": 1}]
+    assert tasks == []
+
+
+def test_limiter_hits_are_relayed_between_workers():
+    async def scenario():
+        buses = await started_workers(2)
+        limiters = []
+        for bus in buses:
+            limiter = SlidingWindowLimiter(
+                limit=2, window=60, on_hit=lambda key, bus=bus: bus.publish("rate_hit", {"key": key})
+            )
+            bus.on("rate_hit", lambda data, limiter=limiter: limiter.record(data["key"]))
+            limiters.append(limiter)
+
+        first = [limiters[0].hit("ip"), limiters[1].hit("ip")]
+        await settle()
+        # Each worker saw one hit itself and one relayed: the shared limit is used up
+        second = [limiters[0].hit("ip"), limiters[1].hit("ip")]
+        await close_all(buses)
+        return first, second
+
+    assert run(scenario()) == ([True, True], [False, False])
+
+
+def test_create_event_bus_defaults_to_local(monkeypatch):
+    monkeypatch.setenv("EVENT_BUS", "carrier-pigeon")
+    assert isinstance(create_event_bus(), InProcessBus)
+    monkeypatch.setenv("EVENT_BUS", "mongo")
+    with pytest.raises(RuntimeError):
+        create_event_bus(None)
@@ -0,0 +1,122 @@
+import asyncio
+import sys
+import types
+
+import httpx
+from prometheus_client import REGISTRY
+
+from http_pool import SharedHTTPClient
+
+
+def sample(metric, **labels):
+    return REGISTRY.get_sample_value(metric, labels)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    monkeypatch.setitem(sys.modules, "h2", None)
+    assert SharedHTTPClient("h2-missing", http2=True).http2 is False
+
+
+def test_http2_kept_when_h2_is_installed(monkeypatch):
+    monkeypatch.setitem(sys.modules, "h2", types.ModuleType("h2"))
+    assert SharedHTTPClient("h2-present", http2=True).http2 is True
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("HTTP_TIMEOUT", "3")
+    monkeypatch.setenv("HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("HTTP_MAX_KEEPALIVE", "2")
+    monkeypatch.setenv("HTTP2", "false")
+    client = SharedHTTPClient.from_env("env-test")
+    assert client.timeout == 3.0
+    assert (client.limits.max_connections, client.limits.max_keepalive_connections) == (7, 2)
+    assert sample("upstream_http_pool_max_connections", upstream="env-test") == 7
+
+
+def test_requests_go_through_one_client_and_are_measured():
+    seen = []
+
+    async def handler(request):
+        # Counted as in flight while the upstream is answering
+        seen.append((request.method, request.url.path, sample("upstream_http_inflight_requests", upstream="mock")))
+        return httpx.Response(200, json={"ok": True})
+
+    async def scenario():
+        pool = SharedHTTPClient("mock", transport=httpx.MockTransport(handler))
+        await pool.start()
+        client = pool.client
+        first = await pool.get("http://azuracast.test/api/nowplaying/1", timeout=2)
+        await pool.post("http://azuracast.test/api/station/1/files", json={})
+        same_client = pool.client is client
+        await pool.close()
+        return first, same_client, pool
+
+    first, same_client, pool = run(scenario())
+    assert first.json() == {"ok": True}
+    assert same_client
+    assert seen == [("GET", "/api/nowplaying/1", 1.0), ("POST", "/api/station/1/files", 1.0)]
+    assert sample("upstream_http_inflight_requests", upstream="mock") == 0
+    assert sample("upstream_http_request_seconds_count", upstream="mock", method="GET") == 1
+    assert sample("upstream_http_request_seconds_count", upstream="mock", method="POST") == 1
+
+
+def test_failed_request_is_still_measured():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    async def scenario():
+        pool = SharedHTTPClient("mock-down", transport=httpx.MockTransport(handler))
+        try:
+            await pool.get("http://azuracast.test/")
+        except httpx.ConnectError:
+            pass
+        await pool.close()
+
+    run(scenario())
+    assert sample("upstream_http_inflight_requests", upstream="mock-down") == 0
+    assert sample("upstream_http_request_seconds_count", upstream="mock-down", method="GET") == 1
+
+
+def test_client_is_recreated_after_close():
+    async def scenario():
+        pool = SharedHTTPClient("mock-reopen", transport=httpx.MockTransport(lambda request: httpx.Response(204)))
+        first = pool.client
+        await pool.close()
+        response = await pool.get("http://azuracast.test/")
+        second = pool.client
+        await pool.close()
+        return first, second, response
+
+    first, second, response = run(scenario())
+    assert first is not second
+    assert response.status_code == 204
+
+
+class FakeConnection:
+    def __init__(self, idle):
+        self.idle = idle
+
+    def is_idle(self):
+        return self.idle
+
+
+def test_pool_metrics_count_active_and_idle_connections():
+    pool = SharedHTTPClient("pool-stats")
+    pool.client._transport._pool = types.SimpleNamespace(
+        connections=[FakeConnection(True), FakeConnection(False), FakeConnection(True)]
+    )
+    pool._sample_pool()
+    assert sample("upstream_http_pool_connections", upstream="pool-stats", state="active") == 1
+    assert sample("upstream_http_pool_connections", upstream="pool-stats", state="idle") == 2
+
+
+def test_pool_metrics_tolerate_transports_without_a_pool():
+    pool = SharedHTTPClient("no-pool", transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    pool.client
+    pool._sample_pool()
+    assert sample("upstream_http_pool_connections", upstream="no-pool", state="active") == 0
+    assert sample("upstream_http_pool_connections", upstream="no-pool", state="idle") == 0
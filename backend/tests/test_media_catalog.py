@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from media_catalog import MediaCatalog
+from nowplaying_cache import UpstreamError
+
+
+def media(media_id, song_id, artist, title, playlists=(), **extra):
+    return {
+        "id": media_id,
+        "song_id": song_id,
+        "artist": artist,
+        "title": title,
+        "playlists": [{"name": name} for name in playlists],
+        **extra,
+    }
+
+
+class FakeUpstream:
+    """Serves `listing` and records which songs get enriched, and how."""
+
+    def __init__(self, listing):
+        self.listing = listing
+        self.fetches = 0
+        self.enriched = []
+        self.moods = {}
+
+    async def fetch(self):
+        self.fetches += 1
+        await asyncio.sleep(0)
+        return self.listing
+
+    def enrich(self, song_ids):
+        self.enriched.append(sorted(song_ids))
+        return {song_id: {"top_mood": self.moods.get(song_id)} for song_id in song_ids}
+
+
+LISTING = [
+    media(1, "s1", "Boards of Canada", "Roygbiv", ["Chill"]),
+    media(2, "s2", "Aphex Twin", "Xtal", ["Chill", "Night"]),
+    media(3, "s3", "Autechre", "Gantz Graf", ["Night"]),
+]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def loaded_catalog(listing=LISTING, moods=None):
+    upstream = FakeUpstream([dict(entry) for entry in listing])
+    upstream.moods = moods or {}
+    catalog = MediaCatalog(upstream.fetch, upstream.enrich)
+    run(catalog.refresh())
+    return catalog, upstream
+
+
+def titles(page):
+    return [entry["title"] for entry in page["items"]]
+
+
+def test_first_refresh_enriches_everything():
+    catalog, upstream = loaded_catalog(moods={"s2": "chill"})
+    assert catalog.loaded
+    assert upstream.enriched == [["s1", "s2", "s3"]]
+    page = catalog.query()
+    assert page["version"] == 1
+    assert page["total"] == 3
+    assert [entry["top_mood"] for entry in page["items"]] == ["chill", None, None]
+
+
+def test_refresh_only_re_enriches_the_delta():
+    catalog, upstream = loaded_catalog()
+    upstream.listing = [
+        LISTING[0],
+        # A playlist change alone is a modification
+        media(2, "s2", "Aphex Twin", "Xtal", ["Night"]),
+        media(4, "s4", "Burial", "Archangel"),
+    ]
+    run(catalog.refresh())
+
+    assert upstream.enriched[-1] == ["s2", "s4"]
+    page = catalog.query()
+    assert page["version"] == 2
+    assert titles(page) == ["Xtal", "Roygbiv", "Archangel"]
+
+
+def test_unchanged_listing_keeps_the_snapshot():
+    catalog, upstream = loaded_catalog()
+    run(catalog.refresh())
+    assert len(upstream.enriched) == 1
+    assert catalog.query()["version"] == 1
+
+
+def test_concurrent_refreshes_share_one_fetch():
+    async def scenario():
+        upstream = FakeUpstream(LISTING)
+        catalog = MediaCatalog(upstream.fetch, upstream.enrich)
+        await asyncio.gather(catalog.refresh(), catalog.refresh(), catalog.ensure_loaded())
+        return upstream
+
+    assert run(scenario()).fetches == 1
+
+
+def test_unexpected_listing_is_an_upstream_error():
+    catalog, upstream = loaded_catalog()
+    upstream.listing = {"error": "maintenance"}
+    with pytest.raises(UpstreamError) as error:
+        run(catalog.refresh())
+    assert error.value.status_code == 502
+    # The last good snapshot keeps being served
+    assert catalog.query()["total"] == 3
+
+
+def test_pagination_is_ordered_by_artist():
+    catalog, _ = loaded_catalog()
+    first = catalog.query(offset=0, limit=2)
+    second = catalog.query(offset=2, limit=2)
+    assert titles(first) == ["Xtal", "Gantz Graf"]
+    assert titles(second) == ["Roygbiv"]
+    assert (first["total"], first["offset"], first["limit"]) == (3, 0, 2)
+    assert titles(catalog.query(offset=1, limit=None)) == ["Gantz Graf", "Roygbiv"]
+
+
+def test_playlist_and_mood_indexes():
+    catalog, _ = loaded_catalog(moods={"s1": "Chill", "s2": "chill", "s3": "dark"})
+    assert titles(catalog.query(playlist="night")) == ["Xtal", "Gantz Graf"]
+    assert titles(catalog.query(mood="CHILL")) == ["Xtal", "Roygbiv"]
+    assert titles(catalog.query(playlist="Night", mood="chill")) == ["Xtal"]
+    assert catalog.query(playlist="unknown")["total"] == 0
+
+
+def test_artist_filter_and_field_projection():
+    catalog, _ = loaded_catalog()
+    page = catalog.query(artist="a", fields=["id", "title"])
+    assert page["items"] == [{"id": 2, "title": "Xtal"}, {"id": 3, "title": "Gantz Graf"}, {"id": 1, "title": "Roygbiv"}]
+    assert titles(catalog.query(artist="twin")) == ["Xtal"]
+
+
+def test_dirty_songs_are_re_enriched_in_place():
+    catalog, upstream = loaded_catalog()
+    upstream.moods = {"s3": "dark"}
+    catalog.mark_dirty("s3")
+    # Songs that are not in the catalog are ignored
+    catalog.mark_dirty("unknown")
+    assert catalog._dirty == {"s3"}
+
+    catalog._apply_enrichment(["s3"])
+    assert upstream.enriched[-1] == ["s3"]
+    assert titles(catalog.query(mood="dark")) == ["Gantz Graf"]
+    assert catalog.query()["version"] == 2
@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from nowplaying_cache import PolledPayload, UpstreamError
+
+
+def nowplaying(song_id, listeners=1):
+    return {"now_playing": {"song": {"id": song_id}}, "listeners": {"total": listeners}}
+
+
+class FakeUpstream:
+    """Serves `payload` (a fresh copy per fetch) and counts fetches and enrichments."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.fetches = 0
+        self.enriched = []
+        self.ratings = {}
+        self.release = None
+
+    async def fetch(self):
+        self.fetches += 1
+        if self.release is not None:
+            await self.release.wait()
+        if isinstance(self.payload, Exception):
+            raise self.payload
+        return {**self.payload, "now_playing": {"song": dict(self.payload["now_playing"]["song"])}}
+
+    def enrich(self, song_ids):
+        self.enriched.append(song_ids)
+        return {song_id: {"rating": self.ratings.get(song_id, 0)} for song_id in song_ids}
+
+
+def current_song(payload):
+    return [payload["now_playing"]["song"]]
+
+
+def make_cache(upstream, **kwargs):
+    return PolledPayload("test", upstream.fetch, current_song, upstream.enrich, **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_readers_share_one_fetch():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+        upstream.release = asyncio.Event()
+        cache = make_cache(upstream)
+        readers = [asyncio.create_task(cache.get()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        upstream.release.set()
+        payloads = await asyncio.gather(*readers)
+        return upstream, payloads
+
+    upstream, payloads = run(scenario())
+    assert upstream.fetches == 1
+    assert all(payload is payloads[0] for payload in payloads)
+    assert payloads[0]["now_playing"]["song"] == {"id": "a", "rating": 0}
+
+
+def test_cancelled_reader_does_not_cancel_the_refresh():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+        upstream.release = asyncio.Event()
+        cache = make_cache(upstream)
+        impatient = asyncio.create_task(cache.get())
+        patient = asyncio.create_task(cache.get())
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        upstream.release.set()
+        return await patient, upstream.fetches
+
+    payload, fetches = run(scenario())
+    assert payload["now_playing"]["song"]["id"] == "a"
+    assert fetches == 1
+
+
+def test_fresh_payload_is_served_from_memory():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+        cache = make_cache(upstream, max_age=60)
+        await cache.get()
+        await cache.get()
+        cache.expire()
+        await cache.get()
+        return upstream.fetches
+
+    assert run(scenario()) == 2
+
+
+def test_upstream_error_propagates():
+    async def scenario():
+        upstream = FakeUpstream(UpstreamError(503, {"error": "AzuraCast HTTP 503"}))
+        cache = make_cache(upstream)
+        await cache.get()
+
+    with pytest.raises(UpstreamError):
+        run(scenario())
+
+
+def test_unchanged_poll_keeps_version_and_skips_enrichment():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+        changes = []
+
+        async def on_change(payload):
+            changes.append(payload["now_playing"]["song"]["id"])
+
+        cache = make_cache(upstream, on_change=on_change)
+        await cache.refresh()
+        first = (cache.version, cache.digest, cache.updated_at)
+        await cache.refresh()
+        unchanged = (cache.version, cache.digest, cache.updated_at)
+
+        # Same song, new listener count: readers see new data, but the song did not change
+        upstream.payload = nowplaying("a", listeners=2)
+        await cache.refresh()
+        return upstream, changes, first, unchanged, cache
+
+    upstream, changes, first, unchanged, cache = run(scenario())
+    assert unchanged == first
+    assert cache.version == first[0] + 1
+    assert cache.digest != first[1]
+    assert upstream.enriched == [["a"]]
+    assert changes == ["a"]
+
+
+def test_mark_dirty_re_enriches_without_fetching():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+        cache = make_cache(upstream, max_age=60)
+        await cache.get()
+        version = cache.version
+
+        upstream.ratings["a"] = 5
+        cache.mark_dirty("other")
+        untouched = await cache.get()
+        rating_before = untouched["now_playing"]["song"]["rating"]
+        cache.mark_dirty("a")
+        payload = await cache.get()
+        return upstream, cache, version, rating_before, payload
+
+    upstream, cache, version, rating_before, payload = run(scenario())
+    assert rating_before == 0
+    assert payload["now_playing"]["song"]["rating"] == 5
+    assert upstream.fetches == 1
+    assert upstream.enriched == [["a"], ["a"]]
+    assert cache.version == version + 1
+
+
+def test_push_replaces_payload_and_notifies():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+        changes = []
+
+        async def on_change(payload):
+            changes.append(payload["now_playing"]["song"]["id"])
+
+        cache = make_cache(upstream, max_age=60, on_change=on_change)
+        await cache.get()
+        await cache.push(nowplaying("b"))
+        payload = await cache.get()
+        return upstream, changes, payload, cache
+
+    upstream, changes, payload, cache = run(scenario())
+    assert changes == ["a", "b"]
+    # A push counts as fresh data: no fetch follows it
+    assert upstream.fetches == 1
+    assert payload["now_playing"]["song"] == {"id": "b", "rating": 0}
+    assert cache.song_ids == ("b",)
+
+
+def test_failing_change_callback_is_contained():
+    async def scenario():
+        upstream = FakeUpstream(nowplaying("a"))
+
+        async def on_change(payload):
+            raise RuntimeError("broadcast failed")
+
+        cache = make_cache(upstream, on_change=on_change)
+        return await cache.refresh()
+
+    assert run(scenario())["now_playing"]["song"]["id"] == "a"
@@ -0,0 +1,100 @@
+from rate_limiter import SlidingWindowLimiter, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("10/600") == (10, 600.0)
+    assert parse_rate("5/2.5") == (5, 2.5)
+
+
+def test_from_env_falls_back_on_invalid_spec(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST", "lots")
+    limiter = SlidingWindowLimiter.from_env("RATE_LIMIT_TEST", "3/60")
+    assert (limiter.limit, limiter.window) == (3, 60.0)
+
+    monkeypatch.setenv("RATE_LIMIT_TEST", "7/30")
+    limiter = SlidingWindowLimiter.from_env("RATE_LIMIT_TEST", "3/60")
+    assert (limiter.limit, limiter.window) == (7, 30.0)
+
+
+def test_allows_limit_hits_per_window():
+    limiter = SlidingWindowLimiter(limit=3, window=10)
+    assert [limiter.hit("ip", now=t) for t in (0, 1, 2, 3)] == [True, True, True, False]
+    # Other keys are independent
+    assert limiter.hit("other", now=3)
+
+
+def test_window_slides():
+    limiter = SlidingWindowLimiter(limit=2, window=10)
+    assert limiter.hit("ip", now=0)
+    assert limiter.hit("ip", now=5)
+    assert not limiter.hit("ip", now=9)
+    # The hit at 0 has left the window, the one at 5 has not
+    assert limiter.hit("ip", now=10)
+    assert not limiter.hit("ip", now=14)
+    assert limiter.hit("ip", now=15)
+
+
+def test_rejected_hits_are_not_recorded():
+    limiter = SlidingWindowLimiter(limit=1, window=10)
+    assert limiter.hit("ip", now=0)
+    for t in range(1, 10):
+        assert not limiter.hit("ip", now=t)
+    assert limiter.hit("ip", now=10)
+
+
+def test_retry_after():
+    limiter = SlidingWindowLimiter(limit=2, window=10)
+    assert limiter.retry_after("ip", now=0) == 0
+    limiter.hit("ip", now=0)
+    limiter.hit("ip", now=4)
+    assert limiter.retry_after("ip", now=5) == 6
+    assert limiter.retry_after("ip", now=9.5) == 1
+
+
+def test_idle_keys_are_evicted():
+    limiter = SlidingWindowLimiter(limit=2, window=10)
+    limiter.hit("a", now=0)
+    limiter.hit("b", now=5)
+    assert len(limiter) == 2
+    limiter.hit("c", now=12)
+    assert len(limiter) == 2
+    limiter.hit("c", now=30)
+    assert len(limiter) == 1
+
+
+def test_key_count_is_bounded():
+    limiter = SlidingWindowLimiter(limit=1, window=60, max_keys=3)
+    for n in range(5):
+        limiter.hit(f"ip{n}", now=n)
+    assert len(limiter) == 3
+    # The least recently seen key was dropped, so it may hit again
+    assert limiter.hit("ip0", now=5)
+
+
+def test_reset_forgets_key():
+    limiter = SlidingWindowLimiter(limit=1, window=60)
+    limiter.hit("ws-1", now=0)
+    assert not limiter.hit("ws-1", now=1)
+    limiter.reset("ws-1")
+    limiter.reset("ws-unknown")
+    assert limiter.hit("ws-1", now=2)
+
+
+def test_on_hit_reports_allowed_hits_only():
+    relayed = []
+    limiter = SlidingWindowLimiter(limit=1, window=10, on_hit=relayed.append)
+    limiter.hit("ip", now=0)
+    limiter.hit("ip", now=1)
+    assert relayed == ["ip"]
+
+
+def test_recorded_hits_count_against_the_limit():
+    relayed = []
+    limiter = SlidingWindowLimiter(limit=2, window=10, on_hit=relayed.append)
+    # Allowed by another worker: counted here, but neither throttled nor relayed again
+    for t in (0, 1, 2):
+        limiter.record("ip", now=t)
+    assert relayed == []
+    assert not limiter.hit("ip", now=3)
+    assert limiter.retry_after("ip", now=3) == 9
+    assert limiter.hit("ip", now=11)
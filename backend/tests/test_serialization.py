@@ -0,0 +1,104 @@
+import json
+import types
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from starlette.requests import Request
+
+import serialization
+from serialization import dumps_json, negotiated_response
+
+
+def make_request(accept=None, query=""):
+    headers = [(b"accept", accept.encode())] if accept else []
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/ratings",
+        "query_string": query.encode(),
+        "headers": headers,
+    })
+
+
+@pytest.fixture
+def fake_msgpack(monkeypatch):
+    """Stands in for the optional msgpack package (not installed here)."""
+    packed = []
+
+    def packb(content, default=None, use_bin_type=False):
+        packed.append(content)
+        return b"\x81packed"
+
+    monkeypatch.setattr(serialization, "msgpack", types.SimpleNamespace(packb=packb))
+    return packed
+
+
+DOC = {"_id": ObjectId("65a1b2c3d4e5f60718293a4b"), "at": datetime(2024, 1, 2, 3, 4, 5), "tags": {"x"}}
+
+
+def test_mongo_types_are_encoded():
+    assert json.loads(dumps_json(DOC)) == {
+        "_id": "65a1b2c3d4e5f60718293a4b",
+        "at": "2024-01-02T03:04:05",
+        "tags": ["x"],
+    }
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    fast = dumps_json({"b": 1, "a": [DOC]}, sort_keys=True)
+    monkeypatch.setattr(serialization, "orjson", None)
+    slow = dumps_json({"b": 1, "a": [DOC]}, sort_keys=True)
+    assert json.loads(slow) == json.loads(fast)
+    assert slow.startswith(b'{"a":')
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        dumps_json({"value": object()})
+
+
+@pytest.mark.parametrize("accept, query", [
+    (None, ""),
+    ("application/json", ""),
+    ("application/msgpack", ""),
+    (None, "format=msgpack"),
+])
+def test_json_when_msgpack_is_not_installed(monkeypatch, accept, query):
+    monkeypatch.setattr(serialization, "msgpack", None)
+    response = negotiated_response(make_request(accept, query), {"a": DOC})
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body)["a"]["_id"] == "65a1b2c3d4e5f60718293a4b"
+    assert response.headers["vary"] == "Accept"
+
+
+@pytest.mark.parametrize("accept", ["application/msgpack", "application/x-msgpack", "application/x-msgpack, */*;q=0.1"])
+def test_accept_header_selects_msgpack(fake_msgpack, accept):
+    response = negotiated_response(make_request(accept), {"a": 1})
+    assert response.media_type == "application/msgpack"
+    assert response.body == b"\x81packed"
+    assert fake_msgpack == [{"a": 1}]
+
+
+def test_format_parameter_overrides_accept(fake_msgpack):
+    assert negotiated_response(make_request(query="format=msgpack"), {}).media_type == "application/msgpack"
+    forced_json = negotiated_response(make_request("application/msgpack", "format=json"), {"a": 1})
+    assert forced_json.media_type == "application/json"
+    assert json.loads(forced_json.body) == {"a": 1}
+    # Unknown formats leave the decision to the Accept header
+    assert negotiated_response(make_request("application/msgpack", "format=xml"), {}).media_type == "application/msgpack"
+
+
+def test_plain_accept_gets_json(fake_msgpack):
+    response = negotiated_response(make_request("text/html,*/*"), [1, 2])
+    assert response.media_type == "application/json"
+    assert response.body == b"[1,2]"
+    assert fake_msgpack == []
+
+
+def test_status_and_headers_are_kept():
+    response = negotiated_response(make_request(), {"error": "x"}, status_code=400, headers={"ETag": 'W/"1"'})
+    assert response.status_code == 400
+    assert response.headers["etag"] == 'W/"1"'
+    assert response.headers["vary"] == "Accept"
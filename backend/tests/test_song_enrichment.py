@@ -0,0 +1,128 @@
+from song_enrichment import EnrichmentCache, load_song_enrichment
+
+
+class FakeCollection:
+    """Answers {"_id": {"$in": [...]}} queries from `docs` and records them."""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append((query, projection))
+        return [dict(self.docs[song_id]) for song_id in query["_id"]["$in"] if song_id in self.docs]
+
+
+def collections():
+    ratings = FakeCollection([
+        {"_id": "a", "average": 4.5, "total": 2},
+        {"_id": "b", "average": 3.0, "total": 1},
+    ])
+    moods = FakeCollection([
+        {"_id": "a", "moods": {"chill": 2}, "top_mood": "chill", "genres": {"house": 1}, "top_genre": "house"},
+    ])
+    return ratings, moods
+
+
+def test_one_in_query_per_collection():
+    ratings, moods = collections()
+    extras = load_song_enrichment(ratings, moods, ["a", "b", "a", "c"])
+
+    assert ratings.queries == [({"_id": {"$in": ["a", "b", "c"]}}, None)]
+    assert moods.queries == [
+        ({"_id": {"$in": ["a", "b", "c"]}}, {"moods": 1, "top_mood": 1, "genres": 1, "top_genre": 1})
+    ]
+    assert list(extras) == ["a", "b", "c"]
+    assert extras["a"] == {
+        "rating": {"_id": "a", "average": 4.5, "total": 2},
+        "moods": {"chill": 2},
+        "top_mood": "chill",
+        "genres": {"house": 1},
+        "top_genre": "house",
+    }
+
+
+def test_missing_songs_get_empty_fields():
+    ratings, moods = collections()
+    extras = load_song_enrichment(ratings, moods, ["c"])
+    assert extras["c"] == {"rating": {}, "moods": {}, "top_mood": None, "genres": {}, "top_genre": None}
+
+
+def test_no_songs_no_queries():
+    ratings, moods = collections()
+    assert load_song_enrichment(ratings, moods, []) == {}
+    assert ratings.queries == moods.queries == []
+
+
+def test_views_see_every_song_including_missing_ones():
+    ratings, moods = collections()
+    seen = []
+
+    def rating_view(song_id, doc):
+        seen.append((song_id, doc.get("total")))
+        return {"average": doc.get("average", 0.0), "total": doc.get("total", 0) + 1}
+
+    def mood_view(song_id, doc):
+        return {**doc, "top_mood": doc.get("top_mood") or "pending"}
+
+    extras = load_song_enrichment(ratings, moods, ["a", "c"], rating_view, mood_view)
+    assert seen == [("a", 2), ("c", None)]
+    assert extras["c"]["rating"] == {"average": 0.0, "total": 1}
+    assert (extras["a"]["top_mood"], extras["c"]["top_mood"]) == ("chill", "pending")
+
+
+class Songs:
+    """Per-song versions and a loader that counts MongoDB reads."""
+
+    def __init__(self):
+        self.versions = {}
+        self.loads = []
+
+    def version(self, song_id):
+        return self.versions.get(song_id, 0)
+
+    def load(self, song_id):
+        self.loads.append(song_id)
+        return {"rating": {"total": self.version(song_id)}}
+
+
+def test_cache_serves_until_the_song_changes():
+    songs = Songs()
+    cache = EnrichmentCache(songs.version, songs.load)
+    assert cache.get("a") is None
+
+    assert cache.load("a") == {"rating": {"total": 0}}
+    assert cache.get("a") == {"rating": {"total": 0}}
+
+    # A vote moves the version: the cached entry is outdated
+    songs.versions["a"] = 1
+    assert cache.get("a") is None
+    assert cache.load("a") == {"rating": {"total": 1}}
+    assert songs.loads == ["a", "a"]
+
+
+def test_vote_during_load_leaves_entry_stale():
+    songs = Songs()
+
+    def racing_load(song_id):
+        extras = songs.load(song_id)
+        songs.versions[song_id] = songs.version(song_id) + 1
+        return extras
+
+    cache = EnrichmentCache(songs.version, racing_load)
+    cache.load("a")
+    assert cache.get("a") is None
+
+
+def test_cache_evicts_least_recently_used():
+    songs = Songs()
+    cache = EnrichmentCache(songs.version, songs.load, size=2)
+    cache.load("a")
+    cache.load("b")
+    cache.get("a")
+    cache.load("c")
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
@@ -0,0 +1,223 @@
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, ServerSelectionTimeoutError
+
+from vote_buffer import VoteBuffer
+
+
+class FakeCollection:
+    """Records bulk_write batches; `fail_with` is raised (once) by the next call."""
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = []
+        self.fail_with = None
+
+    def bulk_write(self, ops, ordered=True):
+        self.batches.append(list(ops))
+        if self.fail_with is not None:
+            error, self.fail_with = self.fail_with, None
+            raise error
+
+
+def inc_builder(inc, set_fields):
+    return {"$inc": inc, "$set": set_fields}
+
+
+def written(collection):
+    """(filter, update) of every update written, and every inserted document."""
+    return [
+        (op._filter, op._doc) if isinstance(op, UpdateOne) else op._doc
+        for batch in collection.batches
+        for op in batch
+    ]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def started_buffer(*collections, **kwargs):
+    buffer = VoteBuffer(flush_interval=60, **kwargs)
+    for collection in collections:
+        buffer.register(collection, inc_builder if collection.name != "logs" else None)
+    await buffer.start()
+    return buffer
+
+
+def test_stage_refused_before_start():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = VoteBuffer()
+        buffer.register(ratings, inc_builder)
+        return buffer.stage_update(ratings, "a", {"like": 1})
+
+    assert run(scenario()) is False
+
+
+def test_increments_coalesce_per_song():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = await started_buffer(ratings)
+        for _ in range(3):
+            assert buffer.stage_update(ratings, "a", {"like": 1, "total": 1}, {"updated_at": 1})
+        buffer.stage_update(ratings, "a", {"dislike": 1}, {"updated_at": 2})
+        buffer.stage_update(ratings, "b", {"like": 1})
+        assert buffer.pending_writes == 2
+        assert buffer.pending_inc(ratings, "a") == {"like": 3, "total": 3, "dislike": 1}
+
+        await buffer.flush()
+        await buffer.close()
+        return ratings, buffer
+
+    ratings, buffer = run(scenario())
+    assert len(ratings.batches) == 1
+    assert written(ratings) == [
+        ({"_id": "a"}, {"$inc": {"like": 3, "total": 3, "dislike": 1}, "$set": {"updated_at": 2}}),
+        ({"_id": "b"}, {"$inc": {"like": 1}, "$set": {}}),
+    ]
+    assert buffer.pending_writes == 0
+
+
+def test_inserts_are_batched_in_order():
+    async def scenario():
+        logs = FakeCollection("logs")
+        buffer = await started_buffer(logs)
+        for n in range(3):
+            assert buffer.stage_insert(logs, {"n": n})
+        await buffer.close()
+        return logs
+
+    logs = run(scenario())
+    assert written(logs) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_full_buffer_refuses_new_keys():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = await started_buffer(ratings, max_pending=2)
+        results = [buffer.stage_update(ratings, song, {"like": 1}) for song in ("a", "b", "c")]
+        # Coalescing into an existing key needs no room
+        results.append(buffer.stage_update(ratings, "a", {"like": 1}))
+        await buffer.close()
+        return results
+
+    assert run(scenario()) == [True, True, False, True]
+
+
+def test_bulk_write_error_requeues_only_failed_ops():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = await started_buffer(ratings)
+        buffer.stage_update(ratings, "a", {"like": 2})
+        buffer.stage_update(ratings, "b", {"like": 1})
+        buffer.stage_update(ratings, "c", {"like": 1})
+        ratings.fail_with = BulkWriteError({"writeErrors": [{"index": 1, "code": 6, "errmsg": "x"}]})
+        await buffer.flush()
+        pending = {song: buffer.pending_inc(ratings, song) for song in ("a", "b", "c")}
+
+        # A vote arriving before the retry adds to the requeued increment
+        buffer.stage_update(ratings, "b", {"like": 1})
+        await buffer.flush()
+        await buffer.close()
+        return ratings, pending
+
+    ratings, pending = run(scenario())
+    assert pending == {"a": {}, "b": {"like": 1}, "c": {}}
+    assert [(op._filter, op._doc["$inc"]) for op in ratings.batches[1]] == [({"_id": "b"}, {"like": 2})]
+
+
+def test_duplicate_key_inserts_are_not_retried():
+    async def scenario():
+        logs = FakeCollection("logs")
+        buffer = await started_buffer(logs)
+        buffer.stage_insert(logs, {"_id": 1})
+        buffer.stage_insert(logs, {"_id": 2})
+        logs.fail_with = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "dup"}]})
+        await buffer.flush()
+        pending = buffer.pending_writes
+        await buffer.close()
+        return pending
+
+    assert run(scenario()) == 0
+
+
+def test_unreachable_server_requeues_whole_batch():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = await started_buffer(ratings)
+        buffer.stage_update(ratings, "a", {"like": 1})
+        buffer.stage_update(ratings, "b", {"like": 1})
+        ratings.fail_with = ServerSelectionTimeoutError("no servers")
+        await buffer.flush()
+        pending = buffer.pending_writes
+        await buffer.close()
+        return ratings, pending
+
+    ratings, pending = run(scenario())
+    assert pending == 2
+    assert len(ratings.batches) == 2
+    assert [op._filter for op in ratings.batches[1]] == [{"_id": "a"}, {"_id": "b"}]
+
+
+def test_unknown_outcome_is_dropped_not_retried():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = await started_buffer(ratings)
+        buffer.stage_update(ratings, "a", {"like": 1})
+        # The connection dropped mid-write: the $inc may or may not have been applied
+        ratings.fail_with = AutoReconnect("connection reset")
+        await buffer.flush()
+        pending = buffer.pending_writes
+        await buffer.close()
+        return ratings, pending
+
+    ratings, pending = run(scenario())
+    assert pending == 0
+    assert len(ratings.batches) == 1
+
+
+def test_close_waits_for_running_flush_and_drains():
+    async def scenario():
+        ratings = FakeCollection("ratings")
+        buffer = await started_buffer(ratings)
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        original = ratings.bulk_write
+
+        def slow_bulk_write(ops, ordered=True):
+            asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+            original(ops, ordered)
+
+        ratings.bulk_write = slow_bulk_write
+        buffer.stage_update(ratings, "a", {"like": 1})
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.05)
+        buffer.stage_update(ratings, "b", {"like": 1})
+
+        closing = asyncio.create_task(buffer.close())
+        await asyncio.sleep(0.05)
+        assert not closing.done()
+        # Staging is refused once closing started; callers write directly
+        assert buffer.stage_update(ratings, "c", {"like": 1}) is False
+        release.set()
+        await asyncio.gather(flushing, closing)
+        return ratings, buffer
+
+    ratings, buffer = run(scenario())
+    assert [[op._filter for op in batch] for batch in ratings.batches] == [[{"_id": "a"}], [{"_id": "b"}]]
+    assert buffer.pending_writes == 0
+
+
+def test_on_flush_reports_written_collections():
+    async def scenario():
+        ratings, moods = FakeCollection("ratings"), FakeCollection("moods")
+        seen = []
+        buffer = await started_buffer(ratings, moods, on_flush=seen.append)
+        buffer.stage_update(moods, "a", {"moods.chill": 1})
+        await buffer.flush()
+        await buffer.close()
+        return seen
+
+    assert run(scenario()) == [{"moods"}]
@@ -0,0 +1,91 @@
+import pytest
+
+import vote_tally
+from vote_tally import MinuteBucketTally, SlidingTally
+
+NOW = 1_700_000_000.0  # 20 s into a minute
+
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    monkeypatch.setattr(vote_tally.time, "time", lambda: NOW)
+
+
+def test_minute_tally_ranks_window(frozen_time):
+    tally = MinuteBucketTally(horizon_minutes=60)
+    tally.add("chill", NOW)
+    tally.add("chill", NOW - 60)
+    tally.add("energetic", NOW, count=3)
+    tally.add("dark", NOW - 20 * 60)
+
+    assert tally.ranking(10, now=NOW) == [("energetic", 3), ("chill", 2)]
+    assert tally.ranking(1, now=NOW) == [("energetic", 3), ("chill", 1)]
+    assert tally.ranking(30, now=NOW) == [("energetic", 3), ("chill", 2), ("dark", 1)]
+    assert tally.dominant(10, now=NOW) == ("energetic", 3)
+
+
+def test_minute_tally_ignores_votes_beyond_horizon(frozen_time):
+    tally = MinuteBucketTally(horizon_minutes=5)
+    tally.add("chill", NOW - 10 * 60)
+    assert tally.version == 0
+    assert tally.ranking(5, now=NOW) == []
+    assert tally.dominant(5, now=NOW) is None
+
+
+def test_minute_tally_window_is_capped_at_horizon(frozen_time):
+    tally = MinuteBucketTally(horizon_minutes=5)
+    tally.add("chill", NOW - 4 * 60)
+    assert tally.ranking(60, now=NOW) == [("chill", 1)]
+
+
+def test_minute_tally_reuses_stale_slots(monkeypatch):
+    tally = MinuteBucketTally(horizon_minutes=5)
+    monkeypatch.setattr(vote_tally.time, "time", lambda: NOW)
+    tally.add("chill", NOW)
+
+    # Five minutes later the same ring slot belongs to a new minute
+    later = NOW + 5 * 60
+    monkeypatch.setattr(vote_tally.time, "time", lambda: later)
+    tally.add("dark", later)
+    assert tally.ranking(5, now=later) == [("dark", 1)]
+
+
+def test_minute_tally_rolls_old_minutes_out(frozen_time):
+    tally = MinuteBucketTally(horizon_minutes=60)
+    tally.add("chill", NOW)
+    assert tally.ranking(10, now=NOW + 9 * 60) == [("chill", 1)]
+    assert tally.ranking(10, now=NOW + 10 * 60) == []
+
+
+def test_sliding_tally_counts_window():
+    tally = SlidingTally(window_seconds=600)
+    tally.add("chill", 0)
+    tally.add("chill", 100)
+    tally.add("dark", 200)
+
+    assert tally.counts(now=300) == {"chill": 2, "dark": 1}
+    assert tally.top(now=300) == ("chill", 2)
+    # The vote at 0 expires exactly at 600
+    assert tally.counts(now=600) == {"chill": 1, "dark": 1}
+    assert tally.counts(now=800) == {}
+    assert tally.top(now=800) is None
+
+
+def test_sliding_tally_next_expiry():
+    tally = SlidingTally(window_seconds=60)
+    assert tally.next_expiry is None
+    tally.add("chill", 10)
+    tally.add("dark", 20)
+    assert tally.next_expiry == 70
+    tally.expire(now=70)
+    assert tally.next_expiry == 80
+
+
+def test_sliding_tally_version_tracks_changes():
+    tally = SlidingTally(window_seconds=60)
+    tally.add("chill", 0)
+    version = tally.version
+    assert tally.expire(now=30) is False
+    assert tally.version == version
+    assert tally.expire(now=60) is True
+    assert tally.version == version + 1
@@ -0,0 +1,96 @@
+import base64
+
+import pytest
+
+from webhook_ingest import AzuraCastWebhookReceiver, WebhookError
+
+
+def payload(song_id="abc", played_at=1_700_000_000, sh_id=7, listeners=3, station_id=1):
+    return {
+        "station": {"id": station_id},
+        "now_playing": {"sh_id": sh_id, "played_at": played_at, "song": {"id": song_id}},
+        "listeners": {"total": listeners, "unique": listeners, "current": listeners},
+    }
+
+
+def basic(user, password):
+    return "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode()
+
+
+def rejected(call, *args):
+    with pytest.raises(WebhookError) as error:
+        call(*args)
+    return error.value.status_code
+
+
+def test_disabled_without_secret():
+    receiver = AzuraCastWebhookReceiver(secret="")
+    assert not receiver.enabled
+    assert rejected(receiver.authenticate, {"x-webhook-secret": ""}) == 503
+
+
+def test_secret_header_or_basic_password():
+    receiver = AzuraCastWebhookReceiver(secret="s3cret")
+    receiver.authenticate({"x-webhook-secret": "s3cret"})
+    # AzuraCast only offers Basic auth; the user name is ignored
+    receiver.authenticate({"authorization": basic("azuracast", "s3cret")})
+    receiver.authenticate({"authorization": basic("", "s3cret")})
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"x-webhook-secret": "wrong"},
+    {"authorization": basic("azuracast", "wrong")},
+    {"authorization": "Basic not-base64!"},
+    {"authorization": "Bearer s3cret"},
+])
+def test_wrong_or_missing_secret_is_unauthorized(headers):
+    receiver = AzuraCastWebhookReceiver(secret="s3cret")
+    assert rejected(receiver.authenticate, headers) == 401
+
+
+@pytest.mark.parametrize("body", [
+    [],
+    {"now_playing": {"song": {"id": "abc"}}},
+    payload(station_id=2),
+    {"station": {"id": 1}, "now_playing": {"song": {}}},
+    {"station": {"id": 1}, "now_playing": "abc"},
+    {"station": {"id": 1}, "now_playing": {"played_at": "noon", "song": {"id": "abc"}}},
+])
+def test_invalid_payload_is_unprocessable(body):
+    receiver = AzuraCastWebhookReceiver(secret="s3cret")
+    assert rejected(receiver.ingest, body) == 422
+
+
+def test_station_id_may_be_a_string():
+    receiver = AzuraCastWebhookReceiver(secret="s3cret", station_id=1)
+    assert receiver.ingest(payload(station_id="1")) == "song_changed"
+
+
+def test_song_change_then_listener_updates():
+    receiver = AzuraCastWebhookReceiver(secret="s3cret")
+    assert receiver.ingest(payload()) == "song_changed"
+    assert receiver.ingest(payload(listeners=4)) == "listeners"
+    assert receiver.ingest(payload(song_id="def", played_at=1_700_000_200, sh_id=8)) == "song_changed"
+
+
+def test_repeated_delivery_is_dropped():
+    receiver = AzuraCastWebhookReceiver(secret="s3cret")
+    assert receiver.ingest(payload()) == "song_changed"
+    # Song-changed and listener triggers fired together with the same state
+    assert receiver.ingest(payload()) is None
+
+
+def test_out_of_order_delivery_is_dropped():
+    receiver = AzuraCastWebhookReceiver(secret="s3cret")
+    assert receiver.ingest(payload(song_id="def", played_at=1_700_000_200)) == "song_changed"
+    assert receiver.ingest(payload(song_id="abc", played_at=1_700_000_000)) is None
+
+
+def test_fingerprints_are_bounded():
+    receiver = AzuraCastWebhookReceiver(secret="s3cret", remember=2)
+    for listeners in (1, 2, 3):
+        receiver.ingest(payload(listeners=listeners))
+    # The oldest fingerprint was forgotten; the same song is then only a listener update
+    assert receiver.ingest(payload(listeners=1)) == "listeners"
+    assert receiver.ingest(payload(listeners=3)) is None
@@ -0,0 +1,181 @@
+import asyncio
+import json
+
+import pytest
+
+from ws_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records sent frames; a blocked socket holds every send until released."""
+
+    def __init__(self, blocked=False, fail=False):
+        self.sent = []
+        self.closed_with = None
+        self.fail = fail
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        await self.unblocked.wait()
+        self.sent.append(json.loads(frame)["n"])
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    # Let the sender tasks drain what they can
+    await asyncio.sleep(0.01)
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        ConnectionManager(slow_policy="block")
+
+
+def test_every_connection_gets_every_broadcast():
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, ping_interval=0)
+        sockets = [FakeWebSocket(), FakeWebSocket()]
+        for websocket in sockets:
+            await manager.connect(websocket)
+        for n in range(3):
+            await manager.broadcast({"type": "song", "n": n})
+        await settle()
+        await manager.close()
+        return sockets
+
+    assert [websocket.sent for websocket in run(scenario())] == [[0, 1, 2], [0, 1, 2]]
+
+
+def test_drop_oldest_keeps_latest_messages_for_slow_consumer():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, slow_policy="drop_oldest", ping_interval=0)
+        fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+        await manager.connect(fast)
+        await manager.connect(slow)
+        for n in range(6):
+            # A broadcast never waits on the slow socket
+            await manager.broadcast({"type": "song", "n": n})
+            await settle()
+        connected = len(manager)
+        slow.unblocked.set()
+        await settle()
+        await manager.close()
+        return fast, slow, connected
+
+    fast, slow, connected = run(scenario())
+    assert connected == 2
+    assert fast.sent == [0, 1, 2, 3, 4, 5]
+    # 0 was already being sent when the socket stalled; 1-3 were dropped
+    assert slow.sent == [0, 4, 5]
+    assert slow.closed_with is None
+
+
+def test_disconnect_policy_evicts_slow_consumer():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, slow_policy="disconnect", ping_interval=0)
+        fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+        await manager.connect(fast)
+        await manager.connect(slow)
+        for n in range(4):
+            await manager.broadcast({"type": "song", "n": n})
+            await settle()
+        connected = list(manager.active_connections)
+        await manager.close()
+        return fast, slow, connected
+
+    fast, slow, connected = run(scenario())
+    assert connected == [fast]
+    assert fast.sent == [0, 1, 2, 3]
+    # 1013 "try again later": the client reconnects and resyncs
+    assert slow.closed_with == 1013
+
+
+def test_send_timeout_evicts_connection():
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, send_timeout=0.05, ping_interval=0)
+        stuck = FakeWebSocket(blocked=True)
+        await manager.connect(stuck)
+        await manager.broadcast({"type": "song", "n": 0})
+        await asyncio.sleep(0.2)
+        return len(manager), stuck
+
+    connected, stuck = run(scenario())
+    assert connected == 0
+    assert stuck.closed_with == 1013
+
+
+def test_failed_send_removes_connection():
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, ping_interval=0)
+        broken, healthy = FakeWebSocket(fail=True), FakeWebSocket()
+        await manager.connect(broken)
+        await manager.connect(healthy)
+        await manager.broadcast({"type": "song", "n": 0})
+        await settle()
+        await manager.broadcast({"type": "song", "n": 1})
+        await settle()
+        connected = list(manager.active_connections)
+        await manager.close()
+        return connected, healthy
+
+    connected, healthy = run(scenario())
+    assert connected == [healthy]
+    assert healthy.sent == [0, 1]
+
+
+def test_disconnect_is_idempotent():
+    async def scenario():
+        manager = ConnectionManager(ping_interval=0)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        manager.disconnect(websocket)
+        manager.disconnect(websocket)
+        await manager.broadcast({"type": "song", "n": 0})
+        await settle()
+        return len(manager), websocket.sent
+
+    assert run(scenario()) == (0, [])
+
+
+def test_legacy_subs_hello_is_a_subscribe():
+    async def scenario():
+        manager = ConnectionManager(topics=("song", "vote_update"), ping_interval=0)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        handled = await manager.handle_message(websocket, json.dumps({"subs": ["song"]}))
+        subscriptions = manager.subscriptions(websocket)
+        await manager.close()
+        return handled, subscriptions
+
+    # Handled by the manager, so the endpoint never answers it with an error ack
+    assert run(scenario()) == (None, ["song"])
+
+
+def test_connection_ids_are_unique_and_cleared():
+    async def scenario():
+        manager = ConnectionManager(ping_interval=0)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first)
+        await manager.connect(second)
+        ids = manager.connection_id(first), manager.connection_id(second)
+        manager.disconnect(first)
+        gone = manager.connection_id(first)
+        await manager.close()
+        return ids, gone
+
+    (first_id, second_id), gone = run(scenario())
+    assert first_id != second_id
+    assert gone is None
@@ -0,0 +1,275 @@
+"""
+Write-Behind Vote Buffer
+
+Absorbs vote storms by coalescing counter increments per song in memory and
+writing them to MongoDB in batches:
+
+1. Routes stage increments (and plain field sets) per (collection, song_id)
+2. Append-only documents (vote logs) are queued as inserts
+3. A background task flushes everything with one unordered bulk_write per
+   collection every FLUSH_INTERVAL, or as soon as FLUSH_OPS writes are pending
+
+Pending writes are what the next flush sends: one update per coalesced
+(collection, song_id), however many votes it absorbed, plus one insert per
+queued document. The buffer is bounded: once MAX_PENDING writes are queued
+for new keys, staging is refused and callers fall back to a direct write.
+
+Failed writes are retried only when it is certain they were not applied:
+the operations a BulkWriteError reports as failed, or a whole batch that never
+reached a server. Any other error leaves the outcome unknown; that batch is
+dropped and counted rather than retried, because a retried $inc that had
+already been applied would count votes twice.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError, ServerSelectionTimeoutError
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger("VoteBuffer")
+
+VOTE_BUFFER_PENDING_WRITES = Gauge(
+    'vote_buffer_pending_writes',
+    'Bulk write operations (coalesced updates and inserts) waiting in the vote buffer'
+)
+VOTE_BUFFER_STAGED = Counter('vote_buffer_staged_total', 'Votes and documents accepted by the vote buffer')
+VOTE_BUFFER_FLUSH_SECONDS = Histogram(
+    'vote_buffer_flush_seconds',
+    'Latency of vote buffer bulk flushes',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+VOTE_BUFFER_FLUSHED = Counter('vote_buffer_flushed_ops_total', 'Operations written by the vote buffer')
+VOTE_BUFFER_REJECTED = Counter('vote_buffer_rejected_total', 'Staging attempts refused because the buffer was full')
+VOTE_BUFFER_LOST = Counter('vote_buffer_lost_ops_total', 'Operations dropped after a write with an unknown outcome')
+
+# builder(inc, set_fields) -> update document or pipeline for UpdateOne
+UpdateBuilder = Callable[[Dict[str, int], Dict[str, Any]], Any]
+
+
+class VoteBuffer:
+    """
+    In-process write-behind buffer for vote counters.
+    """
+
+    def __init__(self, flush_interval: float = 0.25, flush_ops: int = 500, max_pending: int = 10000,
+                 on_flush: Optional[Callable[[Set[str]], None]] = None):
+        """
+        Args:
+            flush_interval: Seconds between periodic flushes
+            flush_ops: Pending write count that triggers an early flush
+            max_pending: Hard bound on pending writes (backpressure)
+            on_flush: Called with the names of collections whose writes just became visible
+        """
+        self.flush_interval = flush_interval
+        self.flush_ops = flush_ops
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+
+        self._collections: Dict[str, Tuple[Any, Optional[UpdateBuilder]]] = {}
+        self._updates: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._inserts: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._inflight: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def register(self, collection, builder: Optional[UpdateBuilder] = None):
+        """
+        Register a collection the buffer may write to.
+
+        Args:
+            collection: pymongo collection
+            builder: Turns coalesced increments into an update (omit for insert-only collections)
+        """
+        self._collections[collection.name] = (collection, builder)
+
+    @property
+    def pending_writes(self) -> int:
+        """Operations the next flush would send (one per coalesced key, one per insert)."""
+        return len(self._updates) + sum(len(docs) for docs in self._inserts.values())
+
+    def _has_room(self) -> bool:
+        if self.pending_writes >= self.max_pending:
+            VOTE_BUFFER_REJECTED.inc()
+            return False
+        return True
+
+    def _staged(self):
+        VOTE_BUFFER_STAGED.inc()
+        pending = self.pending_writes
+        VOTE_BUFFER_PENDING_WRITES.set(pending)
+        if pending >= self.flush_ops:
+            self._wake.set()
+
+    def stage_update(self, collection, song_id: str, inc: Dict[str, int], set_fields: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Coalesce increments for one song.
+
+        Returns:
+            False if the buffer is full or stopped and the caller must write directly
+        """
+        if self._task is None or self._closing:
+            return False
+        key = (collection.name, song_id)
+        entry = self._updates.get(key)
+        if entry is None:
+            if not self._has_room():
+                return False
+            entry = self._updates[key] = {"inc": {}, "set": {}}
+
+        for path, amount in inc.items():
+            entry["inc"][path] = entry["inc"].get(path, 0) + amount
+        if set_fields:
+            entry["set"].update(set_fields)
+
+        self._staged()
+        return True
+
+    def stage_insert(self, collection, doc: Dict[str, Any]) -> bool:
+        """Queue an append-only document. Returns False if the caller must insert directly."""
+        if self._task is None or self._closing or not self._has_room():
+            return False
+        self._inserts[collection.name].append(doc)
+        self._staged()
+        return True
+
+    def pending_inc(self, collection, song_id: str) -> Dict[str, int]:
+        """Increments for a song that are staged or being flushed but not yet visible in MongoDB."""
+        key = (collection.name, song_id)
+        merged: Dict[str, int] = {}
+        for source in (self._inflight, self._updates):
+            entry = source.get(key)
+            if entry:
+                for path, amount in entry["inc"].items():
+                    merged[path] = merged.get(path, 0) + amount
+        return merged
+
+    async def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Vote buffer started (interval={self.flush_interval}s, flush_ops={self.flush_ops}, max_pending={self.max_pending})")
+
+    async def close(self):
+        """Stop the flush loop and write out everything that is still pending."""
+        self._closing = True
+        if self._task:
+            # Not cancelled: a flush that is already writing must finish (or requeue) first
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info("Vote buffer drained")
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._closing:
+                return
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Vote buffer flush error: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._updates and not self._inserts:
+                return
+
+            updates, self._updates = self._updates, {}
+            inserts, self._inserts = self._inserts, defaultdict(list)
+            self._inflight = updates
+            VOTE_BUFFER_PENDING_WRITES.set(self.pending_writes)
+
+            started = time.perf_counter()
+            try:
+                written, written_to, retry_updates, retry_inserts = await asyncio.to_thread(self._write, updates, inserts)
+                VOTE_BUFFER_FLUSHED.inc(written)
+                if retry_updates or retry_inserts:
+                    retries = len(retry_updates) + sum(len(docs) for docs in retry_inserts.values())
+                    logger.error(f"Vote buffer: re-queueing {retries} operations that were not applied")
+                    self._requeue(retry_updates, retry_inserts)
+                if written_to and self.on_flush:
+                    self.on_flush(written_to)
+            finally:
+                self._inflight = {}
+                VOTE_BUFFER_FLUSH_SECONDS.observe(time.perf_counter() - started)
+                VOTE_BUFFER_PENDING_WRITES.set(self.pending_writes)
+
+    def _write(self, updates, inserts) -> Tuple[int, Set[str], Dict, Dict[str, List[Dict[str, Any]]]]:
+        """
+        Write one batch per collection.
+
+        Returns:
+            (operations applied, collections written to, updates to retry, inserts to retry)
+        """
+        # Per collection: the operations and, at the same index, what each one came from
+        ops: Dict[str, list] = defaultdict(list)
+        sources: Dict[str, list] = defaultdict(list)
+        for (name, song_id), entry in updates.items():
+            builder = self._collections[name][1]
+            ops[name].append(UpdateOne({"_id": song_id}, builder(entry["inc"], entry["set"]), upsert=True))
+            sources[name].append(("update", (name, song_id), entry))
+        for name, docs in inserts.items():
+            for doc in docs:
+                ops[name].append(InsertOne(doc))
+                sources[name].append(("insert", name, doc))
+
+        written = 0
+        written_to: Set[str] = set()
+        retry: List[tuple] = []
+        for name, batch in ops.items():
+            collection = self._collections[name][0]
+            try:
+                collection.bulk_write(batch, ordered=False)
+                applied = len(batch)
+            except BulkWriteError as e:
+                # Unordered: everything except the reported errors was applied; retry only those
+                errors = e.details.get("writeErrors", [])
+                applied = len(batch) - len(errors)
+                logger.error(f"Vote buffer: {len(errors)} write errors in {name}: {errors[:3]}")
+                for error in errors:
+                    # A duplicate key will never succeed, the insert is already there
+                    if error.get("code") != 11000:
+                        retry.append(sources[name][error["index"]])
+            except ServerSelectionTimeoutError as e:
+                # No server was reached, so nothing was applied
+                logger.error(f"Vote buffer: MongoDB unavailable for {name}: {e}")
+                applied = 0
+                retry.extend(sources[name])
+            except PyMongoError as e:
+                logger.error(f"Vote buffer: bulk write to {name} failed with unknown outcome, dropping {len(batch)} ops: {e}")
+                VOTE_BUFFER_LOST.inc(len(batch))
+                applied = 0
+            written += applied
+            if applied:
+                written_to.add(name)
+
+        retry_updates: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        retry_inserts: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for kind, key, payload in retry:
+            if kind == "update":
+                retry_updates[key] = payload
+            else:
+                retry_inserts[key].append(payload)
+        return written, written_to, retry_updates, dict(retry_inserts)
+
+    def _requeue(self, updates, inserts):
+        # Newer stagings win for plain field sets; increments simply add up.
+        for key, entry in updates.items():
+            current = self._updates.setdefault(key, {"inc": {}, "set": {}})
+            for path, amount in entry["inc"].items():
+                current["inc"][path] = current["inc"].get(path, 0) + amount
+            current["set"] = {**entry["set"], **current["set"]}
+        for name, docs in inserts.items():
+            self._inserts[name][:0] = docs
@@ -0,0 +1,119 @@
+"""
+In-Process Vote Tallies
+
+Streaming counters for "what are listeners voting for right now" questions,
+so hot read paths don't have to aggregate vote collections in MongoDB.
+
+- MinuteBucketTally: ring buffer of per-minute buckets; answers
+  "ranking over the last N minutes" in O(buckets)
+- SlidingTally: exact counts over a fixed window; votes expire from a
+  time-ordered deque instead of being recounted
+"""
+
+import time
+import threading
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class MinuteBucketTally:
+    """
+    Ring buffer of per-minute vote counters covering `horizon_minutes`.
+    """
+
+    def __init__(self, horizon_minutes: int = 60):
+        self.horizon = horizon_minutes
+        # slot -> (epoch minute, counts); a slot is stale once its minute falls out of the horizon
+        self._slots: List[Tuple[int, Counter]] = [(-1, Counter()) for _ in range(horizon_minutes)]
+        self._lock = threading.Lock()
+        # Bumped on every recorded vote; rankings also change when minutes roll over
+        self.version = 0
+
+    def add(self, key: str, timestamp: Optional[float] = None, count: int = 1):
+        """Record `count` votes for `key` at `timestamp` (epoch seconds, default now)."""
+        now_minute = int(time.time() // 60)
+        minute = now_minute if timestamp is None else int(timestamp // 60)
+        if minute <= now_minute - self.horizon:
+            return
+        index = minute % self.horizon
+        with self._lock:
+            slot_minute, counts = self._slots[index]
+            if slot_minute != minute:
+                counts = Counter()
+                self._slots[index] = (minute, counts)
+            counts[key] += count
+            self.version += 1
+
+    def ranking(self, window_minutes: int, now: Optional[float] = None) -> List[Tuple[str, int]]:
+        """All keys voted for in the last `window_minutes`, most votes first."""
+        now_minute = int((time.time() if now is None else now) // 60)
+        oldest = now_minute - min(window_minutes, self.horizon) + 1
+        totals: Counter = Counter()
+        with self._lock:
+            for minute, counts in self._slots:
+                if oldest <= minute <= now_minute:
+                    totals.update(counts)
+        return [(key, count) for key, count in totals.most_common() if count > 0]
+
+    def dominant(self, window_minutes: int, now: Optional[float] = None) -> Optional[Tuple[str, int]]:
+        """(key, votes) with the most votes in the window, or None."""
+        ranked = self.ranking(window_minutes, now)
+        return ranked[0] if ranked else None
+
+
+class SlidingTally:
+    """
+    Exact per-key counts over the last `window_seconds`.
+
+    Every change (new vote or expiry) bumps `version`, so readers can cache
+    derived state and cheaply tell whether it is stale.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window = window_seconds
+        self.version = 0
+        self._events: Deque[Tuple[float, str]] = deque()
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key: str, timestamp: Optional[float] = None):
+        """Record one vote for `key` (timestamps are expected in roughly increasing order)."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._events.append((timestamp, key))
+            self._counts[key] += 1
+            self.version += 1
+
+    def expire(self, now: Optional[float] = None) -> bool:
+        """Drop votes that left the window. Returns True if anything changed."""
+        cutoff = (time.time() if now is None else now) - self.window
+        changed = False
+        with self._lock:
+            while self._events and self._events[0][0] <= cutoff:
+                _, key = self._events.popleft()
+                self._counts[key] -= 1
+                if self._counts[key] <= 0:
+                    del self._counts[key]
+                changed = True
+            if changed:
+                self.version += 1
+        return changed
+
+    @property
+    def next_expiry(self) -> Optional[float]:
+        """When the oldest vote leaves the window (None if there are no votes)."""
+        with self._lock:
+            return self._events[0][0] + self.window if self._events else None
+
+    def counts(self, now: Optional[float] = None) -> Dict[str, int]:
+        self.expire(now)
+        with self._lock:
+            return dict(self._counts)
+
+    def top(self, now: Optional[float] = None) -> Optional[Tuple[str, int]]:
+        """(key, votes) with the most votes in the window, or None."""
+        counts = self.counts(now)
+        if not counts:
+            return None
+        key = max(counts, key=counts.get)
+        return key, counts[key]
@@ -0,0 +1,151 @@
+"""
+AzuraCast Webhook Ingestion
+
+AzuraCast's "Generic Web Hook" POSTs the full now-playing payload whenever a
+configured trigger fires (song changed, listener gained/lost). Receiving it
+lets the APIs update now-playing immediately and keep polling only as a
+slow safety net.
+
+- Authentication: shared secret (AZURACAST_WEBHOOK_SECRET), sent either as
+  the X-Webhook-Secret header or as the HTTP Basic password, which is what
+  AzuraCast's web hook settings offer
+- Validation: the body must be a now-playing object for our station
+- De-duplication: AzuraCast sends one request per trigger, so a song change
+  often arrives together with listener events carrying the same state;
+  repeats and out-of-order payloads are dropped
+
+Recorded payloads can be replayed against a local API with replay_webhooks.py.
+"""
+
+import os
+import hmac
+import base64
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from prometheus_client import Counter
+
+logger = logging.getLogger("WebhookIngest")
+
+WEBHOOK_EVENTS = Counter(
+    'azuracast_webhook_events_total',
+    'AzuraCast webhook deliveries by outcome',
+    ['result']
+)
+
+
+class WebhookError(Exception):
+    """Rejected delivery; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AzuraCastWebhookReceiver:
+    """
+    Authenticates, validates and de-duplicates AzuraCast now-playing deliveries.
+    """
+
+    def __init__(self, secret: Optional[str], station_id: int = 1, remember: int = 256):
+        """
+        Args:
+            secret: Shared secret; the receiver is disabled without one
+            station_id: Only payloads for this station are accepted
+            remember: How many recent delivery fingerprints to keep for de-duplication
+        """
+        self.secret = secret or None
+        self.station_id = station_id
+        self.remember = remember
+        self._seen: "OrderedDict[Tuple, None]" = OrderedDict()
+        self._song_key: Optional[Tuple] = None
+        self._played_at = 0
+
+    @classmethod
+    def from_env(cls) -> "AzuraCastWebhookReceiver":
+        return cls(
+            secret=os.getenv("AZURACAST_WEBHOOK_SECRET"),
+            station_id=int(os.getenv("AZURACAST_STATION_ID", "1")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.secret is not None
+
+    def authenticate(self, headers: Mapping[str, str]):
+        """Raise WebhookError unless the request carries the shared secret."""
+        if not self.enabled:
+            WEBHOOK_EVENTS.labels("disabled").inc()
+            raise WebhookError(503, "Webhook receiver not configured")
+
+        supplied = headers.get("x-webhook-secret")
+        auth = headers.get("authorization", "")
+        if not supplied and auth.lower().startswith("basic "):
+            try:
+                decoded = base64.b64decode(auth[6:].strip()).decode("utf-8")
+                supplied = decoded.partition(":")[2]
+            except (ValueError, UnicodeDecodeError):
+                supplied = None
+
+        if not supplied or not hmac.compare_digest(supplied.encode(), self.secret.encode()):
+            WEBHOOK_EVENTS.labels("unauthorized").inc()
+            raise WebhookError(401, "Invalid webhook secret")
+
+    def ingest(self, payload: Any) -> Optional[str]:
+        """
+        Validate and classify a delivery.
+
+        Returns:
+            "song_changed" or "listeners", or None for duplicates and stale deliveries
+
+        Raises:
+            WebhookError: The payload is not a now-playing object for our station
+        """
+        song_id, sh_id, played_at, listeners = self._validate(payload)
+
+        fingerprint = (sh_id, song_id, played_at, listeners)
+        if fingerprint in self._seen:
+            WEBHOOK_EVENTS.labels("duplicate").inc()
+            return None
+        if played_at < self._played_at:
+            WEBHOOK_EVENTS.labels("stale").inc()
+            return None
+
+        self._seen[fingerprint] = None
+        while len(self._seen) > self.remember:
+            self._seen.popitem(last=False)
+
+        song_key = (sh_id, song_id, played_at)
+        event = "song_changed" if song_key != self._song_key else "listeners"
+        self._song_key = song_key
+        self._played_at = played_at
+        WEBHOOK_EVENTS.labels(event).inc()
+        return event
+
+    def _validate(self, payload: Any) -> Tuple[str, Any, int, Tuple]:
+        def invalid(reason: str) -> WebhookError:
+            WEBHOOK_EVENTS.labels("invalid").inc()
+            logger.warning(f"Rejected webhook payload: {reason}")
+            return WebhookError(422, reason)
+
+        if not isinstance(payload, dict):
+            raise invalid("Payload must be a JSON object")
+
+        station = payload.get("station")
+        if not isinstance(station, dict) or str(station.get("id")) != str(self.station_id):
+            raise invalid(f"Payload is not for station {self.station_id}")
+
+        now_playing = payload.get("now_playing")
+        song = now_playing.get("song") if isinstance(now_playing, dict) else None
+        if not isinstance(song, dict) or not song.get("id"):
+            raise invalid("now_playing.song.id is required")
+
+        try:
+            played_at = int(now_playing.get("played_at") or 0)
+        except (TypeError, ValueError):
+            raise invalid("now_playing.played_at must be a timestamp")
+
+        listeners: Dict[str, Any] = payload.get("listeners") if isinstance(payload.get("listeners"), dict) else {}
+        listener_key = (listeners.get("total"), listeners.get("unique"), listeners.get("current"))
+        return str(song["id"]), now_playing.get("sh_id"), played_at, listener_key
@@ -0,0 +1,392 @@
+"""
+WebSocket Connection Manager
+
+Shared by both APIs for broadcasting to connected listeners. A broadcast
+never awaits a socket: every connection has a bounded send queue drained by
+its own sender task, so one slow client cannot stall everyone else.
+
+- Queue full ("slow consumer"): either drop the oldest queued message
+  (default, fine for state updates where only the latest matters) or
+  disconnect the client with 1013 so it reconnects and resyncs
+- A send that fails or exceeds SEND_TIMEOUT removes the connection
+- Membership is a dict keyed by socket, so connect/disconnect are O(1)
+- Messages are encoded once per broadcast and the same text frame is queued
+  for every socket; frames that are re-sent unchanged (the snapshot a new
+  client gets on connect) are cached by a caller-supplied version key
+- Clients may narrow what they receive to some topics (message types) with
+  {"type": "subscribe", "topics": [...]} / {"type": "unsubscribe", ...};
+  until then they get everything. A broadcast only walks the connections
+  subscribed to its topic plus the "everything" set. The hello of older
+  clients, {"subs": [...]}, is treated as a subscribe
+- Heartbeat: every PING_INTERVAL all clients get {"type": "ping"}. Clients
+  that answer {"type": "pong"} are reaped (closed with 1001) once nothing has
+  been heard from them for IDLE_TIMEOUT. Clients that never answered a ping
+  are older builds; they are only dropped when a send fails, and uvicorn's
+  protocol-level pings cover their half-open connections
+
+Configured with WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY
+("drop_oldest" / "disconnect"), WS_SEND_TIMEOUT, WS_PING_INTERVAL and
+WS_IDLE_TIMEOUT.
+"""
+
+import os
+import json
+import time
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Union
+
+from prometheus_client import Counter, Gauge
+from starlette.websockets import WebSocket
+
+from serialization import dumps_json
+
+logger = logging.getLogger("WSManager")
+
+POLICIES = ("drop_oldest", "disconnect")
+FRAME_CACHE_SIZE = 32
+
+# A dict to encode, or a frame that is already encoded
+Message = Union[Dict[str, Any], str]
+
+WS_CONNECTIONS = Gauge('ws_connections', 'Open WebSocket connections', ['manager'])
+WS_QUEUED = Gauge('ws_send_queue_messages', 'Messages waiting in WebSocket send queues', ['manager'])
+WS_DROPPED = Counter('ws_dropped_messages_total', 'Messages dropped for slow WebSocket consumers', ['manager'])
+WS_EVICTIONS = Counter('ws_evictions_total', 'WebSocket connections removed by the server', ['manager', 'reason'])
+WS_FRAMES = Counter('ws_frames_total', 'WebSocket frames built for sending', ['manager', 'source'])
+WS_HEARTBEAT = Gauge('ws_heartbeat_connections', 'WebSocket connections answering heartbeat pings', ['manager'])
+WS_SUBSCRIBERS = Gauge('ws_topic_subscribers', 'WebSocket connections per topic ("*" = all topics)', ['manager', 'topic'])
+
+
+def encode_frame(message: Dict[str, Any]) -> str:
+    """JSON text frame for `message` (text, not binary: the browser client JSON.parses event.data)."""
+    return dumps_json(message).decode("utf-8")
+
+
+class _Connection:
+    __slots__ = ("id", "websocket", "queue", "task", "topics", "last_seen", "heartbeat")
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        # Stable for the connection's lifetime, unlike id(websocket) which is reused once freed
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        # None: subscribed to everything
+        self.topics: Optional[Set[str]] = None
+        self.last_seen = time.monotonic()
+        # Set once the client answered a ping, which makes it subject to the idle timeout
+        self.heartbeat = False
+
+
+class ConnectionManager:
+    """
+    Connected sockets with per-connection send queues.
+    """
+
+    def __init__(self, name: str = "ws", queue_size: int = 64, slow_policy: str = "drop_oldest",
+                 send_timeout: float = 10.0, topics: Iterable[str] = (), ping_interval: float = 20.0,
+                 idle_timeout: float = 60.0):
+        """
+        Args:
+            name: Label used in logs and metrics
+            queue_size: Messages buffered per connection
+            slow_policy: What to do when a queue is full ("drop_oldest" or "disconnect")
+            send_timeout: Seconds a single send may take before the client is dropped
+            topics: Topics clients can (un)subscribe; messages on other topics go to everyone
+            ping_interval: Seconds between heartbeat pings (0 disables the heartbeat)
+            idle_timeout: Seconds of silence after which a heartbeat client is reaped
+        """
+        if slow_policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy {slow_policy!r} (expected one of {POLICIES})")
+        self.name = name
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.send_timeout = send_timeout
+        self._connections: Dict[WebSocket, _Connection] = {}
+        self._frames: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.topics = tuple(topics)
+        self._everything: Set[_Connection] = set()
+        self._subscribers: Dict[str, Set[_Connection]] = {topic: set() for topic in self.topics}
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, name: str = "ws", topics: Iterable[str] = ()) -> "ConnectionManager":
+        policy = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+        if policy not in POLICIES:
+            logger.warning(f"Invalid WS_SLOW_CONSUMER_POLICY={policy!r}, using drop_oldest")
+            policy = "drop_oldest"
+        return cls(
+            name=name,
+            queue_size=int(os.getenv("WS_SEND_QUEUE_SIZE", "64")),
+            slow_policy=policy,
+            send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "10")),
+            topics=topics,
+            ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+            idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT", "60")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    @property
+    def active_connections(self):
+        return self._connections.keys()
+
+    def connection_id(self, websocket: WebSocket) -> Optional[int]:
+        """Identifier of a connected socket, unique for this process (None once disconnected)."""
+        conn = self._connections.get(websocket)
+        return conn.id if conn is not None else None
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        conn = _Connection(websocket, self.queue_size)
+        conn.task = asyncio.create_task(self._sender(conn))
+        self._connections[websocket] = conn
+        self._everything.add(conn)
+        WS_CONNECTIONS.labels(self.name).set(len(self._connections))
+        self._update_subscriber_gauges()
+        if self.ping_interval and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    def disconnect(self, websocket: WebSocket):
+        """Forget `websocket` (safe to call more than once)."""
+        conn = self._connections.pop(websocket, None)
+        if conn is None:
+            return
+        self._everything.discard(conn)
+        for topic in conn.topics or ():
+            self._subscribers[topic].discard(conn)
+        WS_CONNECTIONS.labels(self.name).set(len(self._connections))
+        WS_QUEUED.labels(self.name).dec(conn.queue.qsize())
+        if conn.heartbeat:
+            WS_HEARTBEAT.labels(self.name).dec()
+        self._update_subscriber_gauges()
+        if conn.task and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """
+        Add topics to a connection's subscriptions. The first subscribe of a
+        connection that still receives everything narrows it to `topics`.
+
+        Returns:
+            The connection's subscriptions afterwards (unknown topics are ignored)
+        """
+        conn = self._connections.get(websocket)
+        if conn is None:
+            return []
+        if conn.topics is None:
+            self._everything.discard(conn)
+            conn.topics = set()
+        for topic in topics:
+            if topic in self._subscribers:
+                conn.topics.add(topic)
+                self._subscribers[topic].add(conn)
+        self._update_subscriber_gauges()
+        return self.subscriptions(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Remove topics from a connection's subscriptions; returns what is left."""
+        conn = self._connections.get(websocket)
+        if conn is None:
+            return []
+        if conn.topics is None:
+            self._everything.discard(conn)
+            conn.topics = set(self.topics)
+            for topic in self.topics:
+                self._subscribers[topic].add(conn)
+        for topic in topics:
+            if topic in self._subscribers:
+                conn.topics.discard(topic)
+                self._subscribers[topic].discard(conn)
+        self._update_subscriber_gauges()
+        return self.subscriptions(websocket)
+
+    def subscriptions(self, websocket: WebSocket) -> List[str]:
+        conn = self._connections.get(websocket)
+        if conn is None:
+            return []
+        return list(self.topics) if conn.topics is None else sorted(conn.topics)
+
+    async def handle_message(self, websocket: WebSocket, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Handle subscription and heartbeat messages from a client. Any message
+        counts as a sign of life.
+
+        Returns:
+            The decoded message if it is something else for the endpoint to handle,
+            None if it was handled here or is not a JSON object
+        """
+        conn = self._connections.get(websocket)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(message, dict):
+            return None
+        kind = message.get("type")
+        if kind is None and "subs" in message:
+            # Hello sent by older clients on open
+            kind, message = "subscribe", {"topics": message["subs"]}
+        if kind == "pong":
+            if conn is not None and not conn.heartbeat:
+                conn.heartbeat = True
+                WS_HEARTBEAT.labels(self.name).inc()
+            return None
+        if kind == "ping":
+            await self.send(websocket, {"type": "pong", "ts": message.get("ts")})
+            return None
+        if kind not in ("subscribe", "unsubscribe"):
+            return message
+        topics = message.get("topics") or []
+        if isinstance(topics, str):
+            topics = [topics]
+        if kind == "subscribe":
+            current = self.subscribe(websocket, topics)
+        else:
+            current = self.unsubscribe(websocket, topics)
+        await self.send(websocket, {"type": "subscribed", "topics": current})
+        return None
+
+    def frame(self, message: Message, key: Optional[Hashable] = None) -> str:
+        """
+        Encoded frame for `message`.
+
+        Args:
+            message: Message dict (or an already encoded frame, returned as is)
+            key: Version key identifying the message content, e.g. ("steering_update", 12);
+                 the frame is reused for as long as the same key is passed
+        """
+        if isinstance(message, str):
+            return message
+        if key is not None:
+            cached = self._frames.get(key)
+            if cached is not None:
+                self._frames.move_to_end(key)
+                WS_FRAMES.labels(self.name, "cache").inc()
+                return cached
+        frame = encode_frame(message)
+        WS_FRAMES.labels(self.name, "encoded").inc()
+        if key is not None:
+            self._frames[key] = frame
+            if len(self._frames) > FRAME_CACHE_SIZE:
+                self._frames.popitem(last=False)
+        return frame
+
+    async def send(self, websocket: WebSocket, message: Message, key: Optional[Hashable] = None):
+        """Queue a message for one connection, behind anything already queued for it."""
+        conn = self._connections.get(websocket)
+        if conn is not None:
+            self._enqueue(conn, self.frame(message, key))
+
+    async def broadcast(self, message: Message, key: Optional[Hashable] = None, topic: Optional[str] = None):
+        """
+        Queue a message for every connection subscribed to its topic; never waits on a socket.
+
+        Args:
+            message: Message dict or encoded frame
+            key: Frame cache key (see frame())
+            topic: Defaults to the message's "type"
+        """
+        if not self._connections:
+            return
+        if topic is None and isinstance(message, dict):
+            topic = message.get("type")
+        frame = self.frame(message, key)
+        if topic in self._subscribers:
+            targets = [*self._everything, *self._subscribers[topic]]
+        else:
+            targets = list(self._connections.values())
+        for conn in targets:
+            self._enqueue(conn, frame)
+
+    async def close(self):
+        """Stop the heartbeat and all sender tasks (shutdown)."""
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for websocket in list(self._connections):
+            self.disconnect(websocket)
+
+    def reap_idle(self, now: Optional[float] = None) -> int:
+        """
+        Close heartbeat clients that have been silent for longer than idle_timeout.
+
+        Returns:
+            Number of connections reaped
+        """
+        now = time.monotonic() if now is None else now
+        idle = [conn for conn in self._connections.values()
+                if conn.heartbeat and now - conn.last_seen > self.idle_timeout]
+        for conn in idle:
+            self._evict(conn, "idle", close_code=1001)
+        return len(idle)
+
+    def _enqueue(self, conn: _Connection, frame: str):
+        if conn.queue.full():
+            if self.slow_policy == "disconnect":
+                self._evict(conn, "slow", close_code=1013)
+                return
+            conn.queue.get_nowait()
+            WS_QUEUED.labels(self.name).dec()
+            WS_DROPPED.labels(self.name).inc()
+        conn.queue.put_nowait(frame)
+        WS_QUEUED.labels(self.name).inc()
+
+    def _update_subscriber_gauges(self):
+        if not self.topics:
+            return
+        WS_SUBSCRIBERS.labels(self.name, "*").set(len(self._everything))
+        for topic, subscribers in self._subscribers.items():
+            WS_SUBSCRIBERS.labels(self.name, topic).set(len(subscribers))
+
+    def _evict(self, conn: _Connection, reason: str, close_code: Optional[int] = None):
+        if conn.websocket not in self._connections:
+            return
+        self.disconnect(conn.websocket)
+        WS_EVICTIONS.labels(self.name, reason).inc()
+        logger.info(f"{self.name}: dropped connection ({reason}), {len(self._connections)} left")
+        if close_code is not None:
+            asyncio.create_task(self._close(conn.websocket, close_code))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                self.reap_idle()
+                # Pings bypass topic subscriptions; the frame is identical for everyone
+                frame = encode_frame({"type": "ping", "ts": int(time.time())})
+                for conn in list(self._connections.values()):
+                    self._enqueue(conn, frame)
+            except Exception as e:
+                logger.error(f"{self.name}: heartbeat error: {e}")
+
+    async def _sender(self, conn: _Connection):
+        while True:
+            frame = await conn.queue.get()
+            WS_QUEUED.labels(self.name).dec()
+            try:
+                await asyncio.wait_for(conn.websocket.send_text(frame), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._evict(conn, "timeout", close_code=1013)
+                return
+            except Exception as e:
+                logger.debug(f"{self.name}: send failed: {e}")
+                self._evict(conn, "error")
+                return
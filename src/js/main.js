@@ -27,14 +27,15 @@ class YourPartyApp {
         const status = new StatusManager(this.config);
         const stream = new StreamController(this.config);
         const visualEngine = new VisualEngine(); // Professional Engine
+        const realtime = new RealtimeModule(this.config);
 
         this.modules = {
             status: status,
             stream: stream,
             player: new PlayerControls(),
             mood: new MoodModule(this.config),
-            rating: new RatingModule(this.config),
-            realtime: new RealtimeModule(this.config),
+            rating: new RatingModule(this.config, realtime),
+            realtime: realtime,
             visuals: visualEngine,
             fullscreen: new FullscreenManager(),
             contact: new ContactModule(this.config)
@@ -2,8 +2,10 @@
  * YourParty Rating Module
  */
 export default class RatingModule {
-    constructor(config) {
+    constructor(config, realtime = null) {
         this.config = config;
+        // Votes go over the WebSocket when it is open, HTTP otherwise
+        this.realtime = realtime;
         this.currentSongId = null;
         this.currentRating = 0;
         this.isSubmitting = false;
@@ -101,23 +103,14 @@ export default class RatingModule {
         containers.forEach(c => c.classList.add('loading'));
 
         try {
-            const baseUrl = this.config.restBase || '/api';
-            const response = await fetch(`${baseUrl}/rate`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    song_id: this.currentSongId,
-                    rating: rating,
-                    // optional metadata
-                    title: document.getElementById('track-title')?.textContent,
-                    artist: document.getElementById('track-artist')?.textContent
-                })
+            const data = await this.submitRating({
+                song_id: this.currentSongId,
+                rating: rating,
+                // optional metadata
+                title: document.getElementById('track-title')?.textContent,
+                artist: document.getElementById('track-artist')?.textContent
             });
 
-            if (!response.ok) throw new Error('Rating failed');
-
-            const data = await response.json();
-
             this.currentRating = rating;
             this.highlightGlobal(rating, false);
             this.updateDisplay(data.ratings?.average, data.ratings?.total);
@@ -137,6 +130,28 @@ export default class RatingModule {
         }
     }
 
+    async submitRating(payload) {
+        if (this.realtime) {
+            try {
+                return await this.realtime.vote('rate', payload);
+            } catch (e) {
+                // Only a vote that never left the browser may be re-sent over HTTP
+                if (e.sent !== false) throw e;
+            }
+        }
+
+        const baseUrl = this.config.restBase || '/api';
+        const response = await fetch(`${baseUrl}/rate`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(payload)
+        });
+
+        if (!response.ok) throw new Error('Rating failed');
+
+        return response.json();
+    }
+
     showFeedback(container, msg, type) {
         // Reuse or create feedback element logic
         // Simplified for brevity
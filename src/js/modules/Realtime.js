@@ -1,12 +1,23 @@
 /**
  * Realtime Module (WebSockets)
  */
+function voteError(message, extra = {}) {
+    return Object.assign(new Error(message), { sent: true }, extra);
+}
+
 export default class RealtimeModule {
     constructor(config) {
         this.config = config;
         this.socket = null;
         this.reconnectAttempts = 0;
         this.subscribers = [];
+        // Last full song, the base that song_update deltas apply to
+        this.currentSong = null;
+        // Votes sent over the socket, waiting for their ack (ref -> {resolve, reject, timer})
+        this.pendingVotes = new Map();
+        this.nextRef = 1;
+        // An ack can be lost (dropped from a full send queue, or with the connection)
+        this.voteTimeoutMs = config.voteTimeoutMs || 5000;
 
         // Delay connection
         setTimeout(() => this.connect(), 500);
@@ -43,8 +54,8 @@ export default class RealtimeModule {
         this.socket.onopen = () => {
             console.log('[Realtime] Connected');
             this.reconnectAttempts = 0;
-            // Send subscription/hello if needed
-            this.socket.send(JSON.stringify({ "subs": { [slug]: {} } }));
+            // Only now-playing is rendered here; skip vote/steering traffic
+            this.socket.send(JSON.stringify({ type: 'subscribe', topics: ['song'] }));
         };
 
         this.socket.onmessage = (event) => {
@@ -55,6 +66,8 @@ export default class RealtimeModule {
         };
 
         this.socket.onclose = () => {
+            // Acks never cross connections: settle everything sent on this one
+            this.rejectPendingVotes('socket closed');
             this.scheduleReconnect();
         };
 
@@ -76,15 +89,78 @@ export default class RealtimeModule {
         setTimeout(() => this.connect(), delay);
     }
 
+    /**
+     * Submit a vote over the open socket instead of an HTTP POST.
+     * type: 'rate' | 'mood_tag' | 'vote_next' | 'control_vote_next', payload: same body as the HTTP route.
+     * Resolves with the route's response body. Rejects with error.sent === false when
+     * the socket is not open (callers fall back to HTTP then); otherwise the vote was
+     * sent and the server refused it (error.status) or no ack arrived in time, in which
+     * case it may still have been counted and must not be re-sent over HTTP.
+     */
+    vote(type, payload) {
+        if (!this.socket || this.socket.readyState !== WebSocket.OPEN) {
+            return Promise.reject(Object.assign(new Error('socket not open'), { sent: false }));
+        }
+        const ref = this.nextRef++;
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => this.settleVote(ref, 'reject', voteError('no ack')), this.voteTimeoutMs);
+            this.pendingVotes.set(ref, { resolve, reject, timer });
+            this.socket.send(JSON.stringify({ ...payload, type, ref }));
+        });
+    }
+
+    settleVote(ref, outcome, value) {
+        const pending = this.pendingVotes.get(ref);
+        if (!pending) return;
+        this.pendingVotes.delete(ref);
+        clearTimeout(pending.timer);
+        pending[outcome](value);
+    }
+
+    rejectPendingVotes(reason) {
+        [...this.pendingVotes.keys()].forEach(ref => this.settleVote(ref, 'reject', voteError(reason)));
+    }
+
     handleMessage(msg) {
         // Dispatch to app or subscribers
         // For now, simple dispatch to window like original, or we could add subscriber system
+        if (msg.type === 'ping') {
+            // Server heartbeat: answering keeps the connection from being reaped as idle
+            if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+                this.socket.send(JSON.stringify({ type: 'pong', ts: msg.ts }));
+            }
+            return;
+        }
+
+        if (msg.type === 'ack') {
+            if (msg.ok) {
+                this.settleVote(msg.ref, 'resolve', msg.result);
+            } else {
+                this.settleVote(msg.ref, 'reject', voteError(msg.error, { status: msg.status, retryAfter: msg.retry_after }));
+            }
+            return;
+        }
+
         if (msg.type === 'song') {
-            const songData = msg.song || msg.data;
-            // Creating legacy event for compatibility
-            window.dispatchEvent(new CustomEvent('songChange', {
-                detail: { song: songData }
-            }));
+            this.emitSong(msg.song || msg.data);
+            return;
+        }
+
+        if (msg.type === 'song_update') {
+            // Same song, new metadata or rating/mood: only the changed fields are sent.
+            // Without a matching base (e.g. its frame was dropped) the next full
+            // "song" or the status poll catches up.
+            if (this.currentSong && String(this.currentSong.id) === String(msg.id)) {
+                this.emitSong({ ...this.currentSong, ...msg.changes });
+            }
         }
     }
+
+    emitSong(songData) {
+        this.currentSong = songData;
+        // Creating legacy event for compatibility
+        window.dispatchEvent(new CustomEvent('songChange', {
+            detail: { song: songData }
+        }));
+    }
 }